@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Memory used by the in-memory ledger plus the artist name/ID lookups.
+
+Builds the same library twice from a generated CSV ledger and Lidarr artist list:
+
+  dict     - the former layout: one dict per row with ISO timestamp and status
+             strings, plus separate mbid_to_name / mbid_to_lidarr_id dicts
+  compact  - read_ledger()'s LedgerRow objects, which also carry the Lidarr ID
+
+and reports the bytes allocated per artist (tracemalloc) for each.
+
+    python benchmarks/bench_ledger_memory.py
+    python benchmarks/bench_ledger_memory.py --sizes 10000,100000,500000
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from lidarr_mbid_check import LEDGER_FIELDS, read_ledger  # noqa: E402
+
+
+def generate(workdir: str, size: int, seed: int) -> (str, bytes):
+    """Write a ledger CSV with a realistic status mix; return its path and a Lidarr artist list"""
+    rng = random.Random(seed)
+    started = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    artists = []
+    csv_path = os.path.join(workdir, "mbids.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS)
+        writer.writeheader()
+        for i in range(size):
+            mbid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            name = f"Artist {i:07d} {rng.choice(['and the Band', 'Quartet', '', 'Orchestra'])}".strip()
+            status = rng.choices(["success", "timeout", ""], weights=[80, 15, 5])[0]
+            checked = started + timedelta(seconds=rng.randrange(86400 * 90)) if status else None
+            writer.writerow({
+                "mbid": mbid,
+                "artist_name": name,
+                "status": status,
+                "attempts": rng.randint(1, 25) if status else 0,
+                "last_status_code": {"success": "200", "timeout": "503", "": ""}[status],
+                "last_checked": checked.isoformat() if checked else "",
+                "failed_runs": rng.randint(1, 4) if status == "timeout" else 0,
+                "next_eligible": (checked + timedelta(hours=2)).isoformat() if status == "timeout" else "",
+            })
+            artists.append({"id": i + 1, "artistName": name, "foreignArtistId": mbid})
+    return csv_path, json.dumps(artists).encode("utf-8")
+
+
+def build_dict_layout(csv_path: str, artists_json: bytes) -> tuple:
+    """The row-per-dict ledger and separate lookups, as loaded before LedgerRow"""
+    ledger: Dict[str, Dict] = {}
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            mbid = (row.get("mbid") or "").strip()
+            ledger[mbid] = {
+                "mbid": mbid,
+                "artist_name": row.get("artist_name", ""),
+                "status": (row.get("status") or "").lower().strip(),
+                "attempts": int((row.get("attempts") or "0") or 0),
+                "last_status_code": row.get("last_status_code", ""),
+                "last_checked": row.get("last_checked", ""),
+                "failed_runs": int(row.get("failed_runs") or 0),
+                "next_eligible": row.get("next_eligible") or "",
+            }
+    mbid_to_name, mbid_to_lidarr_id = {}, {}
+    for a in json.loads(artists_json):
+        mbid_to_name[a["foreignArtistId"]] = a["artistName"]
+        mbid_to_lidarr_id[a["foreignArtistId"]] = a["id"]
+    return ledger, mbid_to_name, mbid_to_lidarr_id
+
+
+def build_compact_layout(csv_path: str, artists_json: bytes) -> tuple:
+    """LedgerRow objects holding the Lidarr ID themselves"""
+    ledger = read_ledger(csv_path)
+    for a in json.loads(artists_json):
+        ledger[a["foreignArtistId"]].lidarr_id = a["id"]
+    return (ledger,)
+
+
+def measure(build: Callable[[str, bytes], tuple], csv_path: str, artists_json: bytes) -> int:
+    """Bytes still allocated once `build` has returned (the artist list itself is freed)"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build(csv_path, artists_json)
+        gc.collect()
+        allocated, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del kept
+    return allocated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-memory ledger size: dict rows vs LedgerRow")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated library sizes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Also save the results as JSON")
+    args = parser.parse_args()
+
+    results: List[dict] = []
+    print(f"{'size':>8} {'dict MB':>9} {'compact MB':>11} {'dict B/row':>11} {'compact B/row':>14} {'saved':>7}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory(prefix="mbid-mem-") as workdir:
+            csv_path, artists_json = generate(workdir, size, args.seed)
+            legacy = measure(build_dict_layout, csv_path, artists_json)
+            compact = measure(build_compact_layout, csv_path, artists_json)
+        saved = 1 - compact / legacy
+        results.append({"size": size, "dict_bytes": legacy, "compact_bytes": compact, "saved_fraction": round(saved, 3)})
+        print(f"{size:>8} {legacy / 2**20:>9.1f} {compact / 2**20:>11.1f} {legacy // size:>11} "
+              f"{compact // size:>14} {saved:>7.0%}", flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""Microbenchmark for the probe rate limiter.
+
+Runs many concurrent waiters against SafeRateLimiter at several target rates and
+checks that the achieved request rate stays within tolerance of the target, and
+that waiters are served fairly (FIFO).
+
+    python benchmarks/bench_limiter.py
+    python benchmarks/bench_limiter.py --rates 0.7,3,50 --waiters 100 --tolerance 0.01
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lidarr_mbid_check import SafeRateLimiter  # noqa: E402
+
+
+async def measure(rate: float, waiters: int, grants: int, burst: int) -> dict:
+    """Let `waiters` coroutines compete for `grants` requests and measure the achieved rate"""
+    limiter = SafeRateLimiter(requests_per_second=rate, max_concurrent=waiters,
+                              circuit_breaker_threshold=10 ** 9, burst=burst)
+    grant_times: List[float] = []
+    per_waiter = [0] * waiters
+    done = asyncio.Event()
+    
+    async def waiter(index: int) -> None:
+        while True:
+            await limiter.acquire()
+            grant_times.append(time.monotonic())
+            per_waiter[index] += 1
+            limiter.release(200, 0.0)
+            if len(grant_times) >= grants:
+                done.set()
+                return
+    
+    tasks = [asyncio.ensure_future(waiter(i)) for i in range(waiters)]
+    await done.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    grant_times = grant_times[:grants]
+    
+    # Skip the initial burst allowance; measure the steady-state spacing
+    steady = grant_times[burst - 1:]
+    elapsed = steady[-1] - steady[0]
+    achieved = (len(steady) - 1) / elapsed if elapsed > 0 else float("inf")
+    return {
+        "target_rate": rate,
+        "achieved_rate": achieved,
+        "error": abs(achieved - rate) / rate,
+        "grants": len(grant_times),
+        "fairness_spread": max(per_waiter) - min(per_waiter),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure SafeRateLimiter accuracy under concurrent waiters")
+    parser.add_argument("--rates", default="0.7,3,10,50,200", help="Comma-separated target rates (req/sec)")
+    parser.add_argument("--waiters", type=int, default=100, help="Concurrent waiters")
+    parser.add_argument("--seconds", type=float, default=20.0, help="Approximate measuring time per rate")
+    parser.add_argument("--min-grants", type=int, default=15, help="Minimum grants measured per rate")
+    parser.add_argument("--burst", type=int, default=1, help="Burst size passed to the limiter")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="Allowed relative rate error")
+    args = parser.parse_args()
+    
+    failed = False
+    print(f"{'target':>10} {'achieved':>10} {'error':>8} {'grants':>7} {'spread':>7}")
+    for rate in (float(r) for r in args.rates.split(",")):
+        grants = max(args.min_grants, int(rate * args.seconds)) + args.burst - 1
+        result = asyncio.run(measure(rate, args.waiters, grants, args.burst))
+        ok = result["error"] <= args.tolerance
+        failed = failed or not ok
+        print(f"{result['target_rate']:>10.2f} {result['achieved_rate']:>10.3f} "
+              f"{result['error']:>7.2%} {result['grants']:>7} {result['fairness_spread']:>7}"
+              f"{'' if ok else '  <-- outside tolerance'}")
+    
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the checker pipeline against the local mock server.
+
+For every library size, a mock server (benchmarks/mock_server.py) is started with
+that many artists. For each ledger backend and concurrency setting, a fresh child
+process then runs the same pipeline as `lidarr_mbid_check.py`
+(run_check: fetch artists, merge ledger, probe, save) against it.
+
+Reports artists/sec, requests/sec, p50/p95/p99 attempt latency, ledger write
+time, peak RSS and CPU time, and saves everything as JSON. Pass --baseline with
+an earlier JSON file to flag throughput regressions.
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 1000,10000 --concurrency 8,32 --backends csv,sqlite
+    python benchmarks/bench_pipeline.py --baseline bench_before.json --output bench_after.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+from typing import List, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+CONFIG_TEMPLATE = """[lidarr]
+base_url = {base_url}
+api_key = benchmark
+stream_artists = {stream}
+
+[probe]
+target_base_url = {base_url}
+timeout_seconds = 10
+max_attempts_per_artist = {max_attempts}
+delay_between_attempts = {retry_delay}
+max_concurrent_requests = {concurrency}
+rate_limit_per_second = {rate}
+circuit_breaker_threshold = 1000000
+
+[retry]
+jitter = {jitter}
+cache_miss_max_delay = {retry_delay}
+not_found_delay = {retry_delay}
+not_found_max_delay = {retry_delay}
+timeout_delay = {retry_delay}
+timeout_max_delay = {retry_delay}
+other_delay = {retry_delay}
+other_max_delay = {retry_delay}
+
+[ledger]
+csv_path = {workdir}/mbids.csv
+backend = {backend}
+sqlite_path = {workdir}/mbids.db
+
+[run]
+batch_size = 25
+batch_write_frequency = 5
+
+[actions]
+update_lidarr = true
+refresh_max_delay_seconds = 1
+
+[monitoring]
+log_progress_every_n = 1000000
+results_dir = {workdir}
+"""
+
+
+def run_child(config_path: str) -> None:
+    """Child mode: run the pipeline once and print a JSON line with its measurements"""
+    from lidarr_mbid_check import load_config, run_check
+
+    cfg = load_config(config_path)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        summary = run_check(cfg) or {}
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    print(json.dumps({"summary": summary, "wall_seconds": wall, "cpu_seconds": cpu, "peak_rss_mb": peak_rss_mb}))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _http(url: str, method: str = "GET") -> dict:
+    req = urllib.request.Request(url, method=method, data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=5) as resp:
+        return json.loads(resp.read())
+
+
+def start_mock(size: int, args: argparse.Namespace) -> (subprocess.Popen, str):
+    port = _free_port()
+    cmd = [
+        sys.executable, os.path.join(BENCH_DIR, "mock_server.py"),
+        "--port", str(port), "--artists", str(size), "--seed", str(args.seed),
+        "--latency-ms", str(args.latency_ms), "--cold-max", str(args.cold_max),
+        "--warm-fraction", str(args.warm_fraction), "--not-found-rate", str(args.not_found_rate),
+        "--cold-seconds-max", str(args.cold_seconds_max),
+    ]
+    proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            _http(f"{base_url}/stats")
+            return proc, base_url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Mock server did not start")
+
+
+def run_scenario(base_url: str, size: int, backend: str, concurrency: int, args: argparse.Namespace) -> dict:
+    _http(f"{base_url}/reset", method="POST")
+    with tempfile.TemporaryDirectory(prefix="mbid-bench-") as workdir:
+        config_path = os.path.join(workdir, "config.ini")
+        with open(config_path, "w", encoding="utf-8") as f:
+            f.write(CONFIG_TEMPLATE.format(
+                base_url=base_url, workdir=workdir, backend=backend, concurrency=concurrency,
+                rate=args.rate, retry_delay=args.retry_delay, max_attempts=args.max_attempts,
+                stream="true" if args.stream else "false", jitter=args.jitter,
+            ))
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", config_path],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Benchmark child failed:\n{proc.stderr}")
+        child = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    server = _http(f"{base_url}/stats")
+    summary = child["summary"]
+    wall = child["wall_seconds"]
+    checked = summary.get("checked_this_run", 0)
+    return {
+        "size": size,
+        "backend": backend,
+        "concurrency": concurrency,
+        "checked": checked,
+        "success": summary.get("success"),
+        "timeout": summary.get("timeout"),
+        "requests": summary.get("requests_this_run"),
+        "wall_seconds": round(wall, 3),
+        "artists_per_sec": round(checked / wall, 2) if wall > 0 else None,
+        "requests_per_sec": round(summary.get("requests_this_run", 0) / wall, 2) if wall > 0 else None,
+        "server_observed_rate": server.get("observed_rate"),
+        "attempt_latency_p50_ms": summary.get("attempt_latency_p50_ms"),
+        "attempt_latency_p95_ms": summary.get("attempt_latency_p95_ms"),
+        "attempt_latency_p99_ms": summary.get("attempt_latency_p99_ms"),
+        "ledger_write_seconds": summary.get("ledger_write_seconds"),
+        "peak_rss_mb": round(child["peak_rss_mb"], 1),
+        "cpu_seconds": round(child["cpu_seconds"], 3),
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "-C", REPO_DIR, "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[dict], baseline_path: str, max_regression: float) -> bool:
+    """Print throughput deltas against a baseline file. Returns False on a regression."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(s["size"], s["backend"], s["concurrency"]): s for s in json.load(f)["scenarios"]}
+    ok = True
+    print(f"\nAgainst baseline {baseline_path}:")
+    for r in results:
+        before = baseline.get((r["size"], r["backend"], r["concurrency"]))
+        if not before or not before.get("artists_per_sec") or not r.get("artists_per_sec"):
+            continue
+        change = r["artists_per_sec"] / before["artists_per_sec"] - 1
+        regressed = change < -max_regression
+        ok = ok and not regressed
+        print(f"  size={r['size']:>7} backend={r['backend']:<7} concurrency={r['concurrency']:>3}: "
+              f"{before['artists_per_sec']:>9.1f} -> {r['artists_per_sec']:>9.1f} artists/sec ({change:+.1%})"
+              f"{'  <-- REGRESSION' if regressed else ''}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="End-to-end throughput benchmark against the mock server")
+    parser.add_argument("--child", metavar="CONFIG", help=argparse.SUPPRESS)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated library sizes")
+    parser.add_argument("--concurrency", default="8,32", help="Comma-separated max_concurrent_requests values")
+    parser.add_argument("--backends", default="sqlite", help="Comma-separated ledger backends (csv, journal, sqlite)")
+    parser.add_argument("--rate", type=float, default=2000, help="rate_limit_per_second for the checker")
+    parser.add_argument("--retry-delay", type=float, default=0.05, help="delay_between_attempts for the checker")
+    parser.add_argument("--max-attempts", type=int, default=25, help="max_attempts_per_artist for the checker")
+    parser.add_argument("--jitter", choices=("full", "none"), default="none",
+                        help="[retry] jitter for the checker (every outcome retries after --retry-delay)")
+    parser.add_argument("--stream", action="store_true", help="Use stream_artists mode")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Mock server mean latency")
+    parser.add_argument("--cold-max", type=int, default=4, help="Mock server: most 503s before warm")
+    parser.add_argument("--cold-seconds-max", type=float, default=0.0,
+                        help="Mock server: warm cold MBIDs by time instead of by 503 count")
+    parser.add_argument("--warm-fraction", type=float, default=0.3, help="Mock server: share already warm")
+    parser.add_argument("--not-found-rate", type=float, default=0.01, help="Mock server: share of permanent 404s")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json", help="Where to save the JSON results")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare throughput against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed artists/sec drop vs baseline before failing (fraction)")
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    backends = [b.strip() for b in args.backends.split(",")]
+
+    results = []
+    header = (f"{'size':>7} {'backend':<7} {'conc':>4} {'artists/s':>10} {'req/s':>9} "
+              f"{'p50ms':>7} {'p95ms':>7} {'p99ms':>7} {'ledger_s':>9} {'rss_mb':>7} {'cpu_s':>7}")
+    print(header)
+    for size in sizes:
+        mock, base_url = start_mock(size, args)
+        try:
+            for backend in backends:
+                for concurrency in concurrencies:
+                    r = run_scenario(base_url, size, backend, concurrency, args)
+                    results.append(r)
+                    print(f"{r['size']:>7} {r['backend']:<7} {r['concurrency']:>4} {r['artists_per_sec']:>10.1f} "
+                          f"{r['requests_per_sec']:>9.1f} {r['attempt_latency_p50_ms']:>7} "
+                          f"{r['attempt_latency_p95_ms']:>7} {r['attempt_latency_p99_ms']:>7} "
+                          f"{r['ledger_write_seconds']:>9.3f} {r['peak_rss_mb']:>7.1f} {r['cpu_seconds']:>7.2f}",
+                          flush=True)
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    report = {
+        "created_at_utc": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("child", "baseline", "output")},
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.baseline and not compare(results, args.baseline, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
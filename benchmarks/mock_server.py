@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""Local stand-in for the metadata API and Lidarr, for offline benchmarking.
+
+Emulates:
+  GET  /artist/{mbid}, /album/{mbid}  - cold-cache behaviour (N x 503 before 200,
+                                        or 503 until N seconds after the first request),
+                                        permanent 404s, latency distributions,
+                                        429 bursts with Retry-After, hung requests,
+                                        limited capacity (queueing past N in flight)
+  GET  /api/v1/artist                 - a generated Lidarr library (streamed)
+  GET  /api/v1/album                  - its albums, --albums-per-artist each (streamed)
+  POST /api/v1/command                - records RefreshArtist commands
+  GET  /stats                         - JSON counters for benchmarks
+  POST /reset                         - forget per-MBID warm-up progress and counters
+
+Every per-MBID behaviour is derived from a hash of the MBID and --seed, so runs
+are reproducible.
+
+    python benchmarks/mock_server.py --port 8899 --artists 10000 --cold-max 6 --latency-ms 40
+    # then point [lidarr].base_url and [probe].target_base_url at http://127.0.0.1:8899
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List
+
+from aiohttp import web
+
+
+def mbid_for(index: int, seed: int, kind: str = "artist") -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"mock-{kind}-{seed}-{index}"))
+
+
+def _unit(mbid: str, seed: int, salt: str) -> float:
+    """Deterministic value in [0, 1) for an MBID"""
+    digest = hashlib.sha1(f"{seed}:{salt}:{mbid}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class MockState:
+    """Behaviour settings plus everything the server has counted so far"""
+
+    def __init__(self, options: argparse.Namespace):
+        self.options = options
+        self.rng = random.Random(options.seed)
+        self.hits: Dict[str, int] = {}
+        self.first_hit_at: Dict[str, float] = {}
+        self.status_counts: Counter = Counter()
+        self.commands: List[dict] = []
+        self.first_request_at = None
+        self.last_request_at = None
+        self.started_at = time.monotonic()
+        # Server-side token bucket, only used when --rate-limit is set
+        self.tokens = float(options.rate_limit_burst)
+        self.tokens_at = time.monotonic()
+        # Requests served at once, only used when --capacity is set; the rest queue
+        self.capacity = asyncio.Semaphore(options.capacity) if options.capacity > 0 else None
+
+    def reset(self) -> None:
+        self.hits.clear()
+        self.first_hit_at.clear()
+        self.status_counts.clear()
+        self.commands.clear()
+        self.first_request_at = None
+        self.last_request_at = None
+        self.started_at = time.monotonic()
+
+    def cold_attempts(self, mbid: str) -> int:
+        """How many 503s this MBID returns before its cache is warm"""
+        o = self.options
+        if _unit(mbid, o.seed, "warm") < o.warm_fraction:
+            return 0
+        return o.cold_min + int(_unit(mbid, o.seed, "cold") * (o.cold_max - o.cold_min + 1))
+
+    def cold_seconds(self, mbid: str) -> float:
+        """How long after its first request this MBID stays cold, with --cold-seconds-max"""
+        o = self.options
+        if _unit(mbid, o.seed, "warm") < o.warm_fraction:
+            return 0.0
+        # Skewed towards short warm-ups, like a cache filling in the background
+        return o.cold_seconds_max * _unit(mbid, o.seed, "cold") ** 2
+    
+    def is_cold(self, mbid: str, now: float) -> bool:
+        hits = self.hits.get(mbid, 0) + 1
+        self.hits[mbid] = hits
+        if self.options.cold_seconds_max > 0:
+            first = self.first_hit_at.setdefault(mbid, now)
+            return now - first < self.cold_seconds(mbid)
+        return hits <= self.cold_attempts(mbid)
+    
+    def is_not_found(self, mbid: str) -> bool:
+        return _unit(mbid, self.options.seed, "404") < self.options.not_found_rate
+
+    def latency(self) -> float:
+        o = self.options
+        mean = o.latency_ms / 1000.0
+        if mean <= 0:
+            return 0.0
+        if o.latency_dist == "uniform":
+            return self.rng.uniform(0, 2 * mean)
+        if o.latency_dist == "exponential":
+            return self.rng.expovariate(1.0 / mean)
+        if o.latency_dist == "lognormal":
+            # sigma 0.8 gives a long tail; mu chosen so the mean matches
+            sigma = 0.8
+            mu = math.log(mean) - sigma * sigma / 2
+            return self.rng.lognormvariate(mu, sigma)
+        return mean
+
+    def in_429_burst(self) -> bool:
+        o = self.options
+        if o.burst_429_every <= 0:
+            return False
+        elapsed = time.monotonic() - self.started_at
+        return (elapsed % o.burst_429_every) < o.burst_429_duration
+
+    def take_token(self) -> bool:
+        o = self.options
+        if o.rate_limit <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(o.rate_limit_burst, self.tokens + (now - self.tokens_at) * o.rate_limit)
+        self.tokens_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+def _response(state: MockState, status: int, **kwargs) -> web.Response:
+    state.status_counts[str(status)] += 1
+    return web.Response(status=status, **kwargs)
+
+
+async def handle_entity(request: web.Request) -> web.StreamResponse:
+    state: MockState = request.app["state"]
+    o = state.options
+    mbid = request.match_info["mbid"]
+    now = time.monotonic()
+    if state.first_request_at is None:
+        state.first_request_at = now
+    state.last_request_at = now
+
+    if state.rng.random() < o.timeout_rate:
+        # Hang past any sensible client timeout
+        state.status_counts["hung"] += 1
+        await asyncio.sleep(o.timeout_hang)
+        return _response(state, 504)
+
+    if state.in_429_burst() or not state.take_token():
+        headers = {"Retry-After": str(o.retry_after)}
+        if o.rate_limit > 0:
+            headers.update({
+                "X-RateLimit-Limit": str(o.rate_limit),
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(o.retry_after),
+            })
+        return _response(state, 429, headers=headers)
+
+    if state.capacity is not None:
+        async with state.capacity:
+            await asyncio.sleep(state.latency())
+    else:
+        await asyncio.sleep(state.latency())
+
+    if state.is_not_found(mbid):
+        return _response(state, 404)
+
+    if state.is_cold(mbid, now):
+        return _response(state, 503)
+
+    body = json.dumps({"id": mbid, "type": request.match_info.get("kind", "artist")})
+    return _response(state, 200, text=body, content_type="application/json")
+
+
+def _lidarr_artist(index: int, seed: int) -> dict:
+    """A Lidarr-shaped artist record, padded like the real thing"""
+    mbid = mbid_for(index, seed)
+    return {
+        "id": index + 1,
+        "artistName": f"Mock Artist {index:06d}",
+        "foreignArtistId": mbid,
+        "overview": "Lorem ipsum dolor sit amet. " * 20,
+        "images": [{"coverType": t, "url": f"https://example.invalid/{mbid}/{t}.jpg"}
+                   for t in ("poster", "banner", "fanart", "logo")],
+        "links": [{"name": n, "url": f"https://example.invalid/{n}/{mbid}"}
+                  for n in ("discogs", "allmusic", "wikipedia", "last")],
+        "genres": ["Rock", "Alternative"],
+        "statistics": {"albumCount": 7, "trackFileCount": 80, "trackCount": 95,
+                       "totalTrackCount": 120, "sizeOnDisk": 987654321, "percentOfTracks": 79.1},
+    }
+
+
+def _lidarr_album(index: int, options: argparse.Namespace) -> dict:
+    """A Lidarr-shaped album record with its embedded artist"""
+    artist_index = index // options.albums_per_artist
+    mbid = mbid_for(index, options.seed, "album")
+    return {
+        "id": index + 1,
+        "title": f"Mock Album {index:07d}",
+        "foreignAlbumId": mbid,
+        "artistId": artist_index + 1,
+        "albumType": "Album",
+        "overview": "Lorem ipsum dolor sit amet. " * 10,
+        "images": [{"coverType": "cover", "url": f"https://example.invalid/{mbid}/cover.jpg"}],
+        "artist": {"id": artist_index + 1, "artistName": f"Mock Artist {artist_index:06d}",
+                   "foreignArtistId": mbid_for(artist_index, options.seed)},
+        "statistics": {"trackFileCount": 9, "trackCount": 12, "totalTrackCount": 12, "sizeOnDisk": 98765432},
+    }
+
+
+async def _stream_json_array(request: web.Request, count: int, record) -> web.StreamResponse:
+    """Write `count` records as one JSON array, a chunk at a time"""
+    resp = web.StreamResponse(headers={"Content-Type": "application/json"})
+    await resp.prepare(request)
+    await resp.write(b"[")
+    chunk: List[str] = []
+    first = True
+    for i in range(count):
+        chunk.append(json.dumps(record(i)))
+        if len(chunk) >= 200 or i == count - 1:
+            await resp.write(("" if first else ",").encode() + ",".join(chunk).encode())
+            chunk = []
+            first = False
+    await resp.write(b"]")
+    await resp.write_eof()
+    return resp
+
+
+async def handle_lidarr_artists(request: web.Request) -> web.StreamResponse:
+    o = request.app["state"].options
+    return await _stream_json_array(request, o.artists, lambda i: _lidarr_artist(i, o.seed))
+
+
+async def handle_lidarr_albums(request: web.Request) -> web.StreamResponse:
+    o = request.app["state"].options
+    return await _stream_json_array(request, o.artists * o.albums_per_artist, lambda i: _lidarr_album(i, o))
+
+
+async def handle_command(request: web.Request) -> web.Response:
+    state: MockState = request.app["state"]
+    body = await request.json()
+    state.commands.append(body)
+    return web.json_response({"id": len(state.commands), "name": body.get("name"), "status": "queued"}, status=201)
+
+
+async def handle_stats(request: web.Request) -> web.Response:
+    state: MockState = request.app["state"]
+    total = sum(v for k, v in state.status_counts.items() if k != "hung")
+    span = 0.0
+    if state.first_request_at is not None:
+        span = state.last_request_at - state.first_request_at
+    return web.json_response({
+        "requests": total,
+        "by_status": dict(state.status_counts),
+        "observed_rate": (total - 1) / span if span > 0 else None,
+        "mbids_seen": len(state.hits),
+        "commands": len(state.commands),
+        "artists_refreshed": sum(len(c.get("artistIds", [])) or 1 for c in state.commands),
+    })
+
+
+async def handle_reset(request: web.Request) -> web.Response:
+    request.app["state"].reset()
+    return web.json_response({"reset": True})
+
+
+def build_app(options: argparse.Namespace) -> web.Application:
+    app = web.Application()
+    app["state"] = MockState(options)
+    app.router.add_get("/{kind:artist|album}/{mbid}", handle_entity)
+    app.router.add_get("/api/v1/artist", handle_lidarr_artists)
+    app.router.add_get("/api/v1/album", handle_lidarr_albums)
+    app.router.add_post("/api/v1/command", handle_command)
+    app.router.add_get("/stats", handle_stats)
+    app.router.add_post("/reset", handle_reset)
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock metadata API + Lidarr server for offline benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--artists", type=int, default=1000, help="Artists in the mock Lidarr library")
+    parser.add_argument("--albums-per-artist", type=int, default=3, help="Albums per artist in the library")
+
+    cache = parser.add_argument_group("cold-cache behaviour")
+    cache.add_argument("--warm-fraction", type=float, default=0.3, help="Share of MBIDs that are warm from the start")
+    cache.add_argument("--cold-min", type=int, default=1, help="Fewest 503s a cold MBID returns before 200")
+    cache.add_argument("--cold-max", type=int, default=8, help="Most 503s a cold MBID returns before 200")
+    cache.add_argument("--cold-seconds-max", type=float, default=0.0,
+                       help="Warm cold MBIDs up to this many seconds after their first request, "
+                            "however often they are probed (0 = count 503s instead)")
+    cache.add_argument("--not-found-rate", type=float, default=0.02, help="Share of MBIDs that always return 404")
+
+    timing = parser.add_argument_group("latency and failures")
+    timing.add_argument("--latency-ms", type=float, default=30.0, help="Mean response latency")
+    timing.add_argument("--latency-dist", choices=("fixed", "uniform", "exponential", "lognormal"), default="lognormal")
+    timing.add_argument("--timeout-rate", type=float, default=0.0, help="Share of requests that hang")
+    timing.add_argument("--timeout-hang", type=float, default=30.0, help="Seconds a hung request takes")
+    timing.add_argument("--capacity", type=int, default=0,
+                        help="Requests served concurrently; more queue, so latency grows with load (0 = unlimited)")
+
+    limits = parser.add_argument_group("rate limiting")
+    limits.add_argument("--rate-limit", type=float, default=0.0, help="Server-side req/sec limit (0 = none)")
+    limits.add_argument("--rate-limit-burst", type=float, default=5.0)
+    limits.add_argument("--burst-429-every", type=float, default=0.0, help="Start a 429 burst every N seconds (0 = never)")
+    limits.add_argument("--burst-429-duration", type=float, default=2.0, help="Length of each 429 burst in seconds")
+    limits.add_argument("--retry-after", type=int, default=2, help="Retry-After seconds sent with 429s")
+    return parser
+
+
+def main() -> None:
+    options = build_parser().parse_args()
+    print(f"Mock server on http://{options.host}:{options.port} "
+          f"({options.artists} artists, seed {options.seed})", flush=True)
+    web.run_app(build_app(options), host=options.host, port=options.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
+import asyncio
 import configparser
 import os
 import signal
 import subprocess
 import sys
+import threading
 import time
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
 
 DEFAULT_CONFIG = '''# config.ini
 # Generated automatically on first run. Edit and set your Lidarr API key.
@@ -48,14 +52,29 @@ update_lidarr = false
 # Run every N seconds (>=1). Example: 3600 = hourly
 interval_seconds = 3600
 run_at_start = true
+# subprocess = start a fresh checker process per run
+# daemon     = run the checker in this process, keeping the ledger, connections
+#              and learned rate limit between runs
+mode = subprocess
 
 [monitoring]
 log_progress_every_n = 25
 log_level = INFO
+# Serve Prometheus metrics on http://<host>:<metrics_port>/metrics (0 = off)
+metrics_port = 0
 '''
 
 STOP = False
 
+# Scheduler-level numbers exposed next to the checker's own metrics
+SCHEDULER_METRICS = {
+    "runs": {},                 # exit code -> count
+    "last_exit_code": None,
+    "last_run_duration": None,
+    "last_run_end": None,
+    "next_run_at": None,
+}
+
 def _sig_handler(signum, frame):
     global STOP
     STOP = True
@@ -66,6 +85,182 @@ def parse_bool(s: str, default: bool = False) -> bool:
         return default
     return s.strip().lower() in ("1", "true", "yes", "on")
 
+def render_scheduler_metrics() -> str:
+    m = SCHEDULER_METRICS
+    lines = [
+        "# HELP lidarr_mbid_scheduler_runs_total Scheduled checker runs, by exit code",
+        "# TYPE lidarr_mbid_scheduler_runs_total counter",
+    ]
+    for code, count in sorted(m["runs"].items()):
+        lines.append(f'lidarr_mbid_scheduler_runs_total{{exit_code="{code}"}} {count}')
+    gauges = [
+        ("last_exit_code", "Exit code of the last checker run", m["last_exit_code"]),
+        ("last_run_duration_seconds", "Wall time of the last checker run", m["last_run_duration"]),
+        ("last_run_end_timestamp_seconds", "Unix time the last checker run finished", m["last_run_end"]),
+        ("next_run_timestamp_seconds", "Unix time of the next scheduled run", m["next_run_at"]),
+    ]
+    for name, help_text, value in gauges:
+        if value is None:
+            continue
+        lines.append(f"# HELP lidarr_mbid_scheduler_{name} {help_text}")
+        lines.append(f"# TYPE lidarr_mbid_scheduler_{name} gauge")
+        lines.append(f"lidarr_mbid_scheduler_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def read_metrics_textfile(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return ""  # No run has written metrics yet
+
+def start_metrics_server(port: int, render: Callable[[], str]) -> ThreadingHTTPServer:
+    """Serve /metrics from a background thread: the checker's metrics (from `render`) plus scheduler metrics"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = (render() + render_scheduler_metrics()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes every few seconds would drown the run logs
+
+    server = ThreadingHTTPServer(("", port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[{datetime.now().isoformat()}] Serving Prometheus metrics on :{port}/metrics", flush=True)
+    return server
+
+def record_run(exit_code: int, run_started: float) -> None:
+    SCHEDULER_METRICS["runs"][exit_code] = SCHEDULER_METRICS["runs"].get(exit_code, 0) + 1
+    SCHEDULER_METRICS["last_exit_code"] = exit_code
+    SCHEDULER_METRICS["last_run_end"] = time.time()
+    SCHEDULER_METRICS["last_run_duration"] = round(SCHEDULER_METRICS["last_run_end"] - run_started, 3)
+
+def force_run_requested() -> bool:
+    # Optional: FORCE_RUN=true to pass --force through the scheduler
+    return os.environ.get("FORCE_RUN", "false").lower() in ("1", "true", "yes", "on")
+
+def shard_requested(cp: configparser.ConfigParser) -> str:
+    # Optional: SHARD=i/N gives each container its own part of the library
+    return os.environ.get("SHARD", "").strip() or cp.get("run", "shard", fallback="").strip()
+
+def shard_metrics_path(path: str, shard: str) -> str:
+    # A sharded checker writes mbids metrics to e.g. metrics.shard2of4.prom
+    index, _, count = shard.partition("/")
+    if not count.strip() or int(count) <= 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{int(index)}of{int(count)}{ext}"
+
+def jitter_delay(jitter_seconds: int) -> int:
+    if jitter_seconds <= 0:
+        return 0
+    try:
+        return int.from_bytes(os.urandom(2), "big") % (jitter_seconds + 1)
+    except Exception:
+        return 0
+
+async def run_daemon(config_path: str, interval_seconds: int, run_at_start: bool,
+                     jitter_seconds: int, max_runs: int, metrics_port: int, shard: str) -> int:
+    """Daemon mode: import the checker once and run it in this process every interval.
+
+    The ledger, pooled connections and the rate limiter's learned state carry over
+    between runs. SIGTERM/SIGINT let in-flight requests finish, save the ledger and exit.
+    Returns the process exit code.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import lidarr_mbid_check as mbid_check
+
+    try:
+        cfg = mbid_check.load_config(config_path, shard=shard)
+    except Exception as e:
+        print(f"ERROR loading config: {e}", file=sys.stderr)
+        return 2
+    if force_run_requested():
+        cfg["force"] = True
+    config_issues = mbid_check.validate_config(cfg)
+    if config_issues:
+        print("Configuration issues found:", file=sys.stderr)
+        for issue in config_issues:
+            print(f"  - {issue}", file=sys.stderr)
+        return 2
+
+    if metrics_port > 0:
+        start_metrics_server(metrics_port, mbid_check.METRICS.render)
+
+    checker = mbid_check.Checker(cfg)
+    await checker.open()
+    stop = asyncio.Event()
+
+    def on_signal(signum):
+        print(f"[{datetime.now().isoformat()}] Received signal {signum}. "
+              f"Finishing in-flight requests and saving the ledger...", flush=True)
+        stop.set()
+        checker.request_stop()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, on_signal, signum)
+
+    async def sleep_or_stop(seconds: float) -> bool:
+        """Sleep for `seconds`; returns True early if a stop was requested"""
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=seconds)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    run_count = 0
+    try:
+        if not run_at_start:
+            print(f"[{datetime.now().isoformat()}] Waiting {interval_seconds}s before first run...", flush=True)
+            await sleep_or_stop(interval_seconds)
+
+        while not stop.is_set():
+            delay_before = jitter_delay(jitter_seconds)
+            if delay_before > 0:
+                print(f"[{datetime.now().isoformat()}] Sleeping jitter {delay_before}s before run...", flush=True)
+                if await sleep_or_stop(delay_before):
+                    break
+
+            print(f"[{datetime.now().isoformat()}] Starting lidarr MBID check (in-process)...", flush=True)
+            run_started = time.time()
+            try:
+                await checker.run()
+                exit_code = 0
+            except RuntimeError as e:
+                print(f"ERROR: {e}", file=sys.stderr)
+                exit_code = 2
+            except Exception as e:
+                print(f"ERROR during run: {type(e).__name__}: {e}", file=sys.stderr)
+                exit_code = 1
+            print(f"[{datetime.now().isoformat()}] Run complete (exit={exit_code}).", flush=True)
+            record_run(exit_code, run_started)
+
+            run_count += 1
+            if max_runs > 0 and run_count >= max_runs:
+                print(f"[{datetime.now().isoformat()}] Reached max_runs={max_runs}. Exiting.", flush=True)
+                break
+            if stop.is_set():
+                break
+
+            print(f"[{datetime.now().isoformat()}] Sleeping {interval_seconds}s until next run...", flush=True)
+            SCHEDULER_METRICS["next_run_at"] = round(time.time() + interval_seconds)
+            await sleep_or_stop(interval_seconds)
+    finally:
+        await checker.close()
+
+    print(f"[{datetime.now().isoformat()}] Exited entrypoint loop.", flush=True)
+    return 0
+
 def main():
     # Allow overriding the config path via env var, default to /data/config.ini
     config_path = os.environ.get("CONFIG_PATH", "/data/config.ini")
@@ -88,11 +283,31 @@ def main():
     run_at_start     = parse_bool(cp.get("schedule", "run_at_start", fallback="true"))
     jitter_seconds   = cp.getint("schedule", "jitter_seconds", fallback=0)  # optional, default 0
     max_runs         = cp.getint("schedule", "max_runs", fallback=0)        # 0 = unlimited
+    mode             = cp.get("schedule", "mode", fallback="subprocess").strip().lower()
+
+    metrics_port     = cp.getint("monitoring", "metrics_port", fallback=0)   # 0 = off
+    metrics_path     = cp.get("monitoring", "metrics_path", fallback="").strip() or "/data/metrics.prom"
+    shard            = shard_requested(cp)
 
     if interval_seconds < 1:
         print("ERROR: [schedule].interval_seconds must be >= 1", file=sys.stderr)
         sys.exit(2)
 
+    if mode not in ("subprocess", "daemon"):
+        print("ERROR: [schedule].mode must be 'subprocess' or 'daemon'", file=sys.stderr)
+        sys.exit(2)
+
+    if mode == "daemon":
+        sys.exit(asyncio.run(run_daemon(config_path, interval_seconds, run_at_start,
+                                        jitter_seconds, max_runs, metrics_port, shard)))
+
+    if metrics_port > 0:
+        try:
+            metrics_path = shard_metrics_path(metrics_path, shard)
+        except ValueError:
+            pass  # The checker reports the malformed shard on its first run
+        start_metrics_server(metrics_port, lambda: read_metrics_textfile(metrics_path))
+
     # Signal handling for graceful exit
     signal.signal(signal.SIGTERM, _sig_handler)
     signal.signal(signal.SIGINT, _sig_handler)
@@ -112,12 +327,7 @@ def main():
         first_loop = False
 
         # Optional jitter
-        delay_before = 0
-        if jitter_seconds > 0:
-            try:
-                delay_before = int.from_bytes(os.urandom(2), "big") % (jitter_seconds + 1)
-            except Exception:
-                delay_before = 0
+        delay_before = jitter_delay(jitter_seconds)
 
         if delay_before > 0:
             print(f"[{datetime.now().isoformat()}] Sleeping jitter {delay_before}s before run...", flush=True)
@@ -128,16 +338,19 @@ def main():
         # Run the main script once
         print(f"[{datetime.now().isoformat()}] Starting lidarr MBID check...", flush=True)
         extra = []
-        # Optional: FORCE_RUN=true to pass --force through the scheduler
-        if os.environ.get("FORCE_RUN", "false").lower() in ("1", "true", "yes", "on"):
+        if force_run_requested():
             extra.append("--force")
+        if shard:
+            extra += ["--shard", shard]
 
+        run_started = time.time()
         proc = subprocess.run(
             ["python", "/app/lidarr_mbid_check.py", "--config", config_path] + extra,
             stdout=sys.stdout,
             stderr=sys.stderr,
         )
         print(f"[{datetime.now().isoformat()}] Run complete (exit={proc.returncode}).", flush=True)
+        record_run(proc.returncode, run_started)
 
         run_count += 1
         if max_runs > 0 and run_count >= max_runs:
@@ -148,6 +361,7 @@ def main():
 
         # Sleep until next run
         print(f"[{datetime.now().isoformat()}] Sleeping {interval_seconds}s until next run...", flush=True)
+        SCHEDULER_METRICS["next_run_at"] = round(time.time() + interval_seconds)
         for _ in range(interval_seconds):
             if STOP:
                 break
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
 import argparse
 import asyncio
+import bisect
+import codecs
+import collections
+import collections.abc
 import configparser
 import csv
+import enum
+import hashlib
+import heapq
+import itertools
+import json
+import math
 import os
 import random
+import re
+import sqlite3
 import sys
+import threading
 import time
-from collections import deque
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Tuple
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Coroutine, Dict, List, Mapping, Optional, Tuple, Union
 
 import aiohttp
 import requests
@@ -21,51 +34,495 @@ DEFAULT_CONFIG = '''# config.ini
 # Default Lidarr URL
 base_url = http://192.168.1.103:8686
 api_key  = REPLACE_WITH_YOUR_LIDARR_API_KEY
+# Start probing while the artist list is still downloading (useful for large libraries)
+stream_artists = false
+# Artists deleted from Lidarr since the last run:
+# mark = keep the row with status "removed" and stop probing it (default)
+# prune = delete the row from the ledger
+# keep = leave the row as is (pending rows are still probed)
+removed_artists = mark
 
 [probe]
 # API to probe for each MBID
 target_base_url = https://api.lidarr.audio/api/v0.4
 timeout_seconds = 10
+# What to warm: artist, album, or both (artist, album). Albums (release groups) are
+# streamed from Lidarr's /api/v1/album after the artists and probed at /album/{mbid}
+entities = artist
 
-# Per-artist retry settings (for cache warming)
+# Per-artist retry settings (for cache warming). 429 responses do not count towards
+# max_attempts_per_artist; see [retry] for how long each kind of failure waits
 max_attempts_per_artist = 25
 delay_between_attempts = 0.5
 
 # Concurrent request settings
 max_concurrent_requests = 5
+# Adapt the number of in-flight requests to the API's latency: grow while responses
+# arrive as fast as usual, back off when latency climbs or timeouts/429s appear.
+# The limit then stays between min_concurrent_requests and max_concurrent_requests
+adaptive_concurrency = false
+min_concurrent_requests = 1
+# Recent latency above this multiple of the unloaded latency counts as congestion
+latency_tolerance = 2.0
+# Fractional rates such as 0.7 are allowed
 rate_limit_per_second = 3
+# Requests allowed back-to-back after an idle period (1 = strictly evenly spaced)
+rate_limit_burst = 1
 
 # Circuit breaker settings (stops entire run if API is completely down)
 circuit_breaker_threshold = 25
 backoff_factor = 2.0
 max_backoff_seconds = 60
 
+# More endpoints to warm in the same run, e.g. a self-hosted mirror: one [target:<name>]
+# section each (name: lowercase letters, digits, _). Each gets its own rate limiter,
+# workers and circuit breaker, so a slow or failing one does not hold up the others,
+# and its own <name>_status, <name>_attempts, ... columns in the ledger.
+# Settings not given are taken from [probe]. Lidarr refreshes follow [probe] only.
+# [target:mirror]
+# base_url = http://192.168.1.50:5001/api/v0.4
+# rate_limit_per_second = 20
+# max_concurrent_requests = 10
+# circuit_breaker_threshold = 25
+
 [ledger]
 # For Docker single-volume usage, keep this as /data/mbids.csv
 csv_path = /data/mbids.csv
+# csv = rewrite mbids.csv periodically
+# journal = append each result to mbids.csv.journal, folded into mbids.csv at run end
+#           or once the journal exceeds journal_compact_mb
+# sqlite = per-result upserts into sqlite_path
+# (an existing csv_path is imported the first time the database is created)
+backend = csv
+sqlite_path = /data/mbids.db
+journal_compact_mb = 4
 
 [run]
 # Re-check successes if true or use --force CLI flag
 force = false
 batch_size = 25
 batch_write_frequency = 5
+# Re-verify successes older than this many hours (0 = never; --force re-checks everything).
+# Each run takes at most successes * [schedule] interval_seconds / TTL of them, oldest
+# first, so rechecks are spread evenly instead of arriving all at once
+success_ttl_hours = 0
+# After a run ends in timeout, wait before trying that MBID again. The wait doubles
+# with each consecutive failed run (1h, 2h, 4h, ...) up to the max. 0 = retry every run
+failure_backoff_hours = 1
+failure_backoff_max_hours = 168
+
+# Check order: higher weight goes first. new = never checked, timeout = earlier
+# timeouts, recheck = successes past their TTL (or all successes with --force)
+priority_new = 3
+priority_timeout = 2
+priority_recheck = 1
+# Order within timeouts: fewest_attempts (then least recently tried) or least_recent
+timeout_order = fewest_attempts
+# Split the work across several containers: "i/N" makes this one check only shard i
+# of N (MBIDs are assigned by hash) at 1/N of the rate limit, burst and concurrency.
+# Empty = a single shard. --shard and the SHARD environment variable override it
+shard =
+
+[retry]
+# How to retry each kind of failed attempt. The n-th retry after an outcome waits a
+# random time between 0 and min(<outcome>_max_delay, <outcome>_delay * 2^(n-1))
+# (exponential backoff with full jitter; jitter = none waits the full amount).
+# <outcome>_max_attempts gives up on an MBID after that many of the outcome
+# (0 = only max_attempts_per_artist applies).
+jitter = full
+# 503: the cache is still being built, retry soon (cache_miss_delay defaults to
+# [probe] delay_between_attempts)
+cache_miss_max_delay = 8
+# 404: maybe an MBID the API does not know, so retry slowly and not for long
+not_found_delay = 5
+not_found_max_delay = 60
+not_found_max_attempts = 3
+# 429: the rate limiter already waits as the server asks, so retry as soon as it allows
+rate_limited_delay = 0
+rate_limited_max_delay = 0
+# No response within timeout_seconds
+timeout_delay = 2
+timeout_max_delay = 30
+# DNS/connection failures pause ALL requests for this backoff, since the API (or the
+# network) is unreachable rather than slow for one MBID
+connection_delay = 5
+connection_max_delay = 120
+# Any other status code
+other_delay = 1
+other_max_delay = 30
+
+[warmup]
+# Learn how long cold MBIDs take to warm up (seconds from the first 503 to the 200)
+# and retry each 503 near the predicted warm time instead of on the [retry] backoff.
+# The model is saved next to the ledger (default: csv_path with .warmup.json)
+learn = true
+# Retry once this share of past warm-ups that took at least as long had finished
+quantile = 0.5
+# Warm-ups observed before the model is used, and the longest wait it may pick
+min_samples = 50
+max_wait_seconds = 300
+# Lower max_attempts_per_artist to the point of diminishing returns: the last attempt
+# that still warmed at least min_yield of the cold MBIDs reaching it, plus one, learned
+# from pending and timed-out MBIDs only (max_attempts_per_artist stays the ceiling,
+# min_attempts the floor)
+auto_max_attempts = false
+min_yield = 0.05
+min_attempts = 5
 
 [actions]
 # If true, when a probe transitions from (no status or timeout) -> success,
 # trigger a non-blocking refresh of that artist in Lidarr.
 update_lidarr = false
+# Refreshes are sent as one RefreshArtist command per batch of up to
+# refresh_batch_size artists, waiting at most refresh_max_delay_seconds to fill it
+refresh_batch_size = 50
+refresh_max_delay_seconds = 10
 
 [schedule]
 # Used by entrypoint.py (scheduler) if you run that directly
 interval_seconds = 3600
 run_at_start = true
+# subprocess = start a fresh checker process per run
+# daemon     = run the checker inside the scheduler, keeping the ledger, connections
+#              and learned rate limit between runs
+mode = subprocess
 
 [monitoring]
 log_progress_every_n = 25
 log_level = INFO
+# Where results_<timestamp>.log files are written
+results_dir = /data
+# Prometheus metrics: entrypoint.py serves /metrics on this port (0 = off).
+# The checker writes the metrics to metrics_path (default /data/metrics.prom
+# when metrics_port is set), which also works with node_exporter's textfile collector
+metrics_port = 0
+metrics_path =
 '''
 
 
+class LatencyHistogram:
+    """Fixed log-spaced buckets for response times, so percentiles cost O(1) memory"""
+    
+    def __init__(self, min_seconds: float = 0.001, max_seconds: float = 120.0, growth: float = 1.05):
+        self.bounds: List[float] = []
+        bound = min_seconds
+        while bound < max_seconds:
+            self.bounds.append(bound)
+            bound *= growth
+        self.bounds.append(max_seconds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is overflow
+        self.count = 0
+        self.total = 0.0
+    
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (0 < q <= 1)"""
+        if self.count == 0:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return self.bounds[min(i, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+
+def _format_metric_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_metric_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """Minimal Prometheus registry: counters, gauges and histograms in the text exposition format.
+
+    Metrics are declared once, then updated with inc/set/observe using keyword labels.
+    Rendering is safe from another thread (e.g. an HTTP server) while the event loop updates.
+    """
+
+    def __init__(self, namespace: str = "lidarr_mbid"):
+        self.namespace = namespace
+        self._kinds: Dict[str, Tuple[str, str, Optional[Tuple[float, ...]]]] = {}
+        self._series: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+        self._lock = threading.Lock()
+
+    def declare(self, name: str, kind: str, help_text: str, buckets: Optional[Tuple[float, ...]] = None) -> None:
+        self._kinds[name] = (kind, help_text, tuple(sorted(buckets)) if buckets else None)
+        self._series.setdefault(name, {})
+
+    def inc(self, name: str, amount: float = 1.0, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            series[key] = series.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._series[name][tuple(sorted(labels.items()))] = float(value)
+
+    def clear(self, name: str) -> None:
+        """Drop every labelled series of a metric (for gauges whose label set changes)"""
+        with self._lock:
+            self._series[name].clear()
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        buckets = self._kinds[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series[name]
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(buckets), 0.0, 0]
+            i = bisect.bisect_left(buckets, value)
+            if i < len(buckets):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in self._kinds.items():
+                full_name = f"{self.namespace}_{name}"
+                lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, value in sorted(self._series[name].items()):
+                    if kind != "histogram":
+                        lines.append(f"{full_name}{_format_metric_labels(key)} {_format_metric_value(value)}")
+                        continue
+                    counts, total, count = value
+                    cumulative = 0
+                    for bound, n in zip(buckets, counts):
+                        cumulative += n
+                        le = (("le", _format_metric_value(bound)),)
+                        lines.append(f"{full_name}_bucket{_format_metric_labels(key + le)} {cumulative}")
+                    lines.append(f"{full_name}_bucket{_format_metric_labels(key + (('le', '+Inf'),))} {count}")
+                    lines.append(f"{full_name}_sum{_format_metric_labels(key)} {_format_metric_value(total)}")
+                    lines.append(f"{full_name}_count{_format_metric_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str) -> None:
+        """Write the rendered metrics atomically, so readers never see a partial file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+METRICS = MetricsRegistry()
+METRICS.declare("probe_requests_total", "counter", "Probe requests by target and result (HTTP status code, timeout or error)")
+METRICS.declare("probe_latency_seconds", "histogram", "Probe response time in seconds, by target",
+                buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+METRICS.declare("artist_attempts", "histogram", "Attempts used per checked artist, by outcome",
+                buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55))
+METRICS.declare("artists_checked_total", "counter", "Artists checked, by outcome")
+METRICS.declare("run_artists_checked", "gauge", "Artists checked in the current or last run, by outcome")
+METRICS.declare("run_in_progress", "gauge", "1 while a check run is active")
+METRICS.declare("run_start_timestamp_seconds", "gauge", "Unix time the current or last run started")
+METRICS.declare("run_end_timestamp_seconds", "gauge", "Unix time the last run finished")
+METRICS.declare("rate_limit_requests_per_second", "gauge", "Current client-side probe rate, by target")
+METRICS.declare("concurrency_limit", "gauge", "Probe requests allowed in flight at once, by target")
+METRICS.declare("server_rate_limit_requests_per_second", "gauge", "Rate advertised by the target's rate-limit headers")
+METRICS.declare("circuit_breaker_open", "gauge", "1 while a target's circuit breaker is blocking requests")
+METRICS.declare("circuit_breaker_consecutive_failures", "gauge", "Consecutive connection errors and 429s, by target")
+METRICS.declare("circuit_breaker_opens_total", "counter", "Runs cut short by the circuit breaker")
+METRICS.inc("circuit_breaker_opens_total", 0)
+METRICS.declare("retry_queue_size", "gauge", "MBIDs waiting for their next attempt")
+METRICS.declare("warmup_seconds", "gauge", "Learned seconds from the first 503 to the 200, by quantile")
+METRICS.declare("max_attempts_per_artist", "gauge", "Attempts allowed per artist in the current or last run")
+METRICS.declare("ledger_artists", "gauge", "Artists in the ledger, by status")
+
+
+def _status_label(status_code) -> str:
+    """Prometheus label for a probe result: the HTTP status, 'timeout' or 'error'"""
+    if status_code == "TIMEOUT":
+        return "timeout"
+    if isinstance(status_code, int) and status_code > 0:
+        return str(status_code)
+    return "error"
+
+
+def record_limiter_metrics(rate_limiter: "SafeRateLimiter", target: str = "primary") -> None:
+    METRICS.set("rate_limit_requests_per_second", rate_limiter.current_rate, target=target)
+    METRICS.set("concurrency_limit", rate_limiter.concurrency.current, target=target)
+    if rate_limiter.server_rate is not None:
+        METRICS.set("server_rate_limit_requests_per_second", rate_limiter.server_rate, target=target)
+    open_now = rate_limiter.consecutive_failures >= rate_limiter.circuit_breaker_threshold
+    METRICS.set("circuit_breaker_open", 1 if open_now else 0, target=target)
+    METRICS.set("circuit_breaker_consecutive_failures", rate_limiter.consecutive_failures, target=target)
+
+
+def record_ledger_metrics(ledger: Dict[str, "LedgerRow"]) -> None:
+    counts: Dict[str, int] = {}
+    for row in ledger.values():
+        status = row.status.label or "pending"
+        counts[status] = counts.get(status, 0) + 1
+    METRICS.clear("ledger_artists")
+    for status in ("success", "timeout", "pending"):
+        counts.setdefault(status, 0)
+    for status, n in counts.items():
+        METRICS.set("ledger_artists", n, status=status)
+
+
+def metrics_textfile_path(cfg: dict) -> Optional[str]:
+    """Where the checker writes its metrics, or None when metrics are off"""
+    if cfg.get("metrics_path"):
+        return cfg["metrics_path"]
+    if cfg.get("metrics_port", 0) > 0:
+        return "/data/metrics.prom"
+    return None
+
+
+def publish_metrics(cfg: dict) -> None:
+    path = metrics_textfile_path(cfg)
+    if not path:
+        return
+    try:
+        METRICS.write_textfile(path)
+    except OSError as e:
+        print(f"WARNING: Failed to write metrics to {path}: {e}", file=sys.stderr)
+
+
+class GcraRateLimiter:
+    """GCRA (virtual-scheduling token bucket) pacing requests at `rate` per second.
+
+    Up to `burst` requests may go back-to-back after an idle period; beyond that
+    requests are spaced exactly 1/rate apart. Fractional rates (e.g. 0.7 req/sec)
+    are supported. Waiters are served in arrival order, since asyncio.Lock wakes
+    its waiters FIFO, and all timing uses time.monotonic().
+    """
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tat = 0.0  # theoretical arrival time of the next conforming request
+        self._lock = asyncio.Lock()
+    
+    async def wait(self) -> None:
+        """Block until this request conforms to the rate, then consume its slot"""
+        async with self._lock:
+            arrival = time.monotonic()
+            # Re-check after every sleep: a hold_until() or rate change may have arrived meanwhile
+            while True:
+                interval = 1.0 / self.rate
+                tolerance = (self.burst - 1) * interval
+                tat = max(self._tat, arrival)
+                delay = tat - tolerance - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            # Advance from the schedule rather than the wake-up time so sleep overshoot never accumulates
+            self._tat = tat + interval
+    
+    def hold_until(self, until: float) -> None:
+        """Admit nothing before the monotonic time `until`, and no burst straight after it"""
+        tolerance = (self.burst - 1) / self.rate
+        self._tat = max(self._tat, until + tolerance)
+
+
+class ConcurrencyLimit:
+    """Caps requests in flight, serving waiters in arrival order.
+
+    Fixed at max_limit unless `adaptive`: then the limit grows while latency stays within
+    `tolerance` x the unloaded baseline and is cut by `backoff_ratio` (AIMD) when it does not.
+    """
+    
+    SMOOTHING = 0.1               # ~ the last 20 completions
+    BASELINE_DRIFT = 0.001        # per second, so the baseline can double in ~12 minutes
+    
+    def __init__(self, max_limit: int, min_limit: int = 1, adaptive: bool = False,
+                 tolerance: float = 2.0, backoff_ratio: float = 0.9):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.adaptive = adaptive
+        self.limit = float(self.min_limit if adaptive else self.max_limit)
+        self.tolerance = tolerance
+        self.backoff_ratio = backoff_ratio
+        self.in_flight = 0
+        self.smoothed_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self._baseline_at = 0.0
+        self.decreases = 0
+        self._since_decrease = 0
+        self._waiters: collections.deque = collections.deque()
+    
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+    
+    async def acquire(self) -> None:
+        if self.in_flight < self.current and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled: pass it on
+                self.give_back()
+            else:
+                self._waiters.remove(waiter)
+            raise
+    
+    def release(self, latency: float, dropped: bool = False) -> None:
+        """Free a slot, feeding the request's latency (and whether it was dropped) to the limit"""
+        self.in_flight -= 1
+        if self.adaptive:
+            self._update(latency, dropped)
+        self._wake()
+    
+    def give_back(self) -> None:
+        """Free a slot that never carried a request, without a latency sample"""
+        self.in_flight -= 1
+        self._wake()
+    
+    def _update(self, latency: float, dropped: bool) -> None:
+        # The baseline is the lowest smoothed latency, creeping up so a server that has
+        # become slower for good is eventually treated as normal
+        if not dropped:
+            now = time.monotonic()
+            if self.smoothed_latency is None:
+                self.smoothed_latency = self.baseline_latency = latency
+            else:
+                self.smoothed_latency += (latency - self.smoothed_latency) * self.SMOOTHING
+                drift = 1 + self.BASELINE_DRIFT * (now - self._baseline_at)
+                self.baseline_latency = min(self.smoothed_latency, self.baseline_latency * drift)
+            self._baseline_at = now
+        self._since_decrease += 1
+        congested = dropped or (self.baseline_latency is not None
+                                and self.smoothed_latency > self.baseline_latency * self.tolerance)
+        if congested:
+            # At most one cut per limit's worth of completions, so one slow burst cannot collapse it
+            if self._since_decrease >= self.limit and self.limit > self.min_limit:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                self.decreases += 1
+                self._since_decrease = 0
+        elif self.in_flight + 1 >= self.current:
+            # Only grow a limit the workers are actually using
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+    
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.current:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
 class SafeRateLimiter:
     """Production-safe rate limiter with circuit breaker and backoff"""
     
@@ -75,15 +532,19 @@ class SafeRateLimiter:
         max_concurrent: int = 5,
         circuit_breaker_threshold: int = 10,
         backoff_factor: float = 2.0,
-        max_backoff_seconds: float = 60.0
+        max_backoff_seconds: float = 60.0,
+        burst: int = 1,
+        min_concurrent: int = 1,
+        adaptive_concurrency: bool = False,
+        latency_tolerance: float = 2.0
     ):
         self.base_rate = requests_per_second
         self.current_rate = requests_per_second
         self.max_concurrent = max_concurrent
         
         # Rate limiting
-        self.request_times = deque()
-        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.bucket = GcraRateLimiter(requests_per_second, burst)
+        self.concurrency = ConcurrencyLimit(max_concurrent, min_concurrent, adaptive_concurrency, latency_tolerance)
         
         # Circuit breaker
         self.circuit_breaker_threshold = circuit_breaker_threshold
@@ -98,44 +559,64 @@ class SafeRateLimiter:
         self.total_rate_limits = 0
         self.total_errors = 0
         self.circuit_breaker_trips = 0
+        self.latency = LatencyHistogram()
+        
+        # Server-requested pause (Retry-After / exhausted quota) and advertised quota
+        self.paused_until = 0.0
+        self.total_server_pauses = 0
+        self.server_rate: Optional[float] = None
+        self.server_rate_until = 0.0
     
     async def acquire(self) -> bool:
         """Acquire permission to make a request. Returns False if circuit breaker is open."""
         if self._is_circuit_breaker_open():
             return False
         
-        await self.semaphore.acquire()
+        await self.concurrency.acquire()
         
         try:
             await self._rate_limit()
             self.total_requests += 1
             return True
-        except Exception:
-            self.semaphore.release()
+        except BaseException:
+            self.concurrency.give_back()
             raise
     
-    def release(self, status_code: int, response_time_seconds: float):
-        """Release the semaphore and record the result"""
-        self.semaphore.release()
+    def release(self, status_code: int, response_time_seconds: float,
+                headers: Optional[Mapping[str, str]] = None):
+        """Free the concurrency slot and record the result, applying any rate-limit headers"""
+        dropped = status_code in (0, 429, "TIMEOUT") or str(status_code).startswith("EXC:")
+        self.concurrency.release(response_time_seconds, dropped)
+        self.latency.observe(response_time_seconds)
+        
+        server_directed = self._apply_rate_limit_headers(status_code, headers) if headers else False
         
         if status_code == 200:
             self.total_successes += 1
             self.consecutive_failures = 0
-            # Gradually restore rate after success
-            if self.current_rate < self.base_rate:
-                self.current_rate = min(self.current_rate * 1.05, self.base_rate)
+            if self.server_rate is not None and time.monotonic() >= self.server_rate_until:
+                self.server_rate = None
+            # Gradually restore rate after success, up to what the server advertises
+            ceiling = self.base_rate if self.server_rate is None else min(self.base_rate, self.server_rate)
+            if self.current_rate < ceiling:
+                self.current_rate = min(self.current_rate * 1.05, ceiling)
                 
         elif status_code == 429:  # Rate limited - this is bad, reduce rate
             self.total_rate_limits += 1
             self.consecutive_failures += 1
-            self.last_failure_time = time.time()
-            self.current_rate *= 0.5
-            print(f"⚠️  Rate limited! Reducing rate to {self.current_rate:.2f} req/sec")
+            self.last_failure_time = time.monotonic()
+            if server_directed:
+                # The server told us how long to wait / how fast to go; no need to guess
+                print(f"⚠️  Rate limited! Server asked for a {max(0.0, self.paused_until - time.monotonic()):.1f}s pause, "
+                      f"rate {self.current_rate:.2f} req/sec")
+            else:
+                self.current_rate *= 0.5
+                print(f"⚠️  Rate limited! Reducing rate to {self.current_rate:.2f} req/sec")
             
         elif status_code in (0, "TIMEOUT") or str(status_code).startswith("EXC:"):  # Connection issues
             self.total_errors += 1
             self.consecutive_failures += 1
-            self.last_failure_time = time.time()
+            self.last_failure_time = time.monotonic()
             self.current_rate *= 0.8
             print(f"⚠️  Connection error {status_code}! Reducing rate to {self.current_rate:.2f} req/sec")
             
@@ -144,32 +625,72 @@ class SafeRateLimiter:
         else:
             self.consecutive_failures = 0  # Reset failures for expected responses
     
-    async def _rate_limit(self):
-        """Implement token bucket rate limiting"""
+    def _apply_rate_limit_headers(self, status_code, headers: Mapping[str, str]) -> bool:
+        """Apply Retry-After and X-RateLimit-*/RateLimit-* headers.
+
+        Returns True if the headers told us how to pace ourselves (so the caller
+        should not also apply its own blind backoff).
+        """
         now = time.time()
+        directed = False
+        
+        # A 503's Retry-After is about one MBID's cache (see probe_mbid_once), not the server
+        retry_after = _parse_retry_after(headers.get("Retry-After"), now, self.max_backoff_seconds)
+        if retry_after is not None and status_code == 429:
+            self._pause_for(retry_after)
+            directed = True
         
-        # Remove old request timestamps
-        while self.request_times and now - self.request_times[0] > 1.0:
-            self.request_times.popleft()
+        remaining = _header_float(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+        reset = _header_float(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+        if remaining is None or reset is None:
+            return directed
         
-        # Check if we're at the rate limit
-        if len(self.request_times) >= self.current_rate:
-            oldest_request = self.request_times[0]
-            wait_time = 1.0 - (now - oldest_request)
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-                now = time.time()
-                while self.request_times and now - self.request_times[0] > 1.0:
-                    self.request_times.popleft()
+        # Reset is either seconds-until-reset or an epoch timestamp; like Retry-After it is
+        # never trusted beyond max_backoff_seconds
+        if not math.isfinite(reset):
+            return directed
+        reset_in = reset - now if reset > 1e9 else reset
+        reset_in = min(max(reset_in, 0.0), self.max_backoff_seconds)
+        
+        if remaining <= 0:
+            if reset_in > 0:
+                self._pause_for(reset_in)
+            return True
         
-        self.request_times.append(now)
+        if reset_in > 0:
+            # Spread the remaining quota evenly over the window, never above our configured ceiling.
+            # The advertised rate lapses with the window so a tiny quota cannot pin us forever.
+            self.server_rate = remaining / reset_in
+            self.server_rate_until = time.monotonic() + reset_in
+            self.current_rate = max(min(self.server_rate, self.base_rate), 0.01)
+            directed = True
+        return directed
+    
+    def pause(self, seconds: float) -> None:
+        """Hold every request for `seconds`, e.g. while the API cannot be reached"""
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            self.bucket.hold_until(until)
+    
+    def _pause_for(self, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        if until > self.paused_until:
+            self.paused_until = until
+            self.total_server_pauses += 1
+            self.bucket.hold_until(until)
+    
+    async def _rate_limit(self):
+        """Pace the request through the GCRA bucket at the current rate"""
+        self.bucket.rate = max(self.current_rate, 0.01)
+        await self.bucket.wait()
     
     def _is_circuit_breaker_open(self) -> bool:
         """Check if circuit breaker should prevent requests"""
         if self.consecutive_failures < self.circuit_breaker_threshold:
             return False
         
-        time_since_failure = time.time() - self.last_failure_time
+        time_since_failure = time.monotonic() - self.last_failure_time
         backoff_time = min(
             self.backoff_factor ** (self.consecutive_failures - self.circuit_breaker_threshold),
             self.max_backoff_seconds
@@ -193,12 +714,249 @@ class SafeRateLimiter:
             "rate_limits_hit": self.total_rate_limits,
             "server_errors": self.total_errors,
             "current_rate": f"{self.current_rate:.2f} req/sec",
+            "concurrency_limit": self.concurrency.current,
+            "server_rate": f"{self.server_rate:.2f} req/sec" if self.server_rate is not None else "N/A",
+            "server_pauses": self.total_server_pauses,
             "circuit_breaker_failures": self.consecutive_failures,
             "circuit_breaker_trips": self.circuit_breaker_trips,
             "circuit_breaker_open": self._is_circuit_breaker_open()
         }
 
 
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    """First of the named headers that parses as a number"""
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            # RateLimit-* drafts may carry extra parameters ("10, 10;w=1")
+            return float(value.split(",")[0].split(";")[0].strip())
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_retry_after(value: Optional[str], now: float, ceiling: Optional[float] = None) -> Optional[float]:
+    """Retry-After as seconds from now, at most `ceiling`; accepts delta-seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - now
+        except (TypeError, ValueError):
+            return None
+    if not math.isfinite(seconds):
+        return None
+    seconds = max(0.0, seconds)
+    return seconds if ceiling is None else min(seconds, ceiling)
+
+
+class RetryScheduler:
+    """Time-ordered heap of MBIDs waiting for their next attempt"""
+    
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._counter = itertools.count()
+    
+    def schedule(self, mbid: str, due_at: float) -> None:
+        """Queue an MBID to be retried once the clock reaches due_at"""
+        heapq.heappush(self._heap, (due_at, next(self._counter), mbid))
+    
+    def pop_due(self, now: float) -> List[str]:
+        """Remove and return every MBID whose retry is due, earliest first"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+    
+    def next_due_at(self) -> Optional[float]:
+        """When the earliest pending retry becomes due, or None if nothing is waiting"""
+        return self._heap[0][0] if self._heap else None
+    
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+# Outcome classes of a failed attempt, each with its own [retry] policy
+RETRY_OUTCOMES = ("cache_miss", "not_found", "rate_limited", "timeout", "connection", "other")
+
+# Default [retry] settings per outcome: (delay, max_delay, max_attempts). cache_miss_delay
+# falls back to [probe] delay_between_attempts.
+RETRY_DEFAULTS = {
+    "cache_miss": (0.5, 8.0, 0),
+    "not_found": (5.0, 60.0, 3),
+    "rate_limited": (0.0, 0.0, 0),
+    "timeout": (2.0, 30.0, 0),
+    "connection": (5.0, 120.0, 0),
+    "other": (1.0, 30.0, 0),
+}
+
+
+# Exceptions (by the name in "EXC:<name>") meaning the API or network could not be
+# reached at all; anything else raised mid-request, e.g. ClientPayloadError, is "other"
+CONNECTION_EXCEPTIONS = frozenset({
+    "ClientConnectorError", "ClientConnectorDNSError", "ClientProxyConnectionError",
+    "UnixClientConnectorError", "ServerConnectionError", "ServerDisconnectedError",
+    "ClientOSError", "ConnectionRefusedError", "ConnectionResetError", "gaierror",
+})
+
+
+def retry_outcome(status_code) -> str:
+    """The RETRY_OUTCOMES class of a non-200 probe result"""
+    if status_code == 503:
+        return "cache_miss"
+    if status_code == 404:
+        return "not_found"
+    if status_code == 429:
+        return "rate_limited"
+    if status_code == "TIMEOUT":
+        return "timeout"
+    if status_code == 0:
+        return "connection"
+    if str(status_code).startswith("EXC:"):
+        return "connection" if status_code[len("EXC:"):] in CONNECTION_EXCEPTIONS else "other"
+    return "other"
+
+
+class RetryPolicy:
+    """Exponential backoff for one outcome class, capped at max_delay, with optional full jitter"""
+    
+    def __init__(self, delay: float, max_delay: float, max_attempts: int = 0, jitter: bool = True):
+        self.delay = delay
+        self.max_delay = max(delay, max_delay)
+        self.max_attempts = max_attempts
+        self.jitter = jitter
+    
+    def ceiling(self, n: int) -> float:
+        """Longest wait before the n-th retry (n >= 1) of this outcome"""
+        return min(self.max_delay, self.delay * 2 ** min(n - 1, 32))
+    
+    def backoff(self, n: int) -> float:
+        """Wait before the n-th retry: uniform in [0, ceiling] with jitter, else the ceiling"""
+        ceiling = self.ceiling(n)
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+    
+    def exhausted(self, n: int) -> bool:
+        """True once n of this outcome should end the MBID's run"""
+        return 0 < self.max_attempts <= n
+
+
+class WarmupModel:
+    """Running distribution of how long cold MBIDs took to warm up, from first 503 to 200.
+
+    Predictions use the distribution frozen by start_run(). `warmed` and `gave_up` count
+    cold MBIDs by the attempt they warmed or timed out on.
+    """
+    
+    def __init__(self, min_samples: int = 50, max_samples: int = 5000):
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.seconds = self._histogram()
+        self.warmed: collections.Counter = collections.Counter()
+        self.gave_up: collections.Counter = collections.Counter()
+        self.start_run()
+    
+    @staticmethod
+    def _histogram() -> LatencyHistogram:
+        return LatencyHistogram(min_seconds=0.1, max_seconds=3600.0, growth=1.1)
+    
+    def start_run(self) -> None:
+        """Freeze everything observed so far as the distribution to predict from"""
+        frozen = self._histogram()
+        frozen.counts = list(self.seconds.counts)
+        frozen.count = self.seconds.count
+        frozen.total = self.seconds.total
+        self.learned = frozen
+    
+    @property
+    def ready(self) -> bool:
+        return self.learned.count >= self.min_samples
+    
+    def observe(self, seconds: float, attempts: Optional[int] = None) -> None:
+        """Record a warm-up taking `seconds`, on attempt number `attempts` if it is to count
+        towards the attempt limit"""
+        self.seconds.observe(seconds)
+        if attempts is not None:
+            self._count(self.warmed, attempts)
+        if self.seconds.count > self.max_samples:
+            hist = self.seconds
+            hist.counts = [(n + 1) // 2 for n in hist.counts]
+            hist.total /= 2
+            hist.count = sum(hist.counts)
+    
+    def observe_gave_up(self, attempts: int) -> None:
+        """Record a cold MBID that ran out of attempts after `attempts`"""
+        self._count(self.gave_up, attempts)
+    
+    def _count(self, counter: collections.Counter, attempts: int) -> None:
+        counter[attempts] += 1
+        if sum(self.warmed.values()) + sum(self.gave_up.values()) > self.max_samples:
+            for c in (self.warmed, self.gave_up):
+                for k in list(c):
+                    c[k] //= 2
+                    if not c[k]:
+                        del c[k]
+    
+    def warm_at(self, elapsed: float, quantile: float) -> Optional[float]:
+        """Seconds since the first 503 by which `quantile` of the warm-ups still running at
+        `elapsed` had finished, or None if the model is not ready or never saw one that long"""
+        if not self.ready:
+            return None
+        hist = self.learned
+        start = bisect.bisect_left(hist.bounds, elapsed)
+        remaining = sum(hist.counts[start:])
+        if remaining == 0:
+            return None
+        seen = 0
+        for i in range(start, len(hist.counts)):
+            seen += hist.counts[i]
+            if seen >= quantile * remaining:
+                return hist.bounds[min(i, len(hist.bounds) - 1)]
+        return hist.bounds[-1]
+    
+    def to_dict(self) -> dict:
+        return {"counts": self.seconds.counts, "total": self.seconds.total,
+                "warmed": {str(k): n for k, n in self.warmed.items()},
+                "gave_up": {str(k): n for k, n in self.gave_up.items()}}
+    
+    def load_dict(self, data: dict) -> None:
+        counts = [int(n) for n in data["counts"]]
+        if len(counts) != len(self.seconds.counts):
+            raise ValueError("bucket layout changed")
+        self.seconds.counts = counts
+        self.seconds.count = sum(counts)
+        self.seconds.total = float(data.get("total", 0.0))
+        self.warmed = collections.Counter({int(k): int(n) for k, n in data.get("warmed", {}).items()})
+        self.gave_up = collections.Counter({int(k): int(n) for k, n in data.get("gave_up", {}).items()})
+        self.start_run()
+
+
+def load_warmup_model(path: str, min_samples: int) -> WarmupModel:
+    """Read the warm-up model saved by earlier runs, or start an empty one"""
+    model = WarmupModel(min_samples)
+    if not path or not os.path.exists(path):
+        return model
+    try:
+        with open(path, encoding="utf-8") as f:
+            model.load_dict(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"WARNING: Ignoring unreadable warm-up model {path}: {e}", file=sys.stderr)
+    return model
+
+
+def save_warmup_model(path: str, model: WarmupModel) -> None:
+    """Write the warm-up model atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(model.to_dict(), saved_at=iso_now()), f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
 def iso_now() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -229,8 +987,62 @@ def validate_config(cfg: dict) -> List[str]:
     if cfg.get("rate_limit_per_second", 0) <= 0:
         issues.append("rate_limit_per_second must be > 0")
     
+    if cfg.get("rate_limit_burst", 1) < 1:
+        issues.append("rate_limit_burst must be >= 1")
+    
     if cfg.get("max_concurrent_requests", 0) < 1:
         issues.append("max_concurrent_requests must be >= 1")
+    
+    if cfg.get("adaptive_concurrency", False):
+        if not 1 <= cfg.get("min_concurrent_requests", 1) <= cfg.get("max_concurrent_requests", 5):
+            issues.append("min_concurrent_requests must be between 1 and max_concurrent_requests")
+        if cfg.get("latency_tolerance", 2.0) <= 1:
+            issues.append("latency_tolerance must be > 1")
+    
+    if cfg.get("ledger_backend", "csv") not in ("csv", "journal", "sqlite"):
+        issues.append("[ledger].backend must be 'csv', 'journal' or 'sqlite'")
+    
+    if cfg.get("success_ttl_hours", 0) < 0:
+        issues.append("[run].success_ttl_hours must be >= 0 (0 = never re-verify)")
+    
+    if cfg.get("failure_backoff_hours", 1) < 0 or cfg.get("failure_backoff_max_hours", 168) < 0:
+        issues.append("[run].failure_backoff_hours and failure_backoff_max_hours must be >= 0")
+    
+    if cfg.get("retry_jitter", "full") not in ("full", "none"):
+        issues.append("[retry].jitter must be 'full' or 'none'")
+    
+    for outcome, policy in cfg.get("retry_policies", {}).items():
+        if policy.delay < 0 or policy.max_attempts < 0:
+            issues.append(f"[retry].{outcome}_delay and {outcome}_max_attempts must be >= 0")
+    
+    if not 0 < cfg.get("warmup_quantile", 0.5) < 1:
+        issues.append("[warmup].quantile must be between 0 and 1")
+    
+    if cfg.get("warmup_max_wait_seconds", 300) <= 0 or not 0 <= cfg.get("auto_max_attempts_min_yield", 0.05) < 1:
+        issues.append("[warmup].max_wait_seconds must be > 0 and min_yield between 0 and 1")
+    if cfg.get("auto_max_attempts_floor", 5) < 1:
+        issues.append("[warmup].min_attempts must be >= 1")
+    
+    entities = cfg.get("entities", ["artist"])
+    if not entities or any(e not in ENTITY_TYPES for e in entities):
+        issues.append("[probe].entities must list artist, album or both")
+    
+    for name, overrides in cfg.get("extra_targets", {}).items():
+        if not re.fullmatch(r"[a-z][a-z0-9_]*", name) or name == "primary":
+            issues.append(f"[target:{name}] name must be lowercase letters, digits and _ (and not 'primary')")
+        if not overrides.get("target_base_url"):
+            issues.append(f"[target:{name}].base_url is required")
+        if overrides.get("rate_limit_per_second", 1) <= 0 or overrides.get("max_concurrent_requests", 1) < 1:
+            issues.append(f"[target:{name}].rate_limit_per_second must be > 0 and max_concurrent_requests >= 1")
+    
+    if cfg.get("timeout_order", "fewest_attempts") not in ("fewest_attempts", "least_recent"):
+        issues.append("[run].timeout_order must be 'fewest_attempts' or 'least_recent'")
+    
+    if cfg.get("removed_artists", "mark") not in ("mark", "prune", "keep"):
+        issues.append("[lidarr].removed_artists must be 'mark', 'prune' or 'keep'")
+    
+    if not 0 <= cfg.get("metrics_port", 0) <= 65535:
+        issues.append("[monitoring].metrics_port must be between 0 and 65535")
         
     return issues
 
@@ -259,21 +1071,30 @@ def check_api_health(target_base_url: str, timeout: int = 10) -> dict:
 
 def estimate_runtime(to_check_count: int, cfg: dict) -> str:
     """Provide runtime estimates for cache warming workload"""
-    concurrent = min(cfg.get("max_concurrent_requests", 5), to_check_count)
+    concurrent = max(1, min(cfg.get("max_concurrent_requests", 5), to_check_count))
     rate_limit = cfg.get("rate_limit_per_second", 3)
-    effective_rate = min(concurrent, rate_limit)
     
     # For cache warming: assume average 60% of max_attempts needed
     # (some artists cache quickly, others need full attempts)
     avg_attempts = cfg.get("max_attempts_per_artist", 25) * 0.6
-    delay_per_attempt = cfg.get("delay_between_attempts", 0.5)
+    policy = cfg.get("retry_policies", {}).get("cache_miss")
+    if policy is None:
+        delay_per_attempt = cfg.get("delay_between_attempts", 0.5)
+    else:
+        # Mean of the jittered 503 backoff over a typical number of retries
+        retries = max(1, int(avg_attempts))
+        delay_per_attempt = sum(policy.ceiling(n) for n in range(1, retries + 1)) / retries
+        delay_per_attempt /= 2 if policy.jitter else 1
     
     # Time per artist = (attempts * delay) + (attempts * avg_response_time)
     estimated_time_per_artist = (avg_attempts * delay_per_attempt) + (avg_attempts * 0.3)  # 300ms avg response
     total_artist_time = to_check_count * estimated_time_per_artist
     
-    # Adjust for concurrency
-    estimated_seconds = total_artist_time / effective_rate
+    # Every attempt passes through the rate limiter, so the run is bounded by
+    # whichever is slower: total requests at the rate limit, or the workers themselves
+    request_bound_seconds = (to_check_count * avg_attempts) / rate_limit
+    worker_bound_seconds = total_artist_time / concurrent
+    estimated_seconds = max(request_bound_seconds, worker_bound_seconds)
     
     if estimated_seconds < 60:
         return f"~{estimated_seconds:.0f} seconds"
@@ -283,181 +1104,163 @@ def estimate_runtime(to_check_count: int, cfg: dict) -> str:
         return f"~{estimated_seconds/3600:.1f} hours"
 
 
-async def check_mbid_with_cache_warming(
+async def probe_mbid_once(
     session: aiohttp.ClientSession,
+    rate_limiter: SafeRateLimiter,
     mbid: str,
     target_base_url: str,
-    max_attempts: int = 25,
-    delay_between_attempts: float = 0.5,
-    timeout: int = 10
-) -> Tuple[str, str, int, float]:
-    """Check single MBID with cache warming - keep trying until success or max attempts"""
-    url = f"{target_base_url.rstrip('/')}/artist/{mbid}"
-    total_response_time = 0
-    
-    for attempt in range(max_attempts):
-        start_time = time.time()
-        try:
-            async with session.get(url) as resp:
-                response_time = time.time() - start_time
-                total_response_time += response_time
-                status_code = resp.status
-                
-                if status_code == 200:
-                    # SUCCESS! Cache warming worked
-                    return "success", str(status_code), attempt + 1, total_response_time
-                
-                # For cache warming, we retry ALL non-200 responses
-                # (503, 404, 429, etc. - keep trying until cache warms up)
-                
-        except asyncio.TimeoutError:
-            response_time = time.time() - start_time
-            total_response_time += response_time
-            status_code = "TIMEOUT"
-        except Exception as e:
-            response_time = time.time() - start_time
-            total_response_time += response_time
-            # For cache warming, even exceptions are worth retrying
-            status_code = f"EXC:{type(e).__name__}"
-        
-        # Wait between attempts (unless it's the last attempt)
-        if attempt < max_attempts - 1:
-            await asyncio.sleep(delay_between_attempts)
+    entity: str = "artist",
+    target: str = "primary"
+) -> Tuple[Optional[object], float, Optional[float]]:
+    """Make a single rate-limited probe of an artist or album MBID.
+
+    Returns (status_code, response_time, retry_after). status_code is the HTTP status,
+    "TIMEOUT", "EXC:<name>", or None if the circuit breaker is open and no request was
+    made. retry_after is a 503's Retry-After in seconds (capped at max_backoff_seconds).
+    `target` names the endpoint in the probe metrics.
+    """
+    if not await rate_limiter.acquire():
+        return None, 0.0, None
     
-    # Exhausted all attempts without success
-    return "timeout", str(status_code), max_attempts, total_response_time
-
-
-async def check_mbids_concurrent(
-    to_check: List[str],
-    cfg: dict,
-    ledger: dict,
-    mbid_to_name: dict,
-    mbid_to_lidarr_id: dict
-) -> Tuple[int, int, int]:
-    """Check MBIDs concurrently with individual logging. Returns (transitioned_count, new_successes, new_failures)"""
+    url = f"{target_base_url.rstrip('/')}/{entity}/{mbid}"
+    start_time = time.time()
+    headers = None
+    try:
+        async with session.get(url) as resp:
+            status_code = resp.status
+            headers = resp.headers
+    except asyncio.TimeoutError:
+        status_code = "TIMEOUT"
+    except Exception as e:
+        # For cache warming, even exceptions are worth retrying
+        status_code = f"EXC:{type(e).__name__}"
     
-    rate_limiter = SafeRateLimiter(
-        requests_per_second=cfg["rate_limit_per_second"],
-        max_concurrent=cfg["max_concurrent_requests"],
-        circuit_breaker_threshold=cfg.get("circuit_breaker_threshold", 10),
-        backoff_factor=cfg.get("backoff_factor", 2.0),
-        max_backoff_seconds=cfg.get("max_backoff_seconds", 60)
-    )
+    response_time = time.time() - start_time
+    rate_limiter.release(status_code, response_time, headers)
+    METRICS.inc("probe_requests_total", code=_status_label(status_code), target=target)
+    METRICS.observe("probe_latency_seconds", response_time, target=target)
+    retry_after = None
+    if status_code == 503 and headers:
+        retry_after = _parse_retry_after(headers.get("Retry-After"), time.time(), rate_limiter.max_backoff_seconds)
+    return status_code, response_time, retry_after
+
+
+# Lidarr artist endpoints, tried in order
+LIDARR_ARTIST_PATHS = [
+    "/api/v1/artist",
+    "/api/artist",
+    "/api/v3/artist",
+]
+
+# Lidarr album endpoints, tried in order
+LIDARR_ALBUM_PATHS = [
+    "/api/v1/album",
+]
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# What may follow a complete number or literal inside an array
+_JSON_SCALAR_ENDS = frozenset(" \t\n\r,]")
+
+
+class JsonArrayStreamParser:
+    """Incrementally split a top-level JSON array into its elements as bytes arrive.
+
+    Only the element currently being received is buffered, so memory stays flat
+    no matter how long the array is.
+    """
     
-    transitioned_count = 0
-    new_successes = 0
-    new_failures = 0
-    timeout_obj = aiohttp.ClientTimeout(total=cfg["timeout_seconds"])
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._started = False
+        self.finished = False
     
-    async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-        for i, mbid in enumerate(to_check):
-            # Check circuit breaker
-            if not await rate_limiter.acquire():
-                print(f"🚫 Circuit breaker open, skipping remaining {len(to_check) - i} MBIDs")
+    def feed(self, chunk: bytes) -> List[object]:
+        """Add bytes and return every element that is now complete"""
+        buf = self._buffer + self._text.decode(chunk)
+        items = []
+        pos = 0
+        while not self.finished:
+            pos = _JSON_WHITESPACE.match(buf, pos).end()
+            if pos >= len(buf):
                 break
-            
-            name = mbid_to_name.get(mbid, 'Unknown')
-            prev_status = ledger[mbid].get("status", "").lower()
-            
-            print(f"[{i+1}/{len(to_check)}] Checking {name} [{mbid}] ...", end="", flush=True)
-            
-            try:
-                status, last_code, attempts_used, response_time = await check_mbid_with_cache_warming(
-                    session,
-                    mbid,
-                    cfg["target_base_url"],
-                    cfg["max_attempts_per_artist"],
-                    cfg["delay_between_attempts"],
-                    cfg["timeout_seconds"]
-                )
-                
-                rate_limiter.release(int(last_code) if last_code.isdigit() else last_code, response_time)
-                
-                # Update ledger
-                ledger[mbid].update({
-                    "status": status,
-                    "attempts": attempts_used,
-                    "last_status_code": last_code,
-                    "last_checked": iso_now()
-                })
-                
-                # Count results
-                if status == "success":
-                    new_successes += 1
-                    print(f" SUCCESS (code={last_code}, attempts={attempts_used})")
-                else:
-                    new_failures += 1
-                    print(f" TIMEOUT (code={last_code}, attempts={attempts_used})")
-                
-                # Trigger Lidarr refresh if configured
-                if (cfg.get("update_lidarr", False) 
-                    and status == "success" 
-                    and prev_status in ("", "timeout")):
-                    artist_id = mbid_to_lidarr_id.get(mbid)
-                    trigger_lidarr_refresh(cfg["lidarr_url"], cfg["api_key"], artist_id)
-                    transitioned_count += 1
-                    print(f"  -> Triggered Lidarr refresh for {name} [artist_id={artist_id}]")
-                
-            except Exception as e:
-                response_time = 1.0  # Estimate for failed requests
-                rate_limiter.release(0, response_time)
-                
-                ledger[mbid].update({
-                    "status": "timeout",
-                    "attempts": 3,
-                    "last_status_code": f"EXC:{type(e).__name__}",
-                    "last_checked": iso_now()
-                })
-                
-                new_failures += 1
-                print(f" TIMEOUT (code=EXC:{type(e).__name__}, attempts=3)")
-            
-            # Batch writing
-            if (i + 1) % cfg.get("batch_write_frequency", 5) == 0:
-                write_ledger(cfg["csv_path"], ledger)
-            
-            # Progress reporting
-            if (i + 1) % cfg.get("log_progress_every_n", 25) == 0:
-                elapsed_time = time.time()
-                rate = (i + 1) / max(elapsed_time - start_run_time, 1) if 'start_run_time' in globals() else 0
-                eta_seconds = (len(to_check) - i - 1) / max(rate, 0.1)
-                stats = rate_limiter.get_stats()
-                print(f"Progress: {i+1}/{len(to_check)} ({((i+1)/len(to_check)*100):.1f}%) - "
-                      f"Rate: {rate:.1f}/sec - ETA: {eta_seconds/60:.1f}min - "
-                      f"API: {stats.get('current_rate', 'N/A')}")
+            ch = buf[pos]
+            if not self._started:
+                if ch != "[":
+                    raise ValueError("Expected a JSON array")
+                self._started = True
+                pos += 1
+            elif ch == ",":
+                pos += 1
+            elif ch == "]":
+                self.finished = True
+                pos += 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except ValueError:
+                    # Element not complete yet; wait for more bytes
+                    break
+                if not isinstance(item, (dict, list, str)) and buf[end:end + 1] not in _JSON_SCALAR_ENDS:
+                    # A number cut short by the chunk ("12" of "123", "1.5" of "1.5e3"): wait for more
+                    break
+                items.append(item)
+                pos = end
+        self._buffer = buf[pos:]
+        return items
     
-    return transitioned_count, new_successes, new_failures
+    def close(self) -> None:
+        if not self.finished:
+            raise ValueError("Truncated JSON array in response")
+
+
+def _artist_from_json(a: dict) -> Optional[Dict]:
+    """Keep only the fields we use from a Lidarr artist record"""
+    mbid = a.get("foreignArtistId") or a.get("mbId") or a.get("mbid")
+    if not mbid:
+        return None
+    name = a.get("artistName") or a.get("name") or "Unknown"
+    return {"id": a.get("id"), "name": name, "mbid": mbid}
+
+
+def _album_from_json(a: dict) -> Optional[Dict]:
+    """Keep only the fields we use from a Lidarr album record"""
+    mbid = a.get("foreignAlbumId")
+    if not mbid:
+        return None
+    title = a.get("title") or "Unknown"
+    artist_name = (a.get("artist") or {}).get("artistName")
+    name = f"{artist_name} - {title}" if artist_name else title
+    return {"id": a.get("id"), "name": name, "mbid": mbid, "entity": "album"}
 
 
 def get_lidarr_artists(base_url: str, api_key: str, timeout: int = 30) -> List[Dict]:
-    """Fetch artists from Lidarr and return a list of dicts with {id, name, mbid}."""
+    """Fetch artists from Lidarr and return a list of dicts with {id, name, mbid}.
+
+    The response is parsed as it streams in, so the full artist JSON (images,
+    links, statistics) is never held in memory at once.
+    """
     session = requests.Session()
     headers = {"X-Api-Key": api_key}
 
-    candidates = [
-        "/api/v1/artist",
-        "/api/artist", 
-        "/api/v3/artist",
-    ]
-
     last_exc = None
-    for path in candidates:
+    for path in LIDARR_ARTIST_PATHS:
         url = f"{base_url.rstrip('/')}{path}"
         try:
-            r = session.get(url, headers=headers, timeout=timeout)
-            if r.status_code == 404:
-                continue
-            r.raise_for_status()
-            data = r.json()
-            artists = []
-            for a in data:
-                mbid = a.get("foreignArtistId") or a.get("mbId") or a.get("mbid")
-                name = a.get("artistName") or a.get("name") or "Unknown"
-                lidarr_id = a.get("id")
-                if mbid:
-                    artists.append({"id": lidarr_id, "name": name, "mbid": mbid})
-            return artists
+            with session.get(url, headers=headers, timeout=timeout, stream=True) as r:
+                if r.status_code == 404:
+                    continue
+                r.raise_for_status()
+                parser = JsonArrayStreamParser()
+                artists = []
+                for chunk in r.iter_content(chunk_size=65536):
+                    for a in parser.feed(chunk):
+                        artist = _artist_from_json(a)
+                        if artist:
+                            artists.append(artist)
+                parser.close()
+                return artists
         except Exception as e:
             last_exc = e
             continue
@@ -467,43 +1270,924 @@ def get_lidarr_artists(base_url: str, api_key: str, timeout: int = 30) -> List[D
     )
 
 
-def read_ledger(csv_path: str) -> Dict[str, Dict]:
+async def stream_lidarr_artists(base_url: str, api_key: str, timeout: int = 30) -> AsyncIterator[Dict]:
+    """Yield {id, name, mbid} dicts from Lidarr as the artist list downloads"""
+    async for artist in _stream_lidarr_list(base_url, api_key, LIDARR_ARTIST_PATHS, _artist_from_json,
+                                            "artists", timeout):
+        yield artist
+
+
+async def stream_lidarr_albums(base_url: str, api_key: str, timeout: int = 30) -> AsyncIterator[Dict]:
+    """Yield {id, name, mbid, entity} dicts from Lidarr as the album list downloads"""
+    async for album in _stream_lidarr_list(base_url, api_key, LIDARR_ALBUM_PATHS, _album_from_json,
+                                           "albums", timeout):
+        yield album
+
+
+async def _stream_lidarr_list(
+    base_url: str,
+    api_key: str,
+    paths: List[str],
+    convert,
+    what: str,
+    timeout: int
+) -> AsyncIterator[Dict]:
+    """Yield `convert`ed records from the first of `paths` that Lidarr serves, as it downloads"""
+    headers = {"X-Api-Key": api_key}
+    client_timeout = aiohttp.ClientTimeout(total=None, sock_connect=timeout, sock_read=timeout)
+
+    last_exc = None
+    async with aiohttp.ClientSession(timeout=client_timeout, headers=headers) as session:
+        for path in paths:
+            url = f"{base_url.rstrip('/')}{path}"
+            yielded = 0
+            try:
+                async with session.get(url) as resp:
+                    if resp.status == 404:
+                        continue
+                    resp.raise_for_status()
+                    parser = JsonArrayStreamParser()
+                    async for chunk in resp.content.iter_chunked(65536):
+                        for a in parser.feed(chunk):
+                            record = convert(a)
+                            if record:
+                                yielded += 1
+                                yield record
+                    parser.close()
+                    return
+            except Exception as e:
+                # Once records have been handed out, switching endpoints would duplicate them
+                if yielded:
+                    raise
+                last_exc = e
+                continue
+
+    raise RuntimeError(
+        f"Could not fetch {what} from Lidarr using known endpoints. Last error: {last_exc}"
+    )
+
+
+# Ledger columns, in CSV/export order
+LEDGER_FIELDS = ["mbid", "artist_name", "status", "attempts", "last_status_code", "last_checked",
+                 "failed_runs", "next_eligible", "entity_type"]
+
+# What a ledger row's MBID identifies, and so which API path probes it
+ENTITY_TYPES = ("artist", "album")
+
+# Probe state kept per extra [target:<name>], stored as "<name>_<field>" columns
+TARGET_FIELDS = ["status", "attempts", "last_status_code", "last_checked", "failed_runs", "next_eligible"]
+
+
+def target_columns(targets) -> List[str]:
+    """The ledger columns holding each named target's probe state"""
+    return [f"{name}_{field}" for name in targets for field in TARGET_FIELDS]
+
+
+def targets_in_fields(fields) -> List[str]:
+    """Names of the targets that have columns among `fields`"""
+    return [f[:-len("_status")] for f in fields or () if f.endswith("_status") and f != "status"]
+
+
+class Status(enum.IntEnum):
+    """Ledger status of an MBID. Stored as its label: '' (pending), success, timeout or removed."""
+    PENDING = 0
+    SUCCESS = 1
+    TIMEOUT = 2
+    REMOVED = 3
+    
+    @property
+    def label(self) -> str:
+        return _STATUS_LABELS[self]
+    
+    @classmethod
+    def parse(cls, value: Optional[str]) -> "Status":
+        """The Status for a stored label; anything unrecognised counts as pending"""
+        return _STATUS_BY_LABEL.get((value or "").strip().lower(), cls.PENDING)
+
+
+_STATUS_LABELS = {s: ("" if s is Status.PENDING else s.name.lower()) for s in Status}
+_STATUS_BY_LABEL = {label: s for s, label in _STATUS_LABELS.items()}
+
+
+def _iso_to_timestamp(value: Optional[str]) -> float:
+    """An ISO 8601 ledger timestamp as Unix time (0 if empty or unparseable)"""
+    try:
+        parsed = datetime.fromisoformat(value or "")
+    except ValueError:
+        return 0.0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _timestamp_to_iso(timestamp: int) -> str:
+    """The ledger's ISO 8601 form of a Unix timestamp ('' for 0)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else ""
+
+
+def _parse_entity(value) -> str:
+    """The shared ENTITY_TYPES string for a stored entity_type (rows from before albums are artists)"""
+    value = str(value or "").strip().lower()
+    return ENTITY_TYPES[1] if value == ENTITY_TYPES[1] else ENTITY_TYPES[0]
+
+
+def _parse_status_code(value: object) -> Union[int, str]:
+    """'503' -> 503. Other codes (TIMEOUT, EXC:...) are interned so rows share one copy."""
+    value = str(value if value is not None else "").strip()
+    return int(value) if value.isdigit() else sys.intern(value)
+
+
+class LedgerRow:
+    """One ledger row, slotted and with timestamps as Unix seconds (0 = never) to stay small.
+
+    `lidarr_id` comes from each sync and is not saved. `targets` maps each extra
+    [target:<name>] that has probed this MBID to its own row (None if there are none).
+    """
+    
+    __slots__ = ("mbid", "artist_name", "status", "attempts", "last_status_code",
+                 "checked_at", "failed_runs", "next_eligible_at", "lidarr_id", "entity", "targets")
+    
+    def __init__(
+        self,
+        mbid: str,
+        artist_name: str = "",
+        status: Status = Status.PENDING,
+        attempts: int = 0,
+        last_status_code: Union[int, str] = "",
+        checked_at: int = 0,
+        failed_runs: int = 0,
+        next_eligible_at: int = 0,
+        lidarr_id: Optional[int] = None,
+        entity: str = "artist"
+    ):
+        self.mbid = mbid
+        self.artist_name = artist_name
+        self.status = status
+        self.attempts = attempts
+        self.last_status_code = last_status_code
+        self.checked_at = checked_at
+        self.failed_runs = failed_runs
+        self.next_eligible_at = next_eligible_at
+        self.lidarr_id = lidarr_id
+        self.entity = entity
+        self.targets: Optional[Dict[str, "LedgerRow"]] = None
+    
+    @classmethod
+    def from_dict(cls, row: Mapping[str, object], targets: List[str] = ()) -> "LedgerRow":
+        """Build a row from LEDGER_FIELDS values as stored in CSV, the journal or SQLite,
+        plus the target_columns() of each name in `targets`"""
+        parsed = cls._from_state(str(row.get("mbid") or "").strip(), row.get("artist_name") or "",
+                                 _parse_entity(row.get("entity_type")), row)
+        for name in targets:
+            state = {field: row.get(f"{name}_{field}") for field in TARGET_FIELDS}
+            # Targets that never probed this MBID cost nothing in memory
+            if state["status"] or str(state["attempts"] or "0") != "0":
+                if parsed.targets is None:
+                    parsed.targets = {}
+                parsed.targets[name] = cls._from_state(parsed.mbid, parsed.artist_name, parsed.entity, state)
+        return parsed
+    
+    @classmethod
+    def _from_state(cls, mbid: str, name: str, entity: str, state: Mapping[str, object]) -> "LedgerRow":
+        return cls(
+            mbid,
+            name,
+            Status.parse(state.get("status")),
+            int(state.get("attempts") or 0),
+            _parse_status_code(state.get("last_status_code")),
+            int(_iso_to_timestamp(state.get("last_checked"))),
+            int(state.get("failed_runs") or 0),
+            int(_iso_to_timestamp(state.get("next_eligible"))),
+            entity=entity,
+        )
+    
+    def state_dict(self) -> Dict[str, object]:
+        """This row's TARGET_FIELDS values"""
+        return {
+            "status": self.status.label,
+            "attempts": self.attempts,
+            "last_status_code": str(self.last_status_code),
+            "last_checked": _timestamp_to_iso(self.checked_at),
+            "failed_runs": self.failed_runs,
+            "next_eligible": _timestamp_to_iso(self.next_eligible_at),
+        }
+    
+    def to_dict(self) -> Dict[str, object]:
+        """The row as LEDGER_FIELDS values plus its targets' columns, for writing to disk"""
+        values = {"mbid": self.mbid, "artist_name": self.artist_name}
+        values.update(self.state_dict())
+        values["entity_type"] = self.entity
+        for name, row in (self.targets or {}).items():
+            for field, value in row.state_dict().items():
+                values[f"{name}_{field}"] = value
+        return values
+    
+    def target_row(self, name: str) -> "LedgerRow":
+        """This MBID's row for extra target `name`, created on first use"""
+        if self.targets is None:
+            self.targets = {}
+        row = self.targets.get(name)
+        if row is None:
+            row = self.targets[name] = LedgerRow(self.mbid, self.artist_name, entity=self.entity)
+        else:
+            row.artist_name = self.artist_name
+        return row
+
+
+def merge_artist(ledger: Dict[str, LedgerRow], artist: Dict) -> Tuple[bool, Optional[LedgerRow]]:
+    """Merge one Lidarr artist (or album) into the ledger. Returns (is_new, changed_row_or_None)."""
+    mbid = artist["mbid"]
+    name = artist["name"]
+    if mbid not in ledger:
+        ledger[mbid] = LedgerRow(mbid, name, lidarr_id=artist.get("id"),
+                                 entity=_parse_entity(artist.get("entity")))
+        return True, ledger[mbid]
+    row = ledger[mbid]
+    changed = False
+    if row.status is Status.REMOVED:
+        # Back in Lidarr after being marked removed: check it again
+        row.status = Status.PENDING
+        changed = True
+    if name and row.artist_name != name:
+        row.artist_name = name
+        changed = True
+    return False, row if changed else None
+
+
+def needs_check(row: LedgerRow, cfg: dict) -> bool:
+    if row.status is Status.REMOVED:
+        return False
+    if cfg["force"]:
+        return True
+    return row.status is not Status.SUCCESS and not in_failure_backoff(row)
+
+
+def in_failure_backoff(row: LedgerRow, now: Optional[float] = None) -> bool:
+    """True for a timeout whose next_eligible time has not come yet"""
+    if row.status is not Status.TIMEOUT or not row.next_eligible_at:
+        return False
+    return row.next_eligible_at > (time.time() if now is None else now)
+
+
+def failure_backoff_seconds(cfg: dict, failed_runs: int) -> float:
+    """Wait before retrying an MBID after `failed_runs` consecutive timed-out runs.
+
+    Doubles from failure_backoff_hours (1h, 2h, 4h, ...) up to failure_backoff_max_hours.
+    """
+    base_hours = cfg.get("failure_backoff_hours", 1)
+    if base_hours <= 0 or failed_runs <= 0:
+        return 0.0
+    hours = base_hours * 2 ** min(failed_runs - 1, 32)
+    return min(hours, cfg.get("failure_backoff_max_hours", 168)) * 3600
+
+
+def diminishing_returns_attempts(warmed: Mapping[int, int], gave_up: Mapping[int, int], min_yield: float,
+                                 min_samples: int = 50, floor: int = 1) -> Optional[int]:
+    """Attempts per artist worth making, from cold MBIDs counted by the attempt they warmed
+    (`warmed`) or timed out (`gave_up`) on.
+
+    The yield of attempt k is the share of MBIDs reaching it that warmed on it. Returns one
+    more than the last attempt yielding at least `min_yield`, so a limit set too low can
+    still grow, and never less than `floor`; None with fewer than `min_samples` MBIDs.
+    """
+    warmed = collections.Counter(warmed)
+    gave_up = collections.Counter(gave_up)
+    reached = sum(warmed.values()) + sum(gave_up.values())
+    if reached < min_samples:
+        return None
+    last_useful = 1
+    for k in range(1, max(warmed.keys() | gave_up.keys()) + 1):
+        # A handful of MBIDs says little about how useful this attempt is
+        if reached < 10:
+            break
+        if warmed[k] / reached >= min_yield:
+            last_useful = k
+        reached -= warmed[k] + gave_up[k]
+    return max(last_useful + 1, floor)
+
+
+def select_expired_successes(ledger: Dict[str, LedgerRow], cfg: dict, now: Optional[float] = None,
+                             entity: str = "artist") -> List[str]:
+    """Successes of one entity type last checked more than success_ttl_hours ago, oldest first, capped per run.
+
+    The cap is ceil(successes * interval_seconds / ttl): just enough for every success
+    to be re-verified once per TTL, spread evenly over the runs in between.
+    """
+    ttl_seconds = cfg.get("success_ttl_hours", 0) * 3600
+    if ttl_seconds <= 0 or cfg["force"]:
+        return []
+    cutoff = (time.time() if now is None else now) - ttl_seconds
+    successes = [(row.checked_at, mbid) for mbid, row in ledger.items()
+                 if row.status is Status.SUCCESS and row.entity == entity]
+    expired = [(checked_at, mbid) for checked_at, mbid in successes if checked_at <= cutoff]
+    budget = math.ceil(len(successes) * cfg.get("interval_seconds", 3600) / ttl_seconds)
+    return [mbid for _, mbid in heapq.nsmallest(budget, expired)]
+
+
+# Work classes for prioritize(), with their default [run] priority_* weights
+PRIORITY_WEIGHTS = {"new": 3, "timeout": 2, "recheck": 1}
+
+
+def priority_class(row: LedgerRow) -> str:
+    """'new' (never checked), 'timeout', or 'recheck' (a success past its TTL, or forced)"""
+    if row.status is Status.TIMEOUT:
+        return "timeout"
+    if row.status is Status.SUCCESS:
+        return "recheck"
+    return "new"
+
+
+def prioritize(mbids: List[str], ledger: Dict[str, LedgerRow], cfg: dict) -> List[str]:
+    """Order MBIDs for checking, highest [run] priority_* weight first.
+
+    Within a class, timeouts go by fewest failed runs and attempts, then least recently
+    tried (or the other way round with timeout_order = least_recent), rechecks oldest first, and
+    never-checked artists keep their ledger order.
+    """
+    weights = {c: cfg.get(f"priority_{c}", w) for c, w in PRIORITY_WEIGHTS.items()}
+    least_recent_first = cfg.get("timeout_order", "fewest_attempts") == "least_recent"
+    
+    def key(indexed: Tuple[int, str]) -> tuple:
+        position, mbid = indexed
+        row = ledger[mbid]
+        cls = priority_class(row)
+        if cls == "timeout":
+            attempts = (row.failed_runs, row.attempts)
+            within = (row.checked_at, attempts) if least_recent_first else (attempts, row.checked_at)
+        elif cls == "recheck":
+            within = (row.checked_at, 0)
+        else:
+            within = (0, 0)
+        return -weights[cls], within, position
+    
+    return [mbid for _, mbid in sorted(enumerate(mbids), key=key)]
+
+
+def artists_content_hash(artists: Dict[str, list]) -> str:
+    """Stable hash of a {mbid: [lidarr_id, name]} artist map"""
+    digest = hashlib.sha1()
+    for mbid in sorted(artists):
+        artist_id, name = artists[mbid]
+        digest.update(f"{mbid}\t{artist_id}\t{name}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_artist_snapshot(path: str) -> Optional[Dict]:
+    """Read the artist snapshot saved by the previous sync, or None if there is none"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        if not isinstance(snapshot.get("artists"), dict):
+            raise ValueError("missing artists map")
+        return snapshot
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable artist snapshot {path}: {e}", file=sys.stderr)
+        return None
+
+
+def save_artist_snapshot(path: str, artists: Dict[str, list], content_hash: str) -> None:
+    """Write the artist snapshot atomically"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"hash": content_hash, "saved_at": iso_now(), "artists": artists}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def diff_artists(previous: Dict[str, list], artists: List[Dict]) -> Dict:
+    """Compare Lidarr's current artists with the previous sync.
+
+    Returns {"added": [artist], "renamed": [artist], "removed": [mbid], "current": {mbid: [id, name]}}.
+    """
+    current: Dict[str, list] = {}
+    added, renamed = [], []
+    for a in artists:
+        mbid = a["mbid"]
+        current[mbid] = [a.get("id"), a.get("name", "")]
+        before = previous.get(mbid)
+        if before is None:
+            added.append(a)
+        elif a.get("name") and before[1] != a["name"]:
+            renamed.append(a)
+    removed = [mbid for mbid in previous if mbid not in current]
+    return {"added": added, "renamed": renamed, "removed": removed, "current": current}
+
+
+def apply_removed_artists(ledger: Dict[str, LedgerRow], store, removed: List[str], policy: str,
+                          listed: int) -> int:
+    """Handle artists no longer in Lidarr: 'mark' them removed, 'prune' their rows, or 'keep' them.
+
+    `listed` is how many Lidarr returned; an empty list is treated as a bad response rather
+    than every artist having been removed. Returns how many ledger rows were marked or pruned.
+    """
+    removed = [mbid for mbid in removed if mbid in ledger]
+    if removed and not listed and policy != "keep":
+        print(f"WARNING: Lidarr listed nothing; not treating {len(removed)} ledger rows as removed",
+              file=sys.stderr)
+        return 0
+    if policy == "mark":
+        rows = [ledger[mbid] for mbid in removed if ledger[mbid].status is not Status.REMOVED]
+        for row in rows:
+            row.status = Status.REMOVED
+        store.upsert_many(rows)
+        return len(rows)
+    if policy == "prune":
+        for mbid in removed:
+            del ledger[mbid]
+        store.delete(removed)
+        return len(removed)
+    return 0
+
+
+async def iter_streamed_mbids_to_check(
+    cfg: dict,
+    ledger: dict,
+    store,
+    counts: dict,
+    previous: Dict[str, list],
+    current: Dict[str, list],
+    wants: Callable[[str], bool],
+    select_rechecks: Callable[[], List[str]]
+) -> AsyncIterator[str]:
+    """Merge artists into the ledger as Lidarr streams them, yielding each MBID that needs checking.
+
+    Only artists that are new or renamed since `previous` (the last sync) touch the
+    ledger. Every streamed artist is recorded in `current` for the next snapshot.
+    Artists belonging to other shards are skipped. `wants(mbid)` says whether an MBID
+    needs checking; the successes past their TTL that `select_rechecks()` picks once
+    the list is complete follow the streamed ones.
+    """
+    async for artist in stream_lidarr_artists(cfg["lidarr_url"], cfg["api_key"]):
+        mbid = artist["mbid"]
+        if not in_shard(mbid, cfg):
+            continue
+        current[mbid] = [artist.get("id"), artist.get("name", "")]
+        counts["artists"] += 1
+        
+        before = previous.get(mbid)
+        if before is None or (artist.get("name") and before[1] != artist["name"]):
+            is_new, changed = merge_artist(ledger, artist)
+            if is_new:
+                counts["new"] += 1
+            elif before is not None:
+                counts["renamed"] += 1
+            if changed is not None:
+                store.upsert(changed)
+        ledger[mbid].lidarr_id = artist.get("id")
+        if wants(mbid):
+            yield mbid
+    
+    removed = [mbid for mbid in previous if mbid not in current]
+    counts["removed"] = apply_removed_artists(ledger, store, removed, cfg.get("removed_artists", "mark"),
+                                              counts["artists"])
+    counts["complete"] = True
+    
+    # Then, in priority order: pending rows for artists no longer in Lidarr (with
+    # removed_artists = keep) and this run's share of successes past their TTL
+    leftovers = [mbid for mbid, row in ledger.items()
+                 if row.entity == "artist" and mbid not in current and wants(mbid)]
+    rechecks = select_rechecks()
+    counts["rechecks"] = len(rechecks)
+    for mbid in prioritize(list(dict.fromkeys(leftovers + rechecks)), ledger, cfg):
+        yield mbid
+
+
+async def iter_streamed_albums_to_check(cfg: dict, ledger: dict, store, counts: dict,
+                                        wants: Callable[[str], bool],
+                                        select_rechecks: Callable[[], List[str]]) -> AsyncIterator[str]:
+    """Merge albums into the ledger as Lidarr streams them, yielding each album MBID that needs checking.
+
+    There is no album snapshot, so every album is merged; only new, renamed or returning
+    albums become ledger writes, handed to the store in chunks. Album rows not streamed
+    this time are handled like removed artists. Albums belonging to other shards are skipped.
+    `wants` and `select_rechecks` are as for iter_streamed_mbids_to_check.
+    """
+    seen = set()
+    changed_rows: List[LedgerRow] = []
+    async for album in stream_lidarr_albums(cfg["lidarr_url"], cfg["api_key"]):
+        mbid = album["mbid"]
+        if not in_shard(mbid, cfg) or (mbid in ledger and ledger[mbid].entity != "album"):
+            continue
+        seen.add(mbid)
+        counts["albums"] += 1
+        is_new, changed = merge_artist(ledger, album)
+        if is_new:
+            counts["new"] += 1
+        if changed is not None:
+            changed_rows.append(changed)
+            if len(changed_rows) >= 1000:
+                store.upsert_many(changed_rows)
+                changed_rows = []
+        ledger[mbid].lidarr_id = album.get("id")
+        if wants(mbid):
+            yield mbid
+    store.upsert_many(changed_rows)
+    
+    removed = [mbid for mbid, row in ledger.items() if row.entity == "album" and mbid not in seen]
+    counts["removed"] = apply_removed_artists(ledger, store, removed, cfg.get("removed_artists", "mark"),
+                                              counts["albums"])
+    counts["complete"] = True
+    
+    leftovers = [mbid for mbid, row in ledger.items()
+                 if row.entity == "album" and mbid not in seen and wants(mbid)]
+    rechecks = select_rechecks()
+    counts["rechecks"] = len(rechecks)
+    for mbid in prioritize(list(dict.fromkeys(leftovers + rechecks)), ledger, cfg):
+        yield mbid
+
+
+async def chain_sources(*sources: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Yield everything from each MBID source in turn"""
+    for source in sources:
+        async for mbid in source:
+            yield mbid
+
+
+def read_ledger(csv_path: str) -> Dict[str, LedgerRow]:
     """Read existing CSV into a dict keyed by MBID."""
-    ledger: Dict[str, Dict] = {}
+    ledger: Dict[str, LedgerRow] = {}
     if not os.path.exists(csv_path):
         return ledger
     with open(csv_path, newline="", encoding="utf-8") as f:
         reader = csv.DictReader(f)
-        for row in reader:
-            mbid = (row.get("mbid") or "").strip()
-            if not mbid:
-                continue
-            ledger[mbid] = {
-                "mbid": mbid,
-                "artist_name": row.get("artist_name", ""),
-                "status": (row.get("status") or "").lower().strip(),
-                "attempts": int((row.get("attempts") or "0") or 0),
-                "last_status_code": row.get("last_status_code", ""),
-                "last_checked": row.get("last_checked", ""),
-            }
+        targets = targets_in_fields(reader.fieldnames)
+        for values in reader:
+            row = LedgerRow.from_dict(values, targets)
+            if row.mbid:
+                ledger[row.mbid] = row
     return ledger
 
 
-def write_ledger(csv_path: str, ledger: Dict[str, Dict]) -> None:
+def write_ledger(csv_path: str, ledger: Dict[str, LedgerRow]) -> None:
     """Write the ledger dict back to CSV atomically."""
     os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
-    fieldnames = ["mbid", "artist_name", "status", "attempts", "last_status_code", "last_checked"]
     tmp_path = csv_path + ".tmp"
+    # Every target with state in some row, configured or not, as SqliteLedgerStore keeps them
+    targets = sorted({name for row in ledger.values() if row.targets for name in row.targets})
     with open(tmp_path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=LEDGER_FIELDS + target_columns(targets))
         writer.writeheader()
-        for _, row in sorted(ledger.items(), key=lambda kv: (kv[1].get("artist_name", ""), kv[0])):
-            writer.writerow(row)
+        for _, row in sorted(ledger.items(), key=lambda kv: (kv[1].artist_name, kv[0])):
+            writer.writerow(row.to_dict())
     os.replace(tmp_path, csv_path)
 
 
-def load_config(path: str) -> dict:
-    """Load INI config and return a normalized dict of settings with defaults."""
+class CsvLedgerStore:
+    """Ledger kept in a single CSV file, rewritten in full every write_frequency results"""
+    
+    def __init__(self, csv_path: str, write_frequency: int = 5):
+        self.path = csv_path
+        self.write_frequency = max(1, write_frequency)
+        self.ledger: Dict[str, LedgerRow] = {}
+        self._pending = 0
+    
+    def load(self) -> Dict[str, LedgerRow]:
+        self.ledger = read_ledger(self.path)
+        return self.ledger
+    
+    def upsert(self, row: LedgerRow) -> None:
+        """Record one updated row; the file is rewritten once enough have accumulated"""
+        self.ledger[row.mbid] = row
+        self._pending += 1
+        if self._pending >= self.write_frequency:
+            self.flush()
+    
+    def upsert_many(self, rows: List[LedgerRow]) -> None:
+        for row in rows:
+            self.ledger[row.mbid] = row
+        self._pending += len(rows)
+    
+    def delete(self, mbids: List[str]) -> None:
+        for mbid in mbids:
+            self.ledger.pop(mbid, None)
+        self._pending += len(mbids)
+    
+    def flush(self) -> None:
+        if self._pending:
+            write_ledger(self.path, self.ledger)
+            self._pending = 0
+    
+    def checkpoint(self) -> None:
+        """Make every result so far durable while keeping the store open"""
+        self.flush()
+    
+    def close(self) -> None:
+        self.flush()
+
+
+class JournalLedgerStore:
+    """Ledger kept as a CSV snapshot plus an append-only journal of row updates.
+
+    Every result is appended to the journal as one JSON line, and read_ledger's
+    snapshot is replayed with the journal on load. The journal is folded into a
+    fresh snapshot when it grows past compact_bytes and when the store is closed.
+    """
+    
+    def __init__(self, csv_path: str, compact_bytes: int = 4 * 1024 * 1024):
+        self.path = csv_path
+        self.journal_path = csv_path + ".journal"
+        self.compact_bytes = compact_bytes
+        self.ledger: Dict[str, LedgerRow] = {}
+        self._journal = None
+    
+    def load(self) -> Dict[str, LedgerRow]:
+        self.ledger = read_ledger(self.path)
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash mid-append; everything before it is intact
+                        continue
+                    if entry.get("deleted"):
+                        self.ledger.pop(entry["mbid"], None)
+                    else:
+                        row = LedgerRow.from_dict(entry, targets_in_fields(entry))
+                        self.ledger[row.mbid] = row
+                    replayed += 1
+        if replayed:
+            print(f"Replayed {replayed} journal entries from {self.journal_path}")
+        return self.ledger
+    
+    def _append(self, entry: Dict) -> None:
+        if self._journal is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        self._journal.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    
+    def upsert(self, row: LedgerRow) -> None:
+        """Append one row to the journal, compacting once it has grown too large"""
+        self.ledger[row.mbid] = row
+        self._append(row.to_dict())
+        self._journal.flush()
+        if self._journal.tell() >= self.compact_bytes:
+            self.compact()
+    
+    def upsert_many(self, rows: List[LedgerRow]) -> None:
+        for row in rows:
+            self.ledger[row.mbid] = row
+            self._append(row.to_dict())
+    
+    def delete(self, mbids: List[str]) -> None:
+        """Journal a tombstone for each MBID; compaction drops the rows from the snapshot"""
+        for mbid in mbids:
+            self.ledger.pop(mbid, None)
+            self._append({"mbid": mbid, "deleted": True})
+    
+    def flush(self) -> None:
+        if self._journal is not None:
+            self._journal.flush()
+    
+    def compact(self) -> None:
+        """Fold the journal into a new CSV snapshot and start an empty journal"""
+        if self._journal is None and not os.path.exists(self.journal_path):
+            return  # Nothing journaled since the last snapshot
+        # Snapshot first: if we stop between the two steps, replaying the old
+        # journal over the new snapshot yields the same rows
+        write_ledger(self.path, self.ledger)
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+    
+    def checkpoint(self) -> None:
+        """Make every result so far durable while keeping the store open"""
+        self.compact()
+    
+    def close(self) -> None:
+        self.compact()
+
+
+class SqliteLedgerStore:
+    """Ledger kept in a SQLite database (WAL mode) with one upsert per result"""
+    
+    # Column definitions, keyed like LEDGER_FIELDS; new columns are added on open
+    COLUMNS = {
+        "mbid": "TEXT PRIMARY KEY",
+        "artist_name": "TEXT NOT NULL DEFAULT ''",
+        "status": "TEXT NOT NULL DEFAULT ''",
+        "attempts": "INTEGER NOT NULL DEFAULT 0",
+        "last_status_code": "TEXT NOT NULL DEFAULT ''",
+        "last_checked": "TEXT NOT NULL DEFAULT ''",
+        "failed_runs": "INTEGER NOT NULL DEFAULT 0",
+        "next_eligible": "TEXT NOT NULL DEFAULT ''",
+        "entity_type": "TEXT NOT NULL DEFAULT 'artist'",
+    }
+    
+    def __init__(self, db_path: str, import_csv_path: Optional[str] = None, targets: List[str] = ()):
+        self.path = db_path
+        self.ledger: Dict[str, LedgerRow] = {}
+        # Columns for each extra target, typed like the main status columns
+        self.columns = dict(self.COLUMNS)
+        for name in targets:
+            for field in TARGET_FIELDS:
+                self.columns[f"{name}_{field}"] = self.COLUMNS[field]
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # Shards sharing the database may open it at the same moment, so the schema
+        # check, migration and first-run import happen under one write lock
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            is_new = self._ensure_schema()
+            # First run on SQLite: carry over an existing CSV ledger
+            if is_new and import_csv_path and os.path.exists(import_csv_path):
+                rows = list(read_ledger(import_csv_path).values())
+                self.upsert_many(rows)
+                print(f"Imported {len(rows)} ledger rows from {import_csv_path} into {db_path}")
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+    
+    def _ensure_schema(self) -> bool:
+        """Create or migrate the ledger table; returns True if it was just created"""
+        is_new = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger'").fetchone() is None
+        column_sql = ", ".join(f"{name} {decl}" for name, decl in self.columns.items())
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS ledger ({column_sql})")
+        existing = [r[1] for r in self.conn.execute("PRAGMA table_info(ledger)")]
+        for name, decl in self.columns.items():
+            if name in existing:
+                continue
+            try:
+                self.conn.execute(f"ALTER TABLE ledger ADD COLUMN {name} {decl}")
+            except sqlite3.OperationalError as e:
+                # Another process added it first: already migrated
+                if "duplicate column" not in str(e):
+                    raise
+        # Columns of targets no longer configured are still read, so their state survives
+        self.targets = list(dict.fromkeys(targets_in_fields(existing + list(self.columns))))
+        self.fields = LEDGER_FIELDS + target_columns(self.targets)
+        blank = LedgerRow("").state_dict()
+        self._blank = {f"{name}_{field}": blank[field] for name in self.targets for field in TARGET_FIELDS}
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_status ON ledger(status)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_last_checked ON ledger(last_checked)")
+        return is_new
+    
+    def _upsert_sql(self) -> str:
+        columns = ", ".join(self.fields)
+        placeholders = ", ".join("?" for _ in self.fields)
+        updates = ", ".join(f"{c}=excluded.{c}" for c in self.fields if c != "mbid")
+        return (f"INSERT INTO ledger ({columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT(mbid) DO UPDATE SET {updates}")
+    
+    def _row_values(self, row: LedgerRow) -> tuple:
+        values = row.to_dict()
+        return tuple(values[c] if c in values else self._blank[c] for c in self.fields)
+    
+    def load(self) -> Dict[str, LedgerRow]:
+        self.ledger = {}
+        cursor = self.conn.execute(f"SELECT {', '.join(self.fields)} FROM ledger")
+        for values in cursor:
+            row = LedgerRow.from_dict(dict(zip(self.fields, values)), self.targets)
+            self.ledger[row.mbid] = row
+        return self.ledger
+    
+    def upsert(self, row: LedgerRow) -> None:
+        """Write one row immediately; WAL keeps the per-result commit cheap"""
+        self.ledger[row.mbid] = row
+        self.conn.execute(self._upsert_sql(), self._row_values(row))
+        self.conn.commit()
+    
+    def upsert_many(self, rows: List[LedgerRow]) -> None:
+        for row in rows:
+            self.ledger[row.mbid] = row
+        self.conn.executemany(self._upsert_sql(), (self._row_values(r) for r in rows))
+    
+    def delete(self, mbids: List[str]) -> None:
+        for mbid in mbids:
+            self.ledger.pop(mbid, None)
+        self.conn.executemany("DELETE FROM ledger WHERE mbid = ?", ((m,) for m in mbids))
+    
+    def flush(self) -> None:
+        self.conn.commit()
+    
+    def checkpoint(self) -> None:
+        """Make every result so far durable while keeping the store open"""
+        self.conn.commit()
+    
+    def close(self) -> None:
+        self.conn.commit()
+        self.conn.close()
+
+
+def open_ledger_store(cfg: dict):
+    """Return the ledger store selected by [ledger].backend"""
+    if cfg.get("ledger_backend", "csv") == "sqlite":
+        return SqliteLedgerStore(cfg["sqlite_path"], import_csv_path=cfg["csv_path"],
+                                 targets=list(cfg.get("extra_targets", {})))
+    if cfg.get("ledger_backend") == "journal":
+        return JournalLedgerStore(cfg["csv_path"], int(cfg.get("journal_compact_mb", 4) * 1024 * 1024))
+    return CsvLedgerStore(cfg["csv_path"], cfg.get("batch_write_frequency", 5))
+
+
+def parse_shard(value: Optional[str]) -> Tuple[int, int]:
+    """Parse "i/N" (1 <= i <= N) into (i, N). Empty means a single shard, (1, 1)."""
+    value = (value or "").strip()
+    if not value:
+        return 1, 1
+    match = re.fullmatch(r"(\d+)\s*/\s*(\d+)", value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise ValueError(f"shard must look like i/N with 1 <= i <= N, got {value!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+def shard_of(mbid: str, count: int) -> int:
+    """The shard (1..count) an MBID belongs to; the same on every host and run"""
+    digest = hashlib.sha1(mbid.strip().lower().encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def in_shard(mbid: str, cfg: dict) -> bool:
+    count = cfg.get("shard_count", 1)
+    return count <= 1 or shard_of(mbid, count) == cfg["shard_index"]
+
+
+def shard_path(path: str, index: int, count: int) -> str:
+    """A per-shard variant of a file path: mbids.csv -> mbids.shard2of4.csv"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{index}of{count}{ext}"
+
+
+def apply_shard(cfg: dict) -> None:
+    """Scope cfg to its shard: 1/N of the rate limit, burst and workers, and its own files.
+
+    CSV and journal ledgers get a per-shard file, combined with --merge-shards. SQLite
+    shards share one database and each only ever writes rows of its own MBIDs.
+    """
+    index, count = cfg["shard_index"], cfg["shard_count"]
+    cfg["rate_limit_per_second"] = cfg["rate_limit_per_second"] / count
+    cfg["rate_limit_burst"] = max(1, cfg["rate_limit_burst"] // count)
+    cfg["max_concurrent_requests"] = max(1, math.ceil(cfg["max_concurrent_requests"] / count))
+    for overrides in cfg.get("extra_targets", {}).values():
+        if "rate_limit_per_second" in overrides:
+            overrides["rate_limit_per_second"] /= count
+        if "rate_limit_burst" in overrides:
+            overrides["rate_limit_burst"] = max(1, overrides["rate_limit_burst"] // count)
+        if "max_concurrent_requests" in overrides:
+            overrides["max_concurrent_requests"] = max(1, math.ceil(overrides["max_concurrent_requests"] / count))
+    cfg["merged_csv_path"] = cfg["csv_path"]
+    if cfg["ledger_backend"] != "sqlite":
+        cfg["csv_path"] = shard_path(cfg["csv_path"], index, count)
+    cfg["artist_snapshot_path"] = shard_path(cfg["artist_snapshot_path"], index, count)
+    cfg["warmup_model_path"] = shard_path(cfg["warmup_model_path"], index, count)
+    if not cfg["metrics_path"] and cfg["metrics_port"] > 0:
+        cfg["metrics_path"] = "/data/metrics.prom"
+    if cfg["metrics_path"]:
+        cfg["metrics_path"] = shard_path(cfg["metrics_path"], index, count)
+
+
+# Settings a [target:<name>] section may override, with how to read them
+TARGET_SETTINGS = {
+    "timeout_seconds": "int",
+    "rate_limit_per_second": "float",
+    "rate_limit_burst": "int",
+    "max_concurrent_requests": "int",
+    "min_concurrent_requests": "int",
+    "adaptive_concurrency": "bool",
+    "latency_tolerance": "float",
+    "max_attempts_per_artist": "int",
+    "circuit_breaker_threshold": "int",
+    "backoff_factor": "float",
+    "max_backoff_seconds": "float",
+}
+
+
+def _read_targets(cp: configparser.ConfigParser) -> Dict[str, dict]:
+    """The [target:<name>] sections as {name: settings overriding [probe]}"""
+    targets: Dict[str, dict] = {}
+    for section in cp.sections():
+        if not section.lower().startswith("target:"):
+            continue
+        name = section.split(":", 1)[1].strip().lower()
+        overrides = {"target_base_url": cp.get(section, "base_url", fallback="").strip()}
+        for key, kind in TARGET_SETTINGS.items():
+            if not cp.has_option(section, key):
+                continue
+            if kind == "int":
+                overrides[key] = cp.getint(section, key)
+            elif kind == "float":
+                overrides[key] = cp.getfloat(section, key)
+            else:
+                overrides[key] = parse_bool(cp.get(section, key))
+        targets[name] = overrides
+    return targets
+
+
+def load_config(path: str, shard: Optional[str] = None) -> dict:
+    """Load INI config and return a normalized dict of settings with defaults.
+
+    `shard` ("i/N", e.g. from --shard) overrides [run] shard.
+    """
     if not os.path.exists(path) and os.path.exists(path + ".ini"):
         path = path + ".ini"
 
@@ -523,20 +2207,44 @@ def load_config(path: str) -> dict:
         # Core settings
         "lidarr_url": cp.get("lidarr", "base_url", fallback="http://192.168.1.103:8686"),
         "api_key": cp.get("lidarr", "api_key", fallback=""),
+        "stream_artists": parse_bool(cp.get("lidarr", "stream_artists", fallback="false")),
+        "removed_artists": cp.get("lidarr", "removed_artists", fallback="mark").strip().lower(),
         "target_base_url": cp.get("probe", "target_base_url", fallback="https://api.lidarr.audio/api/v0.4"),
         "timeout_seconds": cp.getint("probe", "timeout_seconds", fallback=10),
+        "entities": [e.strip().lower() for e in cp.get("probe", "entities", fallback="artist").split(",")
+                     if e.strip()],
         "csv_path": cp.get("ledger", "csv_path", fallback="mbids.csv"),
+        "ledger_backend": cp.get("ledger", "backend", fallback="csv").strip().lower(),
+        "sqlite_path": cp.get("ledger", "sqlite_path", fallback="mbids.db"),
+        "journal_compact_mb": cp.getfloat("ledger", "journal_compact_mb", fallback=4),
+        "artist_snapshot_path": cp.get("ledger", "artist_snapshot_path", fallback="").strip(),
+        "warmup_model_path": cp.get("ledger", "warmup_model_path", fallback="").strip(),
         "force": parse_bool(cp.get("run", "force", fallback="false")),
         "update_lidarr": parse_bool(cp.get("actions", "update_lidarr", fallback="false")),
+        "refresh_batch_size": cp.getint("actions", "refresh_batch_size", fallback=50),
+        "refresh_max_delay_seconds": cp.getfloat("actions", "refresh_max_delay_seconds", fallback=10),
         
         # Concurrent settings (your specified defaults)
         "max_concurrent_requests": cp.getint("probe", "max_concurrent_requests", fallback=5),
+        "adaptive_concurrency": parse_bool(cp.get("probe", "adaptive_concurrency", fallback="false")),
+        "min_concurrent_requests": cp.getint("probe", "min_concurrent_requests", fallback=1),
+        "latency_tolerance": cp.getfloat("probe", "latency_tolerance", fallback=2.0),
         "rate_limit_per_second": cp.getfloat("probe", "rate_limit_per_second", fallback=3),
+        "rate_limit_burst": cp.getint("probe", "rate_limit_burst", fallback=1),
         
         # Per-artist cache warming settings  
         "max_attempts_per_artist": cp.getint("probe", "max_attempts_per_artist", fallback=25),
         "delay_between_attempts": cp.getfloat("probe", "delay_between_attempts", fallback=0.5),
         
+        # Learned warm-up times and attempt limit
+        "warmup_learn": parse_bool(cp.get("warmup", "learn", fallback="true")),
+        "warmup_quantile": cp.getfloat("warmup", "quantile", fallback=0.5),
+        "warmup_min_samples": cp.getint("warmup", "min_samples", fallback=50),
+        "warmup_max_wait_seconds": cp.getfloat("warmup", "max_wait_seconds", fallback=300),
+        "auto_max_attempts": parse_bool(cp.get("warmup", "auto_max_attempts", fallback="false")),
+        "auto_max_attempts_min_yield": cp.getfloat("warmup", "min_yield", fallback=0.05),
+        "auto_max_attempts_floor": cp.getint("warmup", "min_attempts", fallback=5),
+        
         # Circuit breaker settings (for completely broken API)
         "circuit_breaker_threshold": cp.getint("probe", "circuit_breaker_threshold", fallback=25),
         "backoff_factor": cp.getfloat("probe", "backoff_factor", fallback=2.0),
@@ -545,222 +2253,1189 @@ def load_config(path: str) -> dict:
         # Processing options (updated defaults)
         "batch_size": cp.getint("run", "batch_size", fallback=25),
         "batch_write_frequency": cp.getint("run", "batch_write_frequency", fallback=5),
+        "success_ttl_hours": cp.getfloat("run", "success_ttl_hours", fallback=0),
+        "failure_backoff_hours": cp.getfloat("run", "failure_backoff_hours", fallback=1),
+        "failure_backoff_max_hours": cp.getfloat("run", "failure_backoff_max_hours", fallback=168),
+        "priority_new": cp.getint("run", "priority_new", fallback=PRIORITY_WEIGHTS["new"]),
+        "priority_timeout": cp.getint("run", "priority_timeout", fallback=PRIORITY_WEIGHTS["timeout"]),
+        "priority_recheck": cp.getint("run", "priority_recheck", fallback=PRIORITY_WEIGHTS["recheck"]),
+        "timeout_order": cp.get("run", "timeout_order", fallback="fewest_attempts").strip().lower(),
+        "interval_seconds": cp.getint("schedule", "interval_seconds", fallback=3600),
         
         # Monitoring options
         "log_progress_every_n": cp.getint("monitoring", "log_progress_every_n", fallback=25),
         "log_level": cp.get("monitoring", "log_level", fallback="INFO"),
+        "results_dir": cp.get("monitoring", "results_dir", fallback="/data"),
+        "metrics_port": cp.getint("monitoring", "metrics_port", fallback=0),
+        "metrics_path": cp.get("monitoring", "metrics_path", fallback="").strip(),
     }
 
+    jitter = cp.get("retry", "jitter", fallback="full").strip().lower()
+    cfg["retry_jitter"] = jitter
+    cfg["retry_policies"] = {}
+    for outcome, (delay, max_delay, max_attempts) in RETRY_DEFAULTS.items():
+        if outcome == "cache_miss":
+            delay = cfg["delay_between_attempts"]
+        cfg["retry_policies"][outcome] = RetryPolicy(
+            cp.getfloat("retry", f"{outcome}_delay", fallback=delay),
+            cp.getfloat("retry", f"{outcome}_max_delay", fallback=max_delay),
+            cp.getint("retry", f"{outcome}_max_attempts", fallback=max_attempts),
+            jitter == "full",
+        )
+
+    if not cfg["artist_snapshot_path"]:
+        cfg["artist_snapshot_path"] = os.path.splitext(cfg["csv_path"])[0] + ".artists.json"
+    if not cfg["warmup_model_path"]:
+        cfg["warmup_model_path"] = os.path.splitext(cfg["csv_path"])[0] + ".warmup.json"
+    cfg["extra_targets"] = _read_targets(cp)
+
+    cfg["shard_index"], cfg["shard_count"] = parse_shard(
+        shard if shard is not None else cp.get("run", "shard", fallback=""))
+    if cfg["shard_count"] > 1:
+        apply_shard(cfg)
+
     if not cfg["api_key"] or "REPLACE_WITH_YOUR_LIDARR_API_KEY" in cfg["api_key"]:
         raise ValueError("Missing [lidarr].api_key in config (or still using the placeholder).")
 
     return cfg
 
 
-def trigger_lidarr_refresh(base_url: str, api_key: str, artist_id: Optional[int]) -> None:
-    """Fire-and-forget refresh request to Lidarr for the given artist id."""
-    if artist_id is None:
-        return
-    session = requests.Session()
-    headers = {"X-Api-Key": api_key}
-    payloads = [
-        {"name": "RefreshArtist", "artistIds": [artist_id]},
-        {"name": "RefreshArtist", "artistId": artist_id},
+def merge_shard_ledgers(cfg: dict, count: int) -> int:
+    """Fold the per-shard CSV/journal ledgers of an N-shard run into csv_path.
+
+    Each shard's file is authoritative for the MBIDs that shard owns, so rows it pruned
+    stay pruned. Rows in csv_path are kept only for MBIDs whose shard left no file; those
+    found in other shards' files (e.g. after the shard count changed) keep their most
+    recently checked row. The shards' artist snapshots are combined. Returns the number
+    of rows written.
+    """
+    base = JournalLedgerStore(cfg["csv_path"])
+    shard_rows: Dict[int, Dict[str, LedgerRow]] = {}
+    artists: Dict[str, list] = {}
+    for index in range(1, count + 1):
+        path = shard_path(cfg["csv_path"], index, count)
+        if not os.path.exists(path) and not os.path.exists(path + ".journal"):
+            print(f"WARNING: No ledger for shard {index}/{count} at {path}", file=sys.stderr)
+            continue
+        shard_rows[index] = JournalLedgerStore(path).load()
+        snapshot = load_artist_snapshot(shard_path(cfg["artist_snapshot_path"], index, count))
+        if snapshot is not None:
+            artists.update(snapshot["artists"])
+    if not shard_rows:
+        raise RuntimeError(f"No shard ledgers found next to {cfg['csv_path']}")
+    
+    merged = {mbid: row for mbid, row in base.load().items() if shard_of(mbid, count) not in shard_rows}
+    for index, rows in shard_rows.items():
+        for mbid, row in rows.items():
+            owner = shard_of(mbid, count)
+            if owner == index:
+                merged[mbid] = row
+            elif owner not in shard_rows:
+                kept = merged.get(mbid)
+                if kept is None or row.checked_at >= kept.checked_at:
+                    merged[mbid] = row
+    
+    write_ledger(cfg["csv_path"], merged)
+    if os.path.exists(base.journal_path):
+        os.remove(base.journal_path)  # Already folded into the rows just written
+    if artists:
+        save_artist_snapshot(cfg["artist_snapshot_path"], artists, artists_content_hash(artists))
+    print(f"Merged {len(shard_rows)}/{count} shard ledgers into {cfg['csv_path']} ({len(merged)} rows)")
+    return len(merged)
+
+
+class LidarrRefreshDispatcher:
+    """Collects newly-warmed Lidarr artist IDs and sends them as batched RefreshArtist commands.
+
+    IDs are coalesced until max_batch_size are waiting or max_delay_seconds have
+    passed since the first one arrived. The working endpoint/payload variant is
+    detected on the first send and reused for the rest of the run.
+    """
+    
+    # (path, payload style) in order of preference; "list" sends artistIds, "single" one artistId per POST
+    VARIANTS = [
+        ("/api/v1/command", "list"),
+        ("/api/v1/command", "single"),
+        ("/api/command", "list"),
+        ("/api/command", "single"),
     ]
-    for path in ("/api/v1/command", "/api/command"):
-        url = f"{base_url.rstrip('/')}{path}"
-        for body in payloads:
-            try:
-                session.post(url, headers=headers, json=body, timeout=0.5)
-                return
-            except Exception:
-                continue
-
-
-def process_mbids_in_batches(
-    to_check: List[str], 
-    cfg: dict, 
-    ledger: dict,
-    mbid_to_name: dict,
-    mbid_to_lidarr_id: dict
-) -> Tuple[int, int, int]:
-    """Process MBIDs in batches. Returns (transitioned_count, total_new_successes, total_new_failures)"""
-    batch_size = cfg.get("batch_size", 25)
-    total_batches = (len(to_check) + batch_size - 1) // batch_size
-    total_transitioned = 0
-    total_new_successes = 0
-    total_new_failures = 0
-    
-    # Track timing across all batches
-    overall_start_time = time.time()
-    total_processed = 0
-    
-    for batch_idx in range(0, len(to_check), batch_size):
-        batch_num = batch_idx // batch_size + 1
-        batch = to_check[batch_idx:batch_idx + batch_size]
-        
-        print(f"=== Batch {batch_num}/{total_batches} ({len(batch)} MBIDs) ===")
-        
-        batch_transitioned, batch_successes, batch_failures = asyncio.run(
-            check_mbids_concurrent_with_timing(batch, cfg, ledger, mbid_to_name, mbid_to_lidarr_id, overall_start_time, total_processed)
-        )
-        
-        total_transitioned += batch_transitioned
-        total_new_successes += batch_successes
-        total_new_failures += batch_failures
-        total_processed += len(batch)
-        
-        # Write after each batch
-        write_ledger(cfg["csv_path"], ledger)
-        print(f"Batch {batch_num} complete. Ledger updated.")
+    
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        base_url: str,
+        api_key: str,
+        max_batch_size: int = 50,
+        max_delay_seconds: float = 10.0
+    ):
+        self.session = session
+        self.base_url = base_url.rstrip('/')
+        self.headers = {"X-Api-Key": api_key}
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_delay_seconds = max_delay_seconds
+        self.variant: Optional[Tuple[str, str]] = None
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
         
-        # Optional: brief pause between batches
-        if batch_num < total_batches and cfg.get("batch_pause_seconds", 0) > 0:
-            time.sleep(cfg["batch_pause_seconds"])
+        # Statistics
+        self.commands_sent = 0
+        self.artists_refreshed = 0
+        self.failures = 0
+    
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+    
+    def submit(self, artist_id: Optional[int]) -> None:
+        """Queue an artist for refresh; never blocks the probe loop"""
+        if artist_id is not None:
+            self._queue.put_nowait(artist_id)
+    
+    async def close(self) -> None:
+        """Send whatever is still queued and stop the dispatcher"""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+    
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            
+            batch = [first]
+            deadline = loop.time() + self.max_delay_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    artist_id = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if artist_id is None:
+                    stopping = True
+                    break
+                batch.append(artist_id)
+            
+            await self._send(batch)
     
-    return total_transitioned, total_new_successes, total_new_failures
+    async def _post(self, path: str, body: dict) -> bool:
+        try:
+            async with self.session.post(f"{self.base_url}{path}", headers=self.headers, json=body) as resp:
+                return resp.status < 400
+        except Exception:
+            return False
+    
+    async def _send_with(self, variant: Tuple[str, str], artist_ids: List[int]) -> bool:
+        path, style = variant
+        if style == "list":
+            return await self._post(path, {"name": "RefreshArtist", "artistIds": artist_ids})
+        results = [await self._post(path, {"name": "RefreshArtist", "artistId": a}) for a in artist_ids]
+        return all(results)
+    
+    async def _send(self, artist_ids: List[int]) -> None:
+        if self.variant is not None:
+            ok = await self._send_with(self.variant, artist_ids)
+        else:
+            ok = False
+            for variant in self.VARIANTS:
+                if await self._send_with(variant, artist_ids):
+                    self.variant = variant
+                    ok = True
+                    print(f"  -> Lidarr refresh endpoint detected: {variant[0]} ({variant[1]} payload)")
+                    break
+        
+        if ok:
+            self.commands_sent += 1
+            self.artists_refreshed += len(artist_ids)
+            print(f"  -> Sent Lidarr refresh for {len(artist_ids)} artist(s)")
+        else:
+            self.failures += 1
+            print(f"⚠️  Lidarr refresh failed for {len(artist_ids)} artist(s)")
 
 
-async def check_mbids_concurrent_with_timing(
-    to_check: List[str],
-    cfg: dict,
-    ledger: dict,
-    mbid_to_name: dict,
-    mbid_to_lidarr_id: dict,
-    overall_start_time: float,
-    offset: int
-) -> Tuple[int, int, int]:
-    """Check MBIDs concurrently with proper timing across batches"""
-    
-    rate_limiter = SafeRateLimiter(
+def create_probe_session(cfg: dict) -> aiohttp.ClientSession:
+    """Pooled HTTP session for probing, sized to the concurrency limit and reused for the whole run"""
+    connector = aiohttp.TCPConnector(
+        limit=cfg["max_concurrent_requests"],
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=cfg["timeout_seconds"])
+    )
+
+
+def create_rate_limiter(cfg: dict) -> SafeRateLimiter:
+    return SafeRateLimiter(
         requests_per_second=cfg["rate_limit_per_second"],
         max_concurrent=cfg["max_concurrent_requests"],
         circuit_breaker_threshold=cfg.get("circuit_breaker_threshold", 25),
         backoff_factor=cfg.get("backoff_factor", 2.0),
-        max_backoff_seconds=cfg.get("max_backoff_seconds", 60)
+        max_backoff_seconds=cfg.get("max_backoff_seconds", 60),
+        burst=cfg.get("rate_limit_burst", 1),
+        min_concurrent=cfg.get("min_concurrent_requests", 1),
+        adaptive_concurrency=cfg.get("adaptive_concurrency", False),
+        latency_tolerance=cfg.get("latency_tolerance", 2.0)
     )
+
+
+async def publish_metrics_periodically(cfg: dict, targets: List["ProbeTarget"], interval: float = 5.0) -> None:
+    """Refresh every target's limiter gauges and rewrite the metrics textfile until cancelled"""
+    while True:
+        for target in targets:
+            record_limiter_metrics(target.rate_limiter, target.name)
+        publish_metrics(cfg)
+        await asyncio.sleep(interval)
+
+
+async def check_mbids_concurrent_with_timing(
+    to_check: List[str],
+    cfg: dict,
+    ledger: Dict[str, LedgerRow],
+    store,
+    session: aiohttp.ClientSession,
+    rate_limiter: SafeRateLimiter,
+    refresher: Optional[LidarrRefreshDispatcher],
+    overall_start_time: float,
+    offset: int,
+    source: Optional[AsyncIterator[str]] = None,
+    stop_requested: Optional[asyncio.Event] = None,
+    warmup: Optional[WarmupModel] = None,
+    max_attempts: Optional[int] = None
+) -> Dict[str, float]:
+    """Check MBIDs with a pool of concurrent workers sharing one session and rate limiter.
+
+    A non-200 result puts the MBID on the retry scheduler and frees its worker. MBIDs from
+    `source` join as they arrive. Returns the run totals (successes, failures, attempts, ...).
+    """
     
-    transitioned_count = 0
-    new_successes = 0
-    new_failures = 0
-    timeout_obj = aiohttp.ClientTimeout(total=cfg["timeout_seconds"])
+    if source is None:
+        num_workers = max(1, min(cfg["max_concurrent_requests"], len(to_check)))
+    else:
+        num_workers = max(1, cfg["max_concurrent_requests"])
+    batch_size = max(1, cfg.get("batch_size", 25))
+    max_attempts = max_attempts or cfg["max_attempts_per_artist"]
+    policies = cfg.get("retry_policies") or {
+        outcome: RetryPolicy(cfg["delay_between_attempts"], cfg["delay_between_attempts"])
+        for outcome in RETRY_OUTCOMES
+    }
+    loop = asyncio.get_running_loop()
+    tag = f"[{cfg['target_label']}] " if cfg.get("target_label") else ""
+    target_name = cfg.get("target_label") or "primary"
     
-    # Track progress stats for this batch
-    batch_successes = 0
-    batch_timeouts = 0
+    # Ready queue: due retries (tier 0) go ahead of fresh MBIDs (tier 1) so the set
+    # of partially-warmed artists stays small; tier 2 is the shutdown sentinel.
+    ready: asyncio.PriorityQueue = asyncio.PriorityQueue()
+    sequence = itertools.count()
+    for mbid in to_check:
+        ready.put_nowait((1, next(sequence), mbid))
     
-    async with aiohttp.ClientSession(timeout=timeout_obj) as session:
-        for i, mbid in enumerate(to_check):
-            # Check circuit breaker
-            if not await rate_limiter.acquire():
-                print(f"🚫 Circuit breaker open, skipping remaining {len(to_check) - i} MBIDs")
-                break
+    scheduler = RetryScheduler()
+    wake = asyncio.Event()
+    halted = asyncio.Event()  # circuit breaker open or stop requested
+    source_done = asyncio.Event()
+    if source is None:
+        source_done.set()
+    
+    # Failed attempts so far for each MBID still in flight, by RETRY_OUTCOMES class
+    outcomes_seen: Dict[str, Dict[str, int]] = {}
+    connection_errors = 0  # consecutive, across all MBIDs
+    # When each MBID still in flight first and last answered 503, for the warm-up model
+    cold_since: Dict[str, List[float]] = {}
+    
+    # Run totals (results are recorded without awaiting, so these are never torn)
+    totals = {"completed": 0, "outstanding": len(to_check), "total": offset + len(to_check),
+              "transitioned": 0, "successes": 0, "failures": 0, "attempts": 0,
+              "ledger_seconds": 0.0}
+    worker_stats = [
+        {"processed": 0, "attempts": 0, "successes": 0, "timeouts": 0, "busy_seconds": 0.0}
+        for _ in range(num_workers)
+    ]
+    
+    def record_result(worker_id: int, mbid: str, status: str,
+                      last_code: str, attempts_used: int) -> None:
+        """Update ledger, counters and console output for one finished MBID"""
+        row = ledger[mbid]
+        name = row.artist_name or 'Unknown'
+        prev_status = row.status
+        totals["completed"] += 1
+        totals["outstanding"] -= 1
+        global_position = offset + totals["completed"]
+        # While MBIDs are still streaming in, the total is a lower bound
+        total_to_process = totals["total"]
+        total_label = f"{total_to_process}{'' if source_done.is_set() else '+'}"
+        
+        # Consecutive timed-out runs push the next retry further out (1h, 2h, 4h, ...)
+        failed_runs = 0 if status == "success" else row.failed_runs + 1
+        backoff = failure_backoff_seconds(cfg, failed_runs)
+        now = int(time.time())
+        row.status = Status.SUCCESS if status == "success" else Status.TIMEOUT
+        row.attempts = attempts_used
+        row.last_status_code = _parse_status_code(last_code)
+        row.checked_at = now
+        row.failed_runs = failed_runs
+        row.next_eligible_at = now + int(backoff) if backoff else 0
+        
+        stats = worker_stats[worker_id]
+        stats["processed"] += 1
+        if status == "success":
+            totals["successes"] += 1
+            stats["successes"] += 1
+            outcome = "SUCCESS"
+        else:
+            totals["failures"] += 1
+            stats["timeouts"] += 1
+            outcome = "TIMEOUT"
+        METRICS.inc("artists_checked_total", outcome=status)
+        METRICS.set("run_artists_checked", totals["successes" if status == "success" else "failures"], outcome=status)
+        METRICS.observe("artist_attempts", attempts_used, outcome=status)
+        
+        # One complete line per MBID so concurrent workers never interleave output
+        print(f"{tag}[{global_position}/{total_label}] Checked {name} [{mbid}] ... "
+              f"{outcome} (code={last_code}, attempts={attempts_used})", flush=True)
+        
+        # Queue a Lidarr refresh if configured (sent in batches by the dispatcher)
+        if (refresher is not None
+            and row.entity == "artist"
+            and status == "success"
+            and prev_status in (Status.PENDING, Status.TIMEOUT)):
+            artist_id = row.lidarr_id
+            refresher.submit(artist_id)
+            totals["transitioned"] += 1
+            print(f"  -> Queued Lidarr refresh for {name} [artist_id={artist_id}]")
+        
+        # Persist the row (the store decides how often that reaches disk)
+        write_started = time.perf_counter()
+        store.upsert(row)
+        
+        # Checkpoint every batch_size results
+        checkpoint = global_position % batch_size == 0 or global_position == total_to_process
+        if checkpoint:
+            store.flush()
+        totals["ledger_seconds"] += time.perf_counter() - write_started
+        if checkpoint:
+            total_batches = (total_to_process + batch_size - 1) // batch_size
+            print(f"{tag}Batch {(global_position + batch_size - 1) // batch_size}/{total_batches}"
+                  f"{'' if source_done.is_set() else '+'} complete. Ledger updated.")
+        
+        # Progress reporting
+        if global_position % cfg.get("log_progress_every_n", 25) == 0:
+            elapsed_time = time.time() - overall_start_time
+            artists_per_sec = global_position / max(elapsed_time, 0.1)
+            remaining_artists = total_to_process - global_position
+            eta_seconds = remaining_artists / max(artists_per_sec, 0.01)
             
-            name = mbid_to_name.get(mbid, 'Unknown')
-            prev_status = ledger[mbid].get("status", "").lower()
+            # Calculate ETC (Estimated Time to Completion)
+            etc_timestamp = datetime.now() + timedelta(seconds=eta_seconds)
+            etc_str = etc_timestamp.strftime("%H:%M")
             
-            # Use offset for proper numbering across batches
-            global_position = offset + i + 1
-            total_to_process = offset + len(to_check)
+            limiter_stats = rate_limiter.get_stats()
+            run_processed = totals["successes"] + totals["failures"]
+            concurrency = f"Concurrency: {limiter_stats['concurrency_limit']} - " if cfg.get("adaptive_concurrency") else ""
             
-            print(f"[{global_position}/{total_to_process}] Checking {name} [{mbid}] ...", end="", flush=True)
+            print(f"{tag}Progress: {global_position}/{total_label} ({(global_position/total_to_process*100):.1f}%) - "
+                  f"Rate: {artists_per_sec:.1f} artists/sec - ETC: {etc_str} - "
+                  f"API: {limiter_stats.get('current_rate', 'N/A')} - "
+                  f"{concurrency}"
+                  f"Run: {totals['successes']}/{run_processed} success - "
+                  f"Retry queue: {len(scheduler)}")
+        
+        # Let the dispatcher notice when the last MBID finishes
+        if totals["outstanding"] == 0:
+            wake.set()
+    
+    async def feed_from_source() -> None:
+        """Queue MBIDs from the streaming source as they arrive"""
+        try:
+            async for mbid in source:
+                if halted.is_set():
+                    break
+                totals["outstanding"] += 1
+                totals["total"] += 1
+                ready.put_nowait((1, next(sequence), mbid))
+        except Exception as e:
+            print(f"ERROR streaming MBIDs: {e}; finishing the {totals['outstanding']} already queued", file=sys.stderr)
+        finally:
+            source_done.set()
+            wake.set()
+    
+    async def dispatch_retries() -> None:
+        """Move due retries onto the ready queue until every MBID is resolved"""
+        while ((totals["outstanding"] > 0 or not source_done.is_set())
+               and not halted.is_set()):
+            now = loop.time()
+            for mbid in scheduler.pop_due(now):
+                ready.put_nowait((0, next(sequence), mbid))
+            METRICS.set("retry_queue_size", len(scheduler))
             
+            next_due_at = scheduler.next_due_at()
+            wait_for = None if next_due_at is None else max(0.0, next_due_at - now)
+            wake.clear()
             try:
-                status, last_code, attempts_used, response_time = await check_mbid_with_cache_warming(
-                    session,
-                    mbid,
-                    cfg["target_base_url"],
-                    cfg["max_attempts_per_artist"],
-                    cfg["delay_between_attempts"],
-                    cfg["timeout_seconds"]
-                )
-                
-                rate_limiter.release(int(last_code) if last_code.isdigit() else last_code, response_time)
-                
-                # Update ledger
-                ledger[mbid].update({
-                    "status": status,
-                    "attempts": attempts_used,
-                    "last_status_code": last_code,
-                    "last_checked": iso_now()
-                })
-                
-                # Count results
-                if status == "success":
-                    new_successes += 1
-                    batch_successes += 1
-                    print(f" SUCCESS (code={last_code}, attempts={attempts_used})")
-                else:
-                    new_failures += 1
-                    batch_timeouts += 1
-                    print(f" TIMEOUT (code={last_code}, attempts={attempts_used})")
-                
-                # Trigger Lidarr refresh if configured
-                if (cfg.get("update_lidarr", False) 
-                    and status == "success" 
-                    and prev_status in ("", "timeout")):
-                    artist_id = mbid_to_lidarr_id.get(mbid)
-                    trigger_lidarr_refresh(cfg["lidarr_url"], cfg["api_key"], artist_id)
-                    transitioned_count += 1
-                    print(f"  -> Triggered Lidarr refresh for {name} [artist_id={artist_id}]")
-                
-            except Exception as e:
-                response_time = 1.0  # Estimate for failed requests
-                rate_limiter.release("EXC", response_time)
-                
-                ledger[mbid].update({
-                    "status": "timeout",
-                    "attempts": cfg["max_attempts_per_artist"],
-                    "last_status_code": f"EXC:{type(e).__name__}",
-                    "last_checked": iso_now()
-                })
-                
-                new_failures += 1
-                batch_timeouts += 1
-                print(f" TIMEOUT (code=EXC:{type(e).__name__}, attempts={cfg['max_attempts_per_artist']})")
+                await asyncio.wait_for(wake.wait(), timeout=wait_for)
+            except asyncio.TimeoutError:
+                pass
+        
+        for _ in range(num_workers):
+            ready.put_nowait((2, next(sequence), None))
+    
+    async def watch_for_stop() -> None:
+        await stop_requested.wait()
+        if not halted.is_set():
+            halted.set()
+            wake.set()
+            print(f"Stop requested, leaving the remaining {totals['outstanding']} MBIDs pending")
+    
+    async def worker(worker_id: int) -> None:
+        nonlocal connection_errors
+        stats = worker_stats[worker_id]
+        while True:
+            _, _, mbid = await ready.get()
+            if mbid is None or halted.is_set():
+                return
             
-            # Batch writing
-            if global_position % cfg.get("batch_write_frequency", 5) == 0:
-                write_ledger(cfg["csv_path"], ledger)
+            started = time.time()
+            status_code, _, retry_after = await probe_mbid_once(session, rate_limiter, mbid, cfg["target_base_url"],
+                                                                ledger[mbid].entity, target_name)
+            stats["busy_seconds"] += time.time() - started
             
-            # Progress reporting with batch stats
-            if global_position % cfg.get("log_progress_every_n", 25) == 0:
-                elapsed_time = time.time() - overall_start_time
-                artists_per_sec = global_position / max(elapsed_time, 0.1)
-                remaining_artists = total_to_process - global_position
-                eta_seconds = remaining_artists / max(artists_per_sec, 0.01)
-                
-                # Calculate ETC (Estimated Time to Completion)
-                etc_timestamp = datetime.now() + timedelta(seconds=eta_seconds)
-                etc_str = etc_timestamp.strftime("%H:%M")
-                
-                stats = rate_limiter.get_stats()
-                
-                # Calculate total processed in current batch so far
-                batch_processed = batch_successes + batch_timeouts
-                
-                print(f"Progress: {global_position}/{total_to_process} ({(global_position/total_to_process*100):.1f}%) - "
-                      f"Rate: {artists_per_sec:.1f} artists/sec - ETC: {etc_str} - "
-                      f"API: {stats.get('current_rate', 'N/A')} - Batch: {batch_successes}/{batch_processed} success")
+            # Circuit breaker opened: leave this and all remaining MBIDs pending for the next run
+            if status_code is None:
+                if not halted.is_set():
+                    halted.set()
+                    wake.set()
+                    METRICS.inc("circuit_breaker_opens_total")
+                    print(f"{tag}🚫 Circuit breaker open, skipping remaining {totals['outstanding']} MBIDs")
+                return
+            
+            stats["attempts"] += 1
+            totals["attempts"] += 1
+            seen = outcomes_seen.setdefault(mbid, {})
+            # Forced and TTL re-verifications of successes say nothing about how many
+            # attempts a cold MBID needs
+            counts_attempts = ledger[mbid].status is not Status.SUCCESS
+            
+            if status_code == 200:
+                # SUCCESS! Cache warming worked
+                connection_errors = 0
+                outcomes_seen.pop(mbid, None)
+                cold = cold_since.pop(mbid, None)
+                # 429s say nothing about the cache, so they are not counted as attempts
+                warmed_on = sum(seen.values()) - seen.get("rate_limited", 0) + 1
+                if warmup is not None and cold is not None:
+                    # It warmed somewhere between the last 503 and now: take the midpoint
+                    first_503_at, last_503_at = cold
+                    warmup.observe((last_503_at + loop.time()) / 2 - first_503_at,
+                                   warmed_on if counts_attempts else None)
+                record_result(worker_id, mbid, "success", str(status_code), warmed_on)
+                continue
+            
+            outcome = retry_outcome(status_code)
+            policy = policies[outcome]
+            seen[outcome] = seen.get(outcome, 0) + 1
+            # 429s say nothing about the cache, so they do not use up the artist's attempts
+            counted = sum(seen.values()) - seen.get("rate_limited", 0)
+            connection_errors = connection_errors + 1 if outcome == "connection" else 0
+            if outcome == "cache_miss":
+                cold_since.setdefault(mbid, [loop.time(), 0.0])[1] = loop.time()
+            
+            if counted >= max_attempts or policy.exhausted(seen[outcome]):
+                # Out of attempts overall, or for this kind of failure
+                outcomes_seen.pop(mbid, None)
+                if cold_since.pop(mbid, None) is not None and warmup is not None and counts_attempts:
+                    warmup.observe_gave_up(counted)
+                record_result(worker_id, mbid, "timeout", str(status_code), counted)
+                continue
+            
+            # Retry on this outcome's backoff, handing the slot back to the pool meanwhile
+            delay = policy.backoff(seen[outcome])
+            if outcome == "cache_miss" and warmup is not None and mbid in cold_since:
+                # Come back when this MBID is likely warm rather than polling it
+                elapsed = loop.time() - cold_since[mbid][0]
+                warm_at = warmup.warm_at(elapsed, cfg["warmup_quantile"])
+                if warm_at is not None:
+                    delay = min(max(policy.delay, warm_at - elapsed), cfg["warmup_max_wait_seconds"])
+            if outcome == "cache_miss" and retry_after is not None:
+                # The API said when this MBID's cache should be ready
+                delay = retry_after
+            if outcome == "connection":
+                # The API or network is down for everyone, not just this MBID
+                delay = policy.backoff(connection_errors)
+                rate_limiter.pause(delay)
+                print(f"{tag}⚠️  {status_code}: pausing all requests for {delay:.1f}s")
+            scheduler.schedule(mbid, loop.time() + delay)
+            wake.set()
+    
+    tasks = [dispatch_retries()] + [worker(i) for i in range(num_workers)]
+    if source is not None:
+        tasks.append(feed_from_source())
+    stop_watcher = asyncio.create_task(watch_for_stop()) if stop_requested is not None else None
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        if stop_watcher is not None:
+            stop_watcher.cancel()
+    
+    # Per-worker breakdown for this run
+    print(f"{tag}Worker stats ({num_workers} workers):")
+    for worker_id, stats in enumerate(worker_stats):
+        print(f"  worker-{worker_id + 1}: {stats['processed']} checked "
+              f"({stats['successes']} success, {stats['timeouts']} timeout), "
+              f"{stats['attempts']} attempts, busy {stats['busy_seconds']:.1f}s")
+    
+    return totals
+
+
+def finish_run(
+    cfg: dict,
+    ledger: dict,
+    store,
+    results: dict,
+    checked_count: int
+) -> dict:
+    """Checkpoint the ledger store, print the summary and write the results log. Returns the summary."""
+    # Final write and summary
+    write_started = time.perf_counter()
+    store.checkpoint()
+    ledger_seconds = results.get("ledger_seconds", 0.0) + time.perf_counter() - write_started
+
+    record_ledger_metrics(ledger)
+    METRICS.set("run_in_progress", 0)
+    METRICS.set("run_end_timestamp_seconds", time.time())
+    publish_metrics(cfg)
+
+    # Calculate final statistics
+    successes = sum(1 for r in ledger.values() if r.status is Status.SUCCESS)
+    timeouts = sum(1 for r in ledger.values() if r.status is Status.TIMEOUT)
+    removed = sum(1 for r in ledger.values() if r.status is Status.REMOVED)
+    backing_off = sum(1 for r in ledger.values() if in_failure_backoff(r))
+    pending = len(ledger) - successes - timeouts - removed
+    albums = sum(1 for r in ledger.values() if r.entity == "album")
+
+    summary = {
+        "success": successes,
+        "timeout": timeouts,
+        "pending": pending,
+        "removed": removed,
+        "backing_off": backing_off,
+        "total": len(ledger),
+        "albums": albums,
+        "force_mode": bool(cfg["force"]),
+        "refreshes_triggered": results.get("transitioned", 0),
+        "new_successes_this_run": results.get("successes", 0),
+        "new_failures_this_run": results.get("failures", 0),
+        "checked_this_run": checked_count,
+        "ttl_rechecks_this_run": results.get("ttl_rechecks", 0),
+        "requests_this_run": results.get("requests", 0),
+        "concurrency_limit": results.get("concurrency_limit"),
+        "max_attempts_per_artist": results.get("max_attempts"),
+        "warmup_median_seconds": results.get("warmup_median_seconds"),
+        "ledger_write_seconds": round(ledger_seconds, 3),
+    }
+    for q in (50, 95, 99):
+        latency = results.get(f"latency_p{q}")
+        summary[f"attempt_latency_p{q}_ms"] = round(latency * 1000, 1) if latency is not None else None
+    # Extra targets: how each stands across the ledger, and what it cost this run
+    for name, target_results in results.get("targets", {}).items():
+        rows = [r.targets[name] for r in ledger.values()
+                if r.targets and name in r.targets and r.status is not Status.REMOVED]
+        summary[f"{name}_success"] = sum(1 for r in rows if r.status is Status.SUCCESS)
+        summary[f"{name}_timeout"] = sum(1 for r in rows if r.status is Status.TIMEOUT)
+        summary[f"{name}_requests_this_run"] = target_results.get("requests", 0)
+
+    # Console summary
+    print(f"\nSummary:")
+    print(f"  Total in ledger: {len(ledger)}" + (f" ({albums} albums)" if albums else ""))
+    print(f"  Success: {successes}")
+    print(f"  Timeout: {timeouts}" + (f" ({backing_off} backing off)" if backing_off else ""))
+    if removed:
+        print(f"  Removed from Lidarr: {removed}")
+    for name in results.get("targets", {}):
+        print(f"  Target {name}: {summary[f'{name}_success']} success, {summary[f'{name}_timeout']} timeout "
+              f"({summary[f'{name}_requests_this_run']} requests this run)")
+    print(f"  Refreshes triggered (new successes): {summary['refreshes_triggered']}")
+    print(f"\nLedger written to: {store.path}")
+
+    # Write simple results log
+    results_dir = cfg.get("results_dir", "/data")
+    try:
+        os.makedirs(results_dir, exist_ok=True)
+        ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        log_path = os.path.join(results_dir, f"results_{ts}.log")
+        if cfg.get("shard_count", 1) > 1:
+            log_path = shard_path(log_path, cfg["shard_index"], cfg["shard_count"])
+        with open(log_path, "w", encoding="utf-8") as lf:
+            lf.write(f"finished_at_utc={iso_now()}\n")
+            for key, value in summary.items():
+                if isinstance(value, bool):
+                    value = "true" if value else "false"
+                lf.write(f"{key}={'' if value is None else value}\n")
+        print(f"Results log written to: {log_path}")
+    except Exception as e:
+        print(f"WARNING: Failed to write results log to {results_dir}: {e}", file=sys.stderr)
+
+    return summary
+
+
+class TargetLedger(collections.abc.Mapping):
+    """The ledger as one extra target sees it: {mbid: that target's LedgerRow}.
+
+    Only MBIDs the target has a row for are in it; row_for() adds one before the target
+    probes an MBID, so the engine and prioritize() can use the view like the ledger.
+    """
+    
+    def __init__(self, ledger: Dict[str, LedgerRow], name: str):
+        self._ledger = ledger
+        self.name = name
+    
+    def __getitem__(self, mbid: str) -> LedgerRow:
+        row = self._ledger[mbid]
+        if not row.targets or self.name not in row.targets:
+            raise KeyError(mbid)
+        return row.targets[self.name]
+    
+    def row_for(self, mbid: str) -> LedgerRow:
+        """The target's row for `mbid`, created if it has none yet"""
+        return self._ledger[mbid].target_row(self.name)
+    
+    def __iter__(self):
+        name = self.name
+        return (mbid for mbid, row in self._ledger.items() if row.targets and name in row.targets)
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class TargetStore:
+    """A ledger store as an extra target's engine uses it: saving a target row saves its whole ledger row"""
+    
+    def __init__(self, store, ledger: Dict[str, LedgerRow]):
+        self._store = store
+        self._ledger = ledger
+    
+    @property
+    def path(self) -> str:
+        return self._store.path
+    
+    def upsert(self, row: LedgerRow) -> None:
+        self._store.upsert(self._ledger[row.mbid])
+    
+    def flush(self) -> None:
+        self._store.flush()
+
+
+class ProbeTarget:
+    """One endpoint to warm, with its own settings, rate limiter, session and warm-up model.
+
+    The primary target is [probe] target_base_url, whose state is the ledger rows
+    themselves. Each [target:<name>] probes through a TargetLedger and TargetStore, with
+    [probe] settings overridden by its section.
+    """
+    
+    def __init__(self, name: str, cfg: dict, ledger: Dict[str, LedgerRow], store):
+        self.name = name
+        self.primary = name == "primary"
+        self._rows = ledger
+        self.overrides: Dict[str, object] = {}
+        if self.primary:
+            self.ledger, self.store = ledger, store
+        else:
+            self.ledger, self.store = TargetLedger(ledger, name), TargetStore(store, ledger)
+            self.overrides = dict(cfg["extra_targets"][name])
+            self.overrides["warmup_model_path"] = os.path.splitext(cfg["warmup_model_path"])[0] + f".{name}.json"
+        self.cfg = dict(cfg, **self.overrides) if self.overrides else cfg
+        self.rate_limiter: Optional[SafeRateLimiter] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.warmup: Optional[WarmupModel] = None
+        self.rechecks: set = set()
+    
+    def open(self) -> None:
+        cfg = self.cfg
+        if cfg.get("warmup_learn", True):
+            self.warmup = load_warmup_model(cfg["warmup_model_path"], cfg.get("warmup_min_samples", 50))
+        self.rate_limiter = create_rate_limiter(cfg)
+        self.session = create_probe_session(cfg)
+    
+    def start_run(self, cfg: dict) -> None:
+        """Pick up the run's settings (e.g. --force) and forget the last run's rechecks"""
+        self.cfg = dict(cfg, **self.overrides) if self.overrides else cfg
+        self.rechecks = set()
+    
+    def needs(self, mbid: str) -> bool:
+        """Whether this target has yet to warm `mbid` (see needs_check)"""
+        row = self._rows[mbid]
+        if not self.primary:
+            if row.status is Status.REMOVED:
+                return False
+            row = row.targets.get(self.name) if row.targets else None
+            if row is None:
+                return True
+        return needs_check(row, self.cfg)
+    
+    def takes(self, mbid: str) -> bool:
+        """Whether this run probes `mbid` on this target: it needs it, or it is a TTL recheck"""
+        return mbid in self.rechecks or self.needs(mbid)
+    
+    def track(self, mbid: str) -> None:
+        """Give this target a row for `mbid` before its engine probes it"""
+        if not self.primary:
+            self.ledger.row_for(mbid)
+    
+    def select_rechecks(self, entity: str) -> List[str]:
+        """This target's successes of `entity` past their TTL, remembered for takes()"""
+        rechecks = [mbid for mbid in select_expired_successes(self.ledger, self.cfg, entity=entity)
+                    if self._rows[mbid].status is not Status.REMOVED]
+        self.rechecks.update(rechecks)
+        return rechecks
+
+
+def split_source(source: AsyncIterator[str],
+                 targets: List[ProbeTarget]) -> Tuple[Coroutine, List[AsyncIterator[str]]]:
+    """Share one MBID source between several targets.
+
+    Returns a pump coroutine to run as a task, and an iterator per target yielding each
+    MBID it takes once. The pump reads ahead into unbounded queues, so a slow target
+    never holds up the source, and with it the others.
+    """
+    queues = [asyncio.Queue() for _ in targets]
+    
+    async def pump() -> None:
+        sent = [set() for _ in targets]
+        try:
+            async for mbid in source:
+                for target, queue, seen in zip(targets, queues, sent):
+                    if mbid not in seen and target.takes(mbid):
+                        seen.add(mbid)
+                        target.track(mbid)
+                        queue.put_nowait(mbid)
+        except Exception as e:
+            print(f"ERROR streaming MBIDs: {e}; finishing those already queued", file=sys.stderr)
+        finally:
+            for queue in queues:
+                queue.put_nowait(None)
+    
+    async def drain(queue: asyncio.Queue) -> AsyncIterator[str]:
+        while True:
+            mbid = await queue.get()
+            if mbid is None:
+                return
+            yield mbid
+    
+    return pump(), [drain(queue) for queue in queues]
+
+
+class Checker:
+    """The check pipeline, holding its ledger, HTTP sessions and rate limiter across runs.
+
+    `run_check` opens one for a single run. entrypoint.py's daemon mode keeps one open
+    and calls `run()` every interval, so the ledger is not re-read, pooled connections
+    stay warm and the limiter keeps the rate it has learned. `session`, `rate_limiter`
+    and `warmup` are the primary target's; `targets` lists it first, then any extra ones.
+    """
+    
+    def __init__(self, cfg: dict):
+        self.cfg = cfg
+        self.store = None
+        self.ledger: Dict[str, LedgerRow] = {}
+        self.rate_limiter: Optional[SafeRateLimiter] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.lidarr_session: Optional[aiohttp.ClientSession] = None
+        self.refresher: Optional[LidarrRefreshDispatcher] = None
+        self.stop_requested: Optional[asyncio.Event] = None
+        self.artist_snapshot: Optional[Dict] = None
+        self.warmup: Optional[WarmupModel] = None
+        self.targets: List[ProbeTarget] = []
+    
+    async def open(self) -> None:
+        """Load the ledger and create the sessions, limiter and refresh dispatcher"""
+        cfg = self.cfg
+        self.store = open_ledger_store(cfg)
+        self.ledger = self.store.load()
+        if cfg.get("shard_count", 1) > 1:
+            self._scope_to_shard()
+        self.targets = [ProbeTarget(name, cfg, self.ledger, self.store)
+                        for name in ["primary"] + list(cfg.get("extra_targets", {}))]
+        for target in self.targets:
+            target.open()
+        primary = self.targets[0]
+        self.rate_limiter, self.session, self.warmup = primary.rate_limiter, primary.session, primary.warmup
+        self.lidarr_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        self.stop_requested = asyncio.Event()
+        if cfg.get("update_lidarr", False):
+            self.refresher = LidarrRefreshDispatcher(
+                self.lidarr_session,
+                cfg["lidarr_url"],
+                cfg["api_key"],
+                cfg.get("refresh_batch_size", 50),
+                cfg.get("refresh_max_delay_seconds", 10.0)
+            )
+            self.refresher.start()
+    
+    def _scope_to_shard(self) -> None:
+        """Keep only this shard's rows in memory, seeding a new per-shard file from the main ledger"""
+        cfg = self.cfg
+        for mbid in [mbid for mbid in self.ledger if not in_shard(mbid, cfg)]:
+            del self.ledger[mbid]
+        merged_path = cfg["merged_csv_path"]
+        if (not self.ledger and cfg["ledger_backend"] != "sqlite"
+                and merged_path != cfg["csv_path"] and os.path.exists(merged_path)):
+            rows = [row for mbid, row in read_ledger(merged_path).items() if in_shard(mbid, cfg)]
+            self.store.upsert_many(rows)
+            self.store.checkpoint()
+            print(f"Seeded shard ledger {self.store.path} with {len(rows)} rows from {merged_path}")
+        print(f"Shard {cfg['shard_index']}/{cfg['shard_count']}: {len(self.ledger)} ledger rows, "
+              f"{cfg['rate_limit_per_second']:g} req/sec, {cfg['max_concurrent_requests']} workers")
+    
+    def request_stop(self) -> None:
+        """Let in-flight attempts finish, leave the rest pending and return from run()"""
+        if self.stop_requested is not None:
+            self.stop_requested.set()
+    
+    async def close(self) -> None:
+        """Send queued refreshes, close the sessions and save the ledger"""
+        if self.refresher is not None:
+            await self.refresher.close()
+            self.refresher = None
+        for session in [target.session for target in self.targets] + [self.lidarr_session]:
+            if session is not None:
+                await session.close()
+        for target in self.targets:
+            target.session = None
+        self.session = self.lidarr_session = None
+        if self.store is not None:
+            self.store.close()
+            self.store = None
     
-    return transitioned_count, new_successes, new_failures
+    async def run(self, dry_run: bool = False) -> Optional[dict]:
+        """Run one full check: sync artists (and albums) from Lidarr, probe pending MBIDs, save the ledger.
+
+        Returns the run summary (the numbers written to the results log), or None for
+        a dry run or when there is nothing to check. Raises RuntimeError if the artist
+        list cannot be fetched from Lidarr.
+        """
+        cfg, ledger, store = self.cfg, self.ledger, self.store
+        for target in self.targets:
+            target.start_run(cfg)
+        entities = cfg.get("entities", ["artist"])
+        warm_artists = "artist" in entities
+        mode = 'force mode' if cfg['force'] else 'pending-only'
+
+        if dry_run and not warm_artists:
+            print("DRY RUN MODE - No API calls will be made")
+            print("Albums are only listed from Lidarr as they stream in during a real run")
+            return None
+
+        # Albums always stream (there can be hundreds of thousands) and follow the artists
+        album_counts = {"albums": 0, "new": 0, "removed": 0, "rechecks": 0, "complete": False}
+        albums = None
+        if "album" in entities and not dry_run:
+            albums = iter_streamed_albums_to_check(cfg, ledger, store, album_counts, self._wants,
+                                                   lambda: self._select_rechecks("album"))
+
+        # Streaming mode: probe MBIDs while the artist list is still downloading
+        if (cfg.get("stream_artists", False) or not warm_artists) and not dry_run:
+            counts = {"artists": 0, "new": 0, "renamed": 0, "removed": 0, "rechecks": 0, "complete": False}
+            current: Dict[str, list] = {}
+            sources = []
+            if warm_artists:
+                print(f"Streaming artists from Lidarr ({mode})...")
+                sources.append(iter_streamed_mbids_to_check(cfg, ledger, store, counts,
+                                                            self._previous_artists(), current, self._wants,
+                                                            lambda: self._select_rechecks("artist")))
+            if albums is not None:
+                print(f"Streaming albums from Lidarr ({mode})...")
+                sources.append(albums)
+            results = await self._process([], chain_sources(*sources))
+            if warm_artists:
+                print(f"Discovered {counts['artists']} artists ({counts['new']} new, "
+                      f"{counts['renamed']} renamed, {counts['removed']} removed).")
+                if counts["rechecks"]:
+                    print(f"Re-verified {counts['rechecks']} successes past their TTL.")
+                # A run cut short never saw the whole list, so it cannot be the next baseline
+                if counts["complete"]:
+                    self._save_artist_snapshot(current)
+            if albums is not None:
+                self._report_album_sync(album_counts)
+            results["ttl_rechecks"] = counts["rechecks"] + album_counts["rechecks"]
+            return finish_run(cfg, ledger, store, results, results["successes"] + results["failures"])
+
+        # Fetch current artists/MBIDs from Lidarr (blocking HTTP, so off the event loop)
+        artists = await asyncio.to_thread(get_lidarr_artists, cfg["lidarr_url"], cfg["api_key"])
+        if cfg.get("shard_count", 1) > 1:
+            artists = [a for a in artists if in_shard(a["mbid"], cfg)]
+
+        # Only artists added, renamed or removed since the last sync touch the ledger
+        diff = diff_artists(self._previous_artists(), artists)
+        new_count = 0
+        changed_rows = []
+        for a in diff["added"] + diff["renamed"]:
+            is_new, changed = merge_artist(ledger, a)
+            if is_new:
+                new_count += 1
+            if changed is not None:
+                changed_rows.append(changed)
+        store.upsert_many(changed_rows)
+        removed_count = apply_removed_artists(ledger, store, diff["removed"], cfg.get("removed_artists", "mark"),
+                                              len(artists))
+        for a in artists:
+            ledger[a["mbid"]].lidarr_id = a.get("id")
+        self._save_artist_snapshot(diff["current"])
+        record_ledger_metrics(ledger)
+
+        # Determine which MBIDs to check (plus this run's share of successes past their TTL),
+        # highest priority first so an interrupted run has done the most valuable work
+        to_check = [mbid for mbid, row in ledger.items() if row.entity == "artist" and self._wants(mbid)]
+        rechecks = self._select_rechecks("artist")
+        to_check = prioritize(list(dict.fromkeys(to_check + rechecks)), ledger, cfg)
+
+        # Show summary and estimates
+        estimated_time = estimate_runtime(len(to_check), cfg)
+        
+        print(f"Discovered {len(artists)} artists ({new_count} new, "
+              f"{len(diff['renamed'])} renamed, {removed_count} removed).")
+        if rechecks:
+            mode += f", {len(rechecks)} successes past TTL"
+        backing_off = 0 if cfg['force'] else sum(1 for row in ledger.values() if in_failure_backoff(row))
+        if backing_off:
+            mode += f", {backing_off} timeouts backing off"
+        print(f"Will check {len(to_check)} MBIDs ({mode})"
+              f"{', then albums as Lidarr streams them' if albums is not None else ''}.")
+        
+        if dry_run:
+            print("DRY RUN MODE - No API calls will be made")
+            print("This would check the following MBIDs:")
+            for i, mbid in enumerate(to_check[:10]):  # Show first 10
+                name = ledger[mbid].artist_name or 'Unknown'
+                print(f"  {i+1}. {name} [{mbid}]")
+            if len(to_check) > 10:
+                print(f"  ... and {len(to_check) - 10} more")
+            return None
+
+        if len(to_check) == 0 and albums is None:
+            print("Nothing to check - all MBIDs are already successful or backing off")
+            store.checkpoint()
+            publish_metrics(cfg)
+            return None
+
+        results = await self._process(to_check, albums)
+        results["ttl_rechecks"] = len(rechecks)
+        if albums is None:
+            return finish_run(cfg, ledger, store, results, len(to_check))
+        self._report_album_sync(album_counts)
+        results["ttl_rechecks"] += album_counts["rechecks"]
+        return finish_run(cfg, ledger, store, results, results["successes"] + results["failures"])
+    
+    def _wants(self, mbid: str) -> bool:
+        """Whether any target needs `mbid` checked"""
+        return any(target.needs(mbid) for target in self.targets)
+    
+    def _select_rechecks(self, entity: str) -> List[str]:
+        """This run's TTL rechecks of `entity` across all targets"""
+        rechecks: List[str] = []
+        for target in self.targets:
+            rechecks += target.select_rechecks(entity)
+        return list(dict.fromkeys(rechecks))
+    
+    @staticmethod
+    def _report_album_sync(counts: dict) -> None:
+        if not counts["complete"]:
+            print(f"Album sync cut short after {counts['albums']} albums ({counts['new']} new).")
+            return
+        print(f"Discovered {counts['albums']} albums ({counts['new']} new, {counts['removed']} removed).")
+        if counts["rechecks"]:
+            print(f"Re-verified {counts['rechecks']} album successes past their TTL.")
+    
+    def _previous_artists(self) -> Dict[str, list]:
+        """Artists as of the last sync, {mbid: [lidarr_id, name]}, for diffing.
+
+        Falls back to the ledger's own rows before the first snapshot exists. Snapshot
+        entries missing from the ledger (e.g. it was reset) are left out, so they merge again.
+        """
+        if self.artist_snapshot is None:
+            self.artist_snapshot = load_artist_snapshot(self.cfg["artist_snapshot_path"])
+        if self.artist_snapshot is None:
+            return {mbid: [None, row.artist_name] for mbid, row in self.ledger.items()
+                    if row.entity == "artist" and row.status is not Status.REMOVED}
+        return {mbid: entry for mbid, entry in self.artist_snapshot["artists"].items() if mbid in self.ledger}
+    
+    def _save_artist_snapshot(self, artists: Dict[str, list]) -> None:
+        """Remember this sync's artists, rewriting the file only when the list changed"""
+        if not artists and self._previous_artists():
+            return  # An empty listing is not trusted as the next baseline (see apply_removed_artists)
+        content_hash = artists_content_hash(artists)
+        if self.artist_snapshot is not None and self.artist_snapshot.get("hash") == content_hash:
+            return
+        try:
+            save_artist_snapshot(self.cfg["artist_snapshot_path"], artists, content_hash)
+        except OSError as e:
+            print(f"WARNING: Failed to save artist snapshot: {e}", file=sys.stderr)
+        self.artist_snapshot = {"hash": content_hash, "artists": artists}
+    
+    def _label(self, target: ProbeTarget) -> str:
+        """Prefix for a target's output lines, when there is more than one"""
+        return f"[{target.name}] " if len(self.targets) > 1 else ""
+    
+    def _max_attempts(self, target: ProbeTarget) -> int:
+        """A target's max_attempts_per_artist, lowered to the point of diminishing returns if enabled"""
+        cfg = target.cfg
+        ceiling = cfg["max_attempts_per_artist"]
+        model = target.warmup
+        if not cfg.get("auto_max_attempts", False) or model is None:
+            return ceiling
+        learned = diminishing_returns_attempts(model.warmed, model.gave_up, cfg["auto_max_attempts_min_yield"],
+                                               cfg.get("warmup_min_samples", 50), cfg["auto_max_attempts_floor"])
+        if learned is None or learned >= ceiling:
+            return ceiling
+        print(f"{self._label(target)}Max attempts per artist: {learned} (later attempts warmed under "
+              f"{cfg['auto_max_attempts_min_yield']:.0%} of the cold MBIDs reaching them; ceiling {ceiling})")
+        return learned
+    
+    def _save_warmup_model(self, target: ProbeTarget) -> None:
+        """Keep what this run learned about a target's warm-up times for the next one"""
+        model = target.warmup
+        try:
+            save_warmup_model(target.cfg["warmup_model_path"], model)
+        except OSError as e:
+            print(f"WARNING: Failed to save warm-up model: {e}", file=sys.stderr)
+        if target.primary:
+            for q in (0.5, 0.9):
+                value = model.seconds.percentile(q)
+                if value is not None:
+                    METRICS.set("warmup_seconds", value, quantile=str(q))
+        label = self._label(target)
+        if model.seconds.count >= model.min_samples:
+            print(f"{label}Warm-up model: {model.seconds.count} warm-ups, median {model.seconds.percentile(0.5):.1f}s, "
+                  f"p90 {model.seconds.percentile(0.9):.1f}s from first 503 to 200")
+        else:
+            print(f"{label}Warm-up model: {model.seconds.count}/{model.min_samples} warm-ups observed, "
+                  f"using the [retry] backoff until then")
+    
+    async def _process(self, to_check: List[str], source: Optional[AsyncIterator[str]] = None) -> dict:
+        """Check MBIDs with the long-lived sessions and limiters.
+
+        Batches are checkpoints only: the ledger is flushed every batch_size results, but
+        the worker pool, connections and learned rate carry straight through. MBIDs from
+        `source`, if given, are checked as they arrive in addition to `to_check`. Each
+        target runs its own engine at the same time, on the MBIDs it takes.
+        Returns the primary target's engine totals plus this run's request count and
+        latency percentiles, with each extra target's under "targets".
+        """
+        cfg = self.cfg
+        METRICS.set("run_in_progress", 1)
+        METRICS.set("run_start_timestamp_seconds", time.time())
+        METRICS.clear("run_artists_checked")
+        for outcome in ("success", "timeout"):
+            METRICS.set("run_artists_checked", 0, outcome=outcome)
+        publisher = None
+        if metrics_textfile_path(cfg):
+            publisher = asyncio.create_task(publish_metrics_periodically(cfg, self.targets))
+        
+        pump = None
+        sources = [source] * len(self.targets)
+        if len(self.targets) > 1 and source is not None:
+            pump, sources = split_source(source, self.targets)
+            pump = asyncio.create_task(pump)
+        try:
+            if len(self.targets) == 1:
+                return await self._process_target(self.targets[0], to_check, source)
+            per_target = await asyncio.gather(*(
+                self._process_target(target, [mbid for mbid in to_check if target.takes(mbid)], target_source)
+                for target, target_source in zip(self.targets, sources)
+            ))
+        finally:
+            if pump is not None:
+                pump.cancel()
+            if publisher is not None:
+                publisher.cancel()
+            for target in self.targets:
+                record_limiter_metrics(target.rate_limiter, target.name)
+        
+        results = per_target[0]
+        results["targets"] = {target.name: r for target, r in zip(self.targets[1:], per_target[1:])}
+        return results
+    
+    async def _process_target(self, target: ProbeTarget, to_check: List[str],
+                              source: Optional[AsyncIterator[str]]) -> dict:
+        """Run one target's engine over `to_check` and `source`; returns its totals (see _process)"""
+        cfg = target.cfg
+        if len(self.targets) > 1:
+            cfg = dict(cfg, target_label=target.name)
+            for mbid in to_check:
+                target.track(mbid)
+            to_check = prioritize(to_check, target.ledger, cfg)
+        rate_limiter = target.rate_limiter
+        requests_before = rate_limiter.total_requests
+        rate_limiter.latency = LatencyHistogram()
+        max_attempts = self._max_attempts(target)
+        if target.primary:
+            METRICS.set("max_attempts_per_artist", max_attempts)
+        
+        results = await check_mbids_concurrent_with_timing(
+            to_check, cfg, target.ledger, target.store,
+            target.session, rate_limiter, self.refresher if target.primary else None, time.time(), 0, source,
+            self.stop_requested, target.warmup, max_attempts
+        )
+        
+        results["max_attempts"] = max_attempts
+        if target.warmup is not None:
+            self._save_warmup_model(target)
+            target.warmup.start_run()
+            results["warmup_median_seconds"] = target.warmup.seconds.percentile(0.5)
+        
+        results["requests"] = rate_limiter.total_requests - requests_before
+        results["concurrency_limit"] = rate_limiter.concurrency.current
+        if cfg.get("adaptive_concurrency", False):
+            limit = rate_limiter.concurrency
+            print(f"{self._label(target)}Adaptive concurrency: settled at {limit.current} in flight "
+                  f"(range {limit.min_limit}-{limit.max_limit}, {limit.decreases} backoffs so far)")
+        for q in (50, 95, 99):
+            results[f"latency_p{q}"] = rate_limiter.latency.percentile(q / 100)
+        return results
+
+
+def run_check(cfg: dict, dry_run: bool = False) -> Optional[dict]:
+    """Open a Checker, run it once and close it. Returns the run summary (see Checker.run)."""
+    return asyncio.run(_run_once(cfg, dry_run))
+
+
+async def _run_once(cfg: dict, dry_run: bool) -> Optional[dict]:
+    checker = Checker(cfg)
+    await checker.open()
+    try:
+        return await checker.run(dry_run)
+    finally:
+        # Also runs when Ctrl+C cancels the run, so progress is saved
+        await checker.close()
 
 
 # Remove the global start_run_time since we're now tracking it properly per batch
 def main():
     
     parser = argparse.ArgumentParser(
-        description="Query Lidarr for MBIDs, keep a CSV ledger, and probe each MBID against a target endpoint with concurrent processing."
+        description="Query Lidarr for MBIDs, keep a CSV or SQLite ledger, and probe each MBID against a target endpoint with concurrent processing."
     )
     parser.add_argument("--config", required=True, help="Path to INI config (e.g., /data/config.ini)")
     parser.add_argument("--force", action="store_true",
                         help="Re-run checks even for MBIDs already marked success")
     parser.add_argument("--dry-run", action="store_true",
                         help="Show what would be done without making API calls")
+    parser.add_argument("--export-csv", metavar="PATH",
+                        help="Export the ledger (from any backend) to a CSV file and exit")
+    parser.add_argument("--shard", metavar="I/N",
+                        help="Check only shard I of N at 1/N of the rate limit (overrides [run] shard)")
+    parser.add_argument("--merge-shards", type=int, metavar="N",
+                        help="Combine the per-shard CSV/journal ledgers of an N-shard run into csv_path and exit")
     args = parser.parse_args()
 
     try:
-        cfg = load_config(args.config)
+        # Merging works on the unsharded paths, whatever [run] shard says
+        cfg = load_config(args.config, shard="" if args.merge_shards else args.shard)
     except Exception as e:
         print(f"ERROR loading config: {e}", file=sys.stderr)
         sys.exit(2)
@@ -778,127 +3453,33 @@ def main():
             print(f"  - {issue}", file=sys.stderr)
         sys.exit(2)
 
-    # Load ledger
-    ledger = read_ledger(cfg["csv_path"])
-
-    # Fetch current artists/MBIDs from Lidarr
-    try:
-        artists = get_lidarr_artists(cfg["lidarr_url"], cfg["api_key"])
-    except Exception as e:
-        print(f"ERROR fetching Lidarr artists: {e}", file=sys.stderr)
-        sys.exit(2)
-
-    # Build helper mappings
-    mbid_to_lidarr_id: Dict[str, Optional[int]] = {}
-    mbid_to_name: Dict[str, str] = {}
-    for a in artists:
-        mbid_to_lidarr_id[a["mbid"]] = a.get("id")
-        mbid_to_name[a["mbid"]] = a.get("name", "")
-
-    # Merge in any new MBIDs
-    new_count = 0
-    for a in artists:
-        mbid = a["mbid"]
-        name = a["name"]
-        if mbid not in ledger:
-            ledger[mbid] = {
-                "mbid": mbid,
-                "artist_name": name,
-                "status": "",
-                "attempts": 0,
-                "last_status_code": "",
-                "last_checked": "",
-            }
-            new_count += 1
-        else:
-            if name and ledger[mbid].get("artist_name") != name:
-                ledger[mbid]["artist_name"] = name
-
-    # Determine which MBIDs to check
-    to_check = []
-    for mbid, row in ledger.items():
-        status = (row.get("status") or "").lower()
-        if cfg["force"] or status not in ("success",):
-            to_check.append(mbid)
-
-    # Show summary and estimates
-    estimated_time = estimate_runtime(len(to_check), cfg)
-    
-    print(f"Discovered {len(artists)} artists ({new_count} new).")
-    print(f"Will check {len(to_check)} MBIDs ({'force mode' if cfg['force'] else 'pending-only'}).")
-    
-    if args.dry_run:
-        print("DRY RUN MODE - No API calls will be made")
-        print("This would check the following MBIDs:")
-        for i, mbid in enumerate(to_check[:10]):  # Show first 10
-            name = mbid_to_name.get(mbid, 'Unknown')
-            print(f"  {i+1}. {name} [{mbid}]")
-        if len(to_check) > 10:
-            print(f"  ... and {len(to_check) - 10} more")
+    if args.merge_shards:
+        if cfg["ledger_backend"] == "sqlite":
+            print(f"SQLite shards already share {cfg['sqlite_path']}; nothing to merge.")
+            return
+        try:
+            merge_shard_ledgers(cfg, args.merge_shards)
+        except RuntimeError as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
         return
 
-    if len(to_check) == 0:
-        print("Nothing to check - all MBIDs are already successful")
+    if args.export_csv:
+        store = open_ledger_store(cfg)
+        ledger = store.load()
+        write_ledger(args.export_csv, ledger)
+        store.close()
+        print(f"Exported {len(ledger)} ledger rows to {args.export_csv}")
         return
 
-    # Start processing (no global timing needed)
-
     try:
-        if cfg.get("batch_size", 25) < len(to_check):
-            # Use batch processing for large sets
-            transitioned_count, new_successes, new_failures = process_mbids_in_batches(
-                to_check, cfg, ledger, mbid_to_name, mbid_to_lidarr_id
-            )
-        else:
-            # Process all at once for smaller sets
-            transitioned_count, new_successes, new_failures = asyncio.run(
-                check_mbids_concurrent_with_timing(to_check, cfg, ledger, mbid_to_name, mbid_to_lidarr_id, time.time(), 0)
-            )
-
+        run_check(cfg, dry_run=args.dry_run)
     except KeyboardInterrupt:
-        print("\n⚠️  Interrupted by user. Saving progress...")
-        write_ledger(cfg["csv_path"], ledger)
+        print("\n⚠️  Interrupted by user. Progress saved.")
         sys.exit(1)
-    except Exception as e:
-        print(f"Fatal error during processing: {e}", file=sys.stderr)
-        write_ledger(cfg["csv_path"], ledger)
-        raise
-
-    # Final write and summary
-    write_ledger(cfg["csv_path"], ledger)
-
-    # Calculate final statistics
-    successes = sum(1 for r in ledger.values() if r.get("status") == "success")
-    timeouts = sum(1 for r in ledger.values() if r.get("status") == "timeout")
-    pending = len(ledger) - successes - timeouts
-
-    # Console summary
-    print(f"\nSummary:")
-    print(f"  Total in ledger: {len(ledger)}")
-    print(f"  Success: {successes}")
-    print(f"  Timeout: {timeouts}")
-    print(f"  Refreshes triggered (new successes): {transitioned_count}")
-    print(f"\nCSV written to: {cfg['csv_path']}")
-
-    # Write simple results log
-    try:
-        os.makedirs("/data", exist_ok=True)
-        ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        log_path = f"/data/results_{ts}.log"
-        with open(log_path, "w", encoding="utf-8") as lf:
-            lf.write(f"finished_at_utc={iso_now()}\n")
-            lf.write(f"success={successes}\n")
-            lf.write(f"timeout={timeouts}\n")
-            lf.write(f"pending={pending}\n")
-            lf.write(f"total={len(ledger)}\n")
-            lf.write(f"force_mode={'true' if cfg['force'] else 'false'}\n")
-            lf.write(f"refreshes_triggered={transitioned_count}\n")
-            lf.write(f"new_successes_this_run={new_successes}\n")
-            lf.write(f"new_failures_this_run={new_failures}\n")
-            lf.write(f"checked_this_run={len(to_check)}\n")
-        print(f"Results log written to: {log_path}")
-    except Exception as e:
-        print(f"WARNING: Failed to write results log to /data: {e}", file=sys.stderr)
+    except RuntimeError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
 
 
 if __name__ == "__main__":
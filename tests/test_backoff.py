@@ -0,0 +1,98 @@
+import asyncio
+
+from lidarr_mbid_check import (LedgerRow, SafeRateLimiter, Status, check_mbids_concurrent_with_timing,
+                               failure_backoff_seconds, in_failure_backoff, needs_check)
+
+NOW = 1_700_000_000
+HOUR = 3600
+
+
+def test_backoff_doubles_per_failed_run():
+    cfg = {"failure_backoff_hours": 1, "failure_backoff_max_hours": 168}
+    assert [failure_backoff_seconds(cfg, n) / HOUR for n in range(5)] == [0, 1, 2, 4, 8]
+
+
+def test_backoff_is_capped():
+    cfg = {"failure_backoff_hours": 1, "failure_backoff_max_hours": 6}
+    assert failure_backoff_seconds(cfg, 4) == 6 * HOUR
+    assert failure_backoff_seconds(cfg, 1000) == 6 * HOUR
+
+
+def test_zero_disables_backoff():
+    assert failure_backoff_seconds({"failure_backoff_hours": 0}, 5) == 0
+
+
+def test_in_failure_backoff_only_for_timeouts_not_yet_due():
+    row = LedgerRow("a1", status=Status.TIMEOUT, failed_runs=2, next_eligible_at=NOW + 60)
+    assert in_failure_backoff(row, now=NOW)
+    assert not in_failure_backoff(row, now=NOW + 60)
+    row.status = Status.PENDING
+    assert not in_failure_backoff(row, now=NOW)
+
+
+def test_force_bypasses_backoff():
+    row = LedgerRow("a1", status=Status.TIMEOUT, failed_runs=2, next_eligible_at=2 ** 40)
+    assert not needs_check(row, {"force": False})
+    assert needs_check(row, {"force": True})
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+        self.headers = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Answers each MBID with the next status from its script, repeating the last one"""
+
+    def __init__(self, scripts):
+        self.scripts = {mbid: list(codes) for mbid, codes in scripts.items()}
+
+    def get(self, url):
+        script = self.scripts[url.rsplit("/", 1)[1]]
+        return FakeResponse(script.pop(0) if len(script) > 1 else script[0])
+
+
+class FakeStore:
+    def upsert(self, row):
+        pass
+
+    def flush(self):
+        pass
+
+
+def run_engine(ledger, scripts, max_attempts=3, **overrides):
+    cfg = dict({"force": False, "max_concurrent_requests": 2, "max_attempts_per_artist": max_attempts,
+                "delay_between_attempts": 0, "target_base_url": "http://target", "shard_count": 1,
+                "shard_index": 0, "warmup_quantile": 0.9, "warmup_max_wait_seconds": 1,
+                "failure_backoff_hours": 1, "failure_backoff_max_hours": 168}, **overrides)
+
+    async def run():
+        return await check_mbids_concurrent_with_timing(
+            list(scripts), cfg, ledger, FakeStore(), FakeSession(scripts),
+            SafeRateLimiter(requests_per_second=1000, max_concurrent=2), None, NOW, 0)
+    return asyncio.run(run())
+
+
+def test_failed_runs_grow_on_timeout_and_reset_on_success():
+    ledger = {"a1": LedgerRow("a1", status=Status.TIMEOUT, failed_runs=2), "b2": LedgerRow("b2")}
+    run_engine(ledger, {"a1": [503, 200], "b2": [503]})
+    assert ledger["a1"].status is Status.SUCCESS
+    assert ledger["a1"].failed_runs == 0 and ledger["a1"].next_eligible_at == 0
+    assert ledger["b2"].status is Status.TIMEOUT and ledger["b2"].failed_runs == 1
+    assert ledger["b2"].next_eligible_at - ledger["b2"].checked_at == HOUR
+
+
+def test_429s_are_not_counted_as_attempts():
+    ledger = {"a1": LedgerRow("a1"), "b2": LedgerRow("b2")}
+    totals = run_engine(ledger, {"a1": [429, 429, 503, 200], "b2": [429, 503]}, max_attempts=3)
+    assert ledger["a1"].status is Status.SUCCESS and ledger["a1"].attempts == 2
+    assert ledger["b2"].status is Status.TIMEOUT and ledger["b2"].attempts == 3
+    # Every request still counts towards the run's totals
+    assert totals["attempts"] == 4 + 4
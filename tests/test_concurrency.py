@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from lidarr_mbid_check import ConcurrencyLimit
+
+
+def _rounds(limit: ConcurrencyLimit, n: int, latency: float = 0.1, dropped: bool = False) -> None:
+    """Fill the limit n times over, then complete every request with `latency`"""
+    async def run():
+        for _ in range(n):
+            slots = limit.current
+            for _ in range(slots):
+                await limit.acquire()
+            for _ in range(slots):
+                limit.release(latency, dropped)
+    asyncio.run(run())
+
+
+def test_grows_while_latency_stays_at_baseline_up_to_max():
+    limit = ConcurrencyLimit(8, min_limit=2, adaptive=True)
+    assert limit.current == 2
+    _rounds(limit, 5)
+    assert 2 < limit.current < 8
+    _rounds(limit, 50)
+    assert limit.current == 8 and limit.decreases == 0
+
+
+def test_fixed_limit_when_not_adaptive():
+    limit = ConcurrencyLimit(5, min_limit=1)
+    _rounds(limit, 3, latency=10.0, dropped=True)
+    assert limit.current == 5
+
+
+def test_latency_rise_cuts_ten_percent_once_per_window():
+    limit = ConcurrencyLimit(10, adaptive=True)
+    _rounds(limit, 100)
+    assert limit.limit == 10
+    _rounds(limit, 1, latency=1.0)
+    assert limit.decreases == 1 and limit.limit == pytest.approx(9.0)
+
+
+@pytest.mark.parametrize("latency", [0.1, 30.0])
+def test_dropped_requests_cut_down_to_the_minimum(latency):
+    # Timeouts and 429s are "dropped" whatever their latency
+    limit = ConcurrencyLimit(10, min_limit=3, adaptive=True)
+    _rounds(limit, 100)
+
+    async def one_dropped():
+        await limit.acquire()
+        limit.release(latency, dropped=True)
+    asyncio.run(one_dropped())
+    assert limit.limit == pytest.approx(9.0)
+    _rounds(limit, 200, latency=latency, dropped=True)
+    assert limit.current == 3
+
+
+def test_cancelled_waiter_hands_its_slot_on():
+    async def run():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire()
+        second = asyncio.ensure_future(limit.acquire())
+        third = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        # The slot goes to the second waiter, which is cancelled before it can run
+        limit.release(0.1)
+        second.cancel()
+        await asyncio.wait_for(third, timeout=1)
+        assert second.cancelled()
+        assert limit.in_flight == 1 and not limit._waiters
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire()
+        second = asyncio.ensure_future(limit.acquire())
+        third = asyncio.ensure_future(limit.acquire())
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.sleep(0)
+        limit.release(0.1)
+        await asyncio.wait_for(third, timeout=1)
+        assert limit.in_flight == 1 and not limit._waiters
+    asyncio.run(run())
@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from lidarr_mbid_check import GcraRateLimiter
+
+
+def _admission_times(limiter: GcraRateLimiter, n: int, before=None) -> list:
+    async def run():
+        if before is not None:
+            before(limiter)
+        start = time.monotonic()
+        times = []
+        for _ in range(n):
+            await limiter.wait()
+            times.append(time.monotonic() - start)
+        return times
+    return asyncio.run(run())
+
+
+def test_requests_are_spaced_at_the_rate():
+    times = _admission_times(GcraRateLimiter(rate=50), 6)
+    assert times[0] < 0.01
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    assert all(g >= 0.019 for g in gaps)
+    assert times[-1] < 0.1 + 0.05
+
+
+def test_burst_goes_back_to_back_then_paces():
+    times = _admission_times(GcraRateLimiter(rate=20, burst=4), 6)
+    assert times[3] < 0.01
+    assert times[4] >= 0.049 and times[5] - times[4] >= 0.049
+
+
+def test_fractional_rates():
+    limiter = GcraRateLimiter(rate=0.5)
+    assert _admission_times(limiter, 1)[0] < 0.01
+    # The next slot is two seconds after the first
+    assert limiter._tat - time.monotonic() > 1.9
+
+
+def test_hold_until_delays_and_suppresses_the_burst():
+    times = _admission_times(GcraRateLimiter(rate=20, burst=4), 2,
+                             before=lambda limiter: limiter.hold_until(time.monotonic() + 0.1))
+    assert times[0] >= 0.099
+    assert times[1] - times[0] >= 0.049
+
+
+def test_concurrent_waiters_are_served_in_order():
+    async def run():
+        limiter = GcraRateLimiter(rate=100)
+        order = []
+
+        async def request(i):
+            await limiter.wait()
+            order.append(i)
+        await asyncio.gather(*(request(i) for i in range(5)))
+        return order
+    assert asyncio.run(run()) == list(range(5))
+
+
+def test_hold_issued_mid_sleep_is_honoured():
+    async def run():
+        limiter = GcraRateLimiter(rate=2)
+        await limiter.wait()
+        start = time.monotonic()
+        waiter = asyncio.ensure_future(limiter.wait())
+        await asyncio.sleep(0.1)
+        # The waiter is asleep until 0.5s; the hold pushes it past 0.8s
+        limiter.hold_until(time.monotonic() + 0.7)
+        await waiter
+        return time.monotonic() - start
+    assert asyncio.run(run()) >= 0.79
@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import lidarr_mbid_check
+from lidarr_mbid_check import JournalLedgerStore, LedgerRow, SqliteLedgerStore, Status, read_ledger, write_ledger
+
+
+def _ledger():
+    row = LedgerRow("a1", "Artist", Status.SUCCESS, attempts=3, last_status_code=200, checked_at=1_700_000_000)
+    mirror = row.target_row("mirror")
+    mirror.status, mirror.attempts, mirror.last_status_code = Status.TIMEOUT, 10, 503
+    return {"a1": row, "b2": LedgerRow("b2", "Other")}
+
+
+def test_csv_round_trip_keeps_target_columns(tmp_path):
+    path = str(tmp_path / "mbids.csv")
+    write_ledger(path, _ledger())
+    loaded = read_ledger(path)
+    assert loaded["a1"].status is Status.SUCCESS and loaded["a1"].attempts == 3
+    assert loaded["a1"].targets["mirror"].status is Status.TIMEOUT
+    assert loaded["a1"].targets["mirror"].attempts == 10
+    # Targets that never probed an MBID are not materialised
+    assert loaded["b2"].targets is None
+
+
+def test_sqlite_keeps_columns_of_unconfigured_targets(tmp_path):
+    path = str(tmp_path / "mbids.db")
+    store = SqliteLedgerStore(path, targets=["mirror"])
+    store.load()
+    store.upsert_many(list(_ledger().values()))
+    store.close()
+    store = SqliteLedgerStore(path)
+    loaded = store.load()
+    store.close()
+    assert loaded["a1"].targets["mirror"].last_status_code == 503
+
+
+def _journal_store(tmp_path, compact_bytes=1 << 20):
+    path = str(tmp_path / "mbids.csv")
+    write_ledger(path, {"a1": LedgerRow("a1", "Artist"), "b2": LedgerRow("b2", "Other")})
+    store = JournalLedgerStore(path, compact_bytes)
+    store.load()
+    return store
+
+
+def test_journal_is_replayed_over_the_csv(tmp_path):
+    store = _journal_store(tmp_path)
+    store.upsert(LedgerRow("a1", "Artist", Status.SUCCESS, attempts=2, last_status_code=200))
+    store.upsert(LedgerRow("c3", "New"))
+    store.flush()
+    # Simulate a crash: the journal is never compacted
+    assert read_ledger(store.path)["a1"].status is Status.PENDING
+    loaded = JournalLedgerStore(store.path).load()
+    assert loaded["a1"].status is Status.SUCCESS and loaded["a1"].attempts == 2
+    assert set(loaded) == {"a1", "b2", "c3"}
+
+
+def test_journal_tombstones_prune_rows(tmp_path):
+    store = _journal_store(tmp_path)
+    store.delete(["b2"])
+    store.flush()
+    assert "b2" not in JournalLedgerStore(store.path).load()
+    store.close()
+    assert set(read_ledger(store.path)) == {"a1"}
+    assert not os.path.exists(store.journal_path)
+
+
+def test_torn_last_journal_line_is_skipped(tmp_path):
+    store = _journal_store(tmp_path)
+    store.upsert(LedgerRow("a1", "Artist", Status.SUCCESS, last_status_code=200))
+    store.flush()
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"mbid":"b2","artist_name":"Oth')
+    loaded = JournalLedgerStore(store.path).load()
+    assert loaded["a1"].status is Status.SUCCESS
+    assert loaded["b2"].status is Status.PENDING
+
+
+def test_journal_compacts_once_it_crosses_the_limit(tmp_path):
+    first = LedgerRow("a1", "Artist", Status.SUCCESS, last_status_code=200)
+    store = _journal_store(tmp_path, compact_bytes=len(json.dumps(first.to_dict(), separators=(",", ":"))) + 2)
+    store.upsert(first)
+    assert os.path.exists(store.journal_path)
+    assert read_ledger(store.path)["a1"].status is Status.PENDING
+    store.upsert(LedgerRow("c3", "New"))
+    # The journal was folded into the CSV and removed
+    assert not os.path.exists(store.journal_path)
+    snapshot = read_ledger(store.path)
+    assert snapshot["a1"].status is Status.SUCCESS and "c3" in snapshot
+
+
+def test_journal_survives_a_failed_compaction(tmp_path, monkeypatch):
+    store = _journal_store(tmp_path)
+    store.upsert(LedgerRow("a1", "Artist", Status.SUCCESS, last_status_code=200))
+    seen = []
+
+    def failing_write(path, ledger):
+        seen.append(os.path.exists(store.journal_path))
+        raise OSError("disk full")
+    monkeypatch.setattr(lidarr_mbid_check, "write_ledger", failing_write)
+    with pytest.raises(OSError):
+        store.compact()
+    # The journal is still there when the CSV is written, and is kept when that fails
+    assert seen == [True]
+    assert os.path.exists(store.journal_path)
+    monkeypatch.undo()
+    assert JournalLedgerStore(store.path).load()["a1"].status is Status.SUCCESS
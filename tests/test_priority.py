@@ -0,0 +1,42 @@
+from lidarr_mbid_check import LedgerRow, Status, prioritize
+
+
+def _cfg(**overrides):
+    return dict({"force": False}, **overrides)
+
+
+def _ledger():
+    return {
+        "new1": LedgerRow("new1"),
+        "old_ok": LedgerRow("old_ok", status=Status.SUCCESS, checked_at=100),
+        "new_ok": LedgerRow("new_ok", status=Status.SUCCESS, checked_at=200),
+        "t_many": LedgerRow("t_many", status=Status.TIMEOUT, attempts=10, failed_runs=1, checked_at=100),
+        "t_few": LedgerRow("t_few", status=Status.TIMEOUT, attempts=3, failed_runs=1, checked_at=300),
+        "t_runs": LedgerRow("t_runs", status=Status.TIMEOUT, attempts=1, failed_runs=2, checked_at=50),
+        "new2": LedgerRow("new2"),
+    }
+
+
+def test_default_weights_new_then_timeouts_then_rechecks():
+    ledger = _ledger()
+    assert prioritize(list(ledger), ledger, _cfg()) == [
+        "new1", "new2", "t_few", "t_many", "t_runs", "old_ok", "new_ok"]
+
+
+def test_weights_reorder_the_classes():
+    ledger = _ledger()
+    order = prioritize(list(ledger), ledger, _cfg(priority_new=1, priority_recheck=3))
+    assert order[:2] == ["old_ok", "new_ok"] and order[-2:] == ["new1", "new2"]
+
+
+def test_least_recent_timeout_order():
+    ledger = _ledger()
+    order = prioritize(list(ledger), ledger, _cfg(timeout_order="least_recent"))
+    assert order[2:5] == ["t_runs", "t_many", "t_few"]
+
+
+def test_ties_keep_their_input_order():
+    ledger = {m: LedgerRow(m, status=Status.TIMEOUT, attempts=2, failed_runs=1, checked_at=10) for m in "dbca"}
+    ledger.update({m: LedgerRow(m) for m in "zyx"})
+    mbids = ["d", "z", "b", "y", "c", "x", "a"]
+    assert prioritize(mbids, ledger, _cfg()) == ["z", "y", "x", "d", "b", "c", "a"]
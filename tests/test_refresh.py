@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from lidarr_mbid_check import LidarrRefreshDispatcher
+
+
+class FakeResponse:
+    def __init__(self, status):
+        self.status = status
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Records each POST; `accepts(url, body)` decides whether it succeeds"""
+
+    def __init__(self, accepts=lambda url, body: True):
+        self.accepts = accepts
+        self.posts = []
+
+    def post(self, url, headers=None, json=None):
+        self.posts.append((time.monotonic(), url, json))
+        return FakeResponse(200 if self.accepts(url, json) else 404)
+
+
+def _dispatch(session, batches, **kwargs):
+    """Submit each list of IDs in `batches`, sleeping between them if given a number"""
+    async def run():
+        dispatcher = LidarrRefreshDispatcher(session, "http://lidarr/", "key", **kwargs)
+        dispatcher.start()
+        for item in batches:
+            if isinstance(item, (int, float)):
+                await asyncio.sleep(item)
+            else:
+                for artist_id in item:
+                    dispatcher.submit(artist_id)
+        await dispatcher.close()
+        return dispatcher
+    return asyncio.run(run())
+
+
+def test_ids_are_batched_up_to_the_batch_size():
+    session = FakeSession()
+    dispatcher = _dispatch(session, [list(range(7))], max_batch_size=3, max_delay_seconds=10)
+    assert [body["artistIds"] for _, _, body in session.posts] == [[0, 1, 2], [3, 4, 5], [6]]
+    assert dispatcher.commands_sent == 3 and dispatcher.artists_refreshed == 7
+
+
+def test_partial_batch_is_sent_after_the_max_delay():
+    session = FakeSession()
+    start = time.monotonic()
+    _dispatch(session, [[1, 2], 0.3, [3]], max_batch_size=50, max_delay_seconds=0.1)
+    assert [body["artistIds"] for _, _, body in session.posts] == [[1, 2], [3]]
+    assert 0.09 <= session.posts[0][0] - start < 0.3
+
+
+def test_close_flushes_the_queue():
+    session = FakeSession()
+    _dispatch(session, [[1, 2]], max_batch_size=50, max_delay_seconds=60)
+    assert [body["artistIds"] for _, _, body in session.posts] == [[1, 2]]
+    assert session.posts[0][1] == "http://lidarr/api/v1/command"
+
+
+def test_falls_back_to_single_payloads_and_caches_the_variant():
+    session = FakeSession(accepts=lambda url, body: url.endswith("/api/command") and "artistId" in body)
+    dispatcher = _dispatch(session, [[1, 2], 0.2, [3]], max_batch_size=50, max_delay_seconds=0.05)
+    assert dispatcher.variant == ("/api/command", "single")
+    # The first batch walks the variants in order; the second goes straight to the cached one
+    assert [(url[len("http://lidarr"):], body.get("artistIds", body.get("artistId")))
+            for _, url, body in session.posts] == [
+        ("/api/v1/command", [1, 2]), ("/api/v1/command", 1), ("/api/v1/command", 2),
+        ("/api/command", [1, 2]), ("/api/command", 1), ("/api/command", 2),
+        ("/api/command", 3),
+    ]
+    assert dispatcher.commands_sent == 2 and dispatcher.failures == 0
+
+
+def test_failed_sends_are_counted():
+    session = FakeSession(accepts=lambda url, body: False)
+    dispatcher = _dispatch(session, [[1]], max_batch_size=1)
+    assert len(session.posts) == len(LidarrRefreshDispatcher.VARIANTS)
+    assert dispatcher.variant is None and dispatcher.failures == 1
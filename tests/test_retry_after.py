@@ -0,0 +1,86 @@
+import time
+from email.utils import formatdate
+
+from lidarr_mbid_check import SafeRateLimiter, _parse_retry_after
+
+NOW = 1_700_000_000.0
+
+
+def test_delta_seconds():
+    assert _parse_retry_after("5", NOW) == 5.0
+    assert _parse_retry_after(" 2.5 ", NOW) == 2.5
+
+
+def test_http_date():
+    assert _parse_retry_after(formatdate(NOW + 30, usegmt=True), NOW) == 30.0
+
+
+def test_past_date_and_negative_mean_now():
+    assert _parse_retry_after(formatdate(NOW - 30, usegmt=True), NOW) == 0.0
+    assert _parse_retry_after("-3", NOW) == 0.0
+
+
+def test_garbage_and_non_finite_are_ignored():
+    for value in (None, "", "soon", "inf", "-inf", "nan", "Infinity"):
+        assert _parse_retry_after(value, NOW) is None
+
+
+def test_clamped_to_ceiling():
+    assert _parse_retry_after("86400", NOW, ceiling=60) == 60
+    assert _parse_retry_after(formatdate(NOW + 86400, usegmt=True), NOW, ceiling=60) == 60
+
+
+def test_only_429_pauses_the_limiter():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(503, {"Retry-After": "30"})
+    assert limiter.paused_until == 0.0
+    limiter._apply_rate_limit_headers(429, {"Retry-After": "86400"})
+    assert 0 < limiter.paused_until - time.monotonic() <= 60
+
+
+def _pause_left(limiter: SafeRateLimiter) -> float:
+    return limiter.paused_until - time.monotonic()
+
+
+def test_infinite_rate_limit_reset_is_ignored():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "inf"})
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "nan"})
+    assert limiter.paused_until == 0.0
+    assert limiter.bucket._tat < time.monotonic() + 1
+
+
+def test_large_rate_limit_reset_is_capped():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "86400"})
+    assert 59 < _pause_left(limiter) <= 60
+
+
+def test_rate_limit_reset_as_delta_or_epoch():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "5"})
+    assert 4 < _pause_left(limiter) <= 5
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "0",
+                                            "X-RateLimit-Reset": str(int(time.time()) + 20)})
+    assert 18 < _pause_left(limiter) <= 20
+
+
+def test_remaining_quota_is_spread_over_the_window():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Limit": "100", "X-RateLimit-Remaining": "10",
+                                            "X-RateLimit-Reset": "5"})
+    assert limiter.server_rate == 2.0
+    assert limiter.current_rate == 2.0
+
+
+def test_small_quota_lapses_with_its_window():
+    limiter = SafeRateLimiter(requests_per_second=10, max_backoff_seconds=60)
+    limiter._apply_rate_limit_headers(200, {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "3600"})
+    # The window is capped, so the rate is 1/60 rather than 1/3600
+    assert abs(limiter.server_rate - 1 / 60) < 1e-9
+    limiter.server_rate_until = time.monotonic() - 1
+    for _ in range(200):
+        limiter.release(200, 0.01)
+    assert limiter.server_rate is None
+    assert limiter.current_rate == 10
@@ -0,0 +1,31 @@
+import aiohttp
+import pytest
+
+from lidarr_mbid_check import CONNECTION_EXCEPTIONS, RETRY_OUTCOMES, retry_outcome
+
+
+@pytest.mark.parametrize("status_code, outcome", [
+    (503, "cache_miss"),
+    (404, "not_found"),
+    (429, "rate_limited"),
+    ("TIMEOUT", "timeout"),
+    (0, "connection"),
+    ("EXC:ClientConnectorError", "connection"),
+    ("EXC:ClientConnectorDNSError", "connection"),
+    ("EXC:ServerDisconnectedError", "connection"),
+    ("EXC:ClientPayloadError", "other"),
+    ("EXC:ContentTypeError", "other"),
+    ("EXC:UnicodeDecodeError", "other"),
+    (500, "other"),
+    (418, "other"),
+])
+def test_outcome_classes(status_code, outcome):
+    assert retry_outcome(status_code) == outcome
+    assert outcome in RETRY_OUTCOMES
+
+
+def test_connection_names_are_real_exception_types():
+    # probe_mbid_once reports exceptions as "EXC:<type name>", so a typo would never match
+    for name in ("ClientConnectorError", "ClientConnectorDNSError", "ServerDisconnectedError", "ClientOSError"):
+        assert name in CONNECTION_EXCEPTIONS
+        assert isinstance(getattr(aiohttp, name), type)
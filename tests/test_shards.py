@@ -0,0 +1,111 @@
+import multiprocessing
+import sqlite3
+import uuid
+
+import pytest
+
+from lidarr_mbid_check import (LedgerRow, SqliteLedgerStore, Status, merge_shard_ledgers, parse_shard,
+                               read_ledger, shard_of, shard_path, write_ledger)
+
+MBIDS = [str(uuid.UUID(int=i, version=4)) for i in range(2000)]
+
+
+def test_parse_shard():
+    assert parse_shard("") == (1, 1)
+    assert parse_shard(" 2 / 4 ") == (2, 4)
+    for bad in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+
+
+def test_every_mbid_has_one_stable_shard():
+    for count in (1, 3, 8):
+        shards = [shard_of(mbid, count) for mbid in MBIDS]
+        assert all(1 <= s <= count for s in shards)
+        assert shards == [shard_of(mbid.upper() + " ", count) for mbid in MBIDS]
+
+
+def test_shards_are_balanced():
+    counts = [0] * 4
+    for mbid in MBIDS:
+        counts[shard_of(mbid, 4) - 1] += 1
+    assert min(counts) > len(MBIDS) / 4 * 0.8
+
+
+def test_shard_path():
+    assert shard_path("/data/mbids.csv", 2, 4) == "/data/mbids.shard2of4.csv"
+
+
+def _owned_by(shard, count, n=1):
+    return [m for m in MBIDS if shard_of(m, count) == shard][:n]
+
+
+def _merge_cfg(tmp_path):
+    return {"csv_path": str(tmp_path / "mbids.csv"), "artist_snapshot_path": str(tmp_path / "mbids.artists.json")}
+
+
+def test_merge_takes_each_shards_rows_from_its_own_file(tmp_path):
+    cfg = _merge_cfg(tmp_path)
+    one, two = _owned_by(1, 2)[0], _owned_by(2, 2)[0]
+    write_ledger(cfg["csv_path"], {one: LedgerRow(one, "A", Status.TIMEOUT, checked_at=100),
+                                   two: LedgerRow(two, "B", Status.TIMEOUT, checked_at=100)})
+    # Shard 2's file still carries a seeded copy of shard 1's row, newer than shard 1's own
+    write_ledger(shard_path(cfg["csv_path"], 1, 2), {one: LedgerRow(one, "A", Status.SUCCESS, checked_at=200)})
+    write_ledger(shard_path(cfg["csv_path"], 2, 2), {one: LedgerRow(one, "A", Status.TIMEOUT, checked_at=300),
+                                                     two: LedgerRow(two, "B", Status.SUCCESS, checked_at=200)})
+    assert merge_shard_ledgers(cfg, 2) == 2
+    merged = read_ledger(cfg["csv_path"])
+    assert merged[one].status is Status.SUCCESS and merged[two].status is Status.SUCCESS
+
+
+def test_merge_drops_rows_a_shard_pruned(tmp_path):
+    cfg = _merge_cfg(tmp_path)
+    kept, pruned = _owned_by(1, 2, 2)
+    write_ledger(cfg["csv_path"], {m: LedgerRow(m, "x") for m in (kept, pruned)})
+    write_ledger(shard_path(cfg["csv_path"], 1, 2), {kept: LedgerRow(kept, "x")})
+    write_ledger(shard_path(cfg["csv_path"], 2, 2), {})
+    merge_shard_ledgers(cfg, 2)
+    assert set(read_ledger(cfg["csv_path"])) == {kept}
+
+
+def test_merge_keeps_base_rows_of_shards_without_a_file(tmp_path):
+    cfg = _merge_cfg(tmp_path)
+    one, (two, moved) = _owned_by(1, 2)[0], _owned_by(2, 2, 2)
+    write_ledger(cfg["csv_path"], {m: LedgerRow(m, "x", checked_at=100) for m in (one, two, moved)})
+    # Left over from a different shard count: newer than the base row, so it wins
+    write_ledger(shard_path(cfg["csv_path"], 1, 2), {one: LedgerRow(one, "x", Status.SUCCESS, checked_at=200),
+                                                     moved: LedgerRow(moved, "x", Status.SUCCESS, checked_at=200)})
+    assert merge_shard_ledgers(cfg, 2) == 3
+    merged = read_ledger(cfg["csv_path"])
+    assert merged[two].status is Status.PENDING
+    assert merged[one].status is Status.SUCCESS and merged[moved].status is Status.SUCCESS
+
+
+def test_merge_without_shard_files_fails(tmp_path):
+    cfg = {"csv_path": str(tmp_path / "mbids.csv"), "artist_snapshot_path": str(tmp_path / "a.json")}
+    with pytest.raises(RuntimeError):
+        merge_shard_ledgers(cfg, 2)
+
+
+def _open_store(barrier, db_path, csv_path, targets):
+    barrier.wait()
+    SqliteLedgerStore(db_path, import_csv_path=csv_path, targets=targets).close()
+
+
+def test_shards_opening_a_new_database_together_import_once(tmp_path, capfd):
+    csv_path = str(tmp_path / "mbids.csv")
+    db_path = str(tmp_path / "mbids.db")
+    write_ledger(csv_path, {m: LedgerRow(m, "x") for m in MBIDS[:200]})
+    ctx = multiprocessing.get_context("spawn")
+    barrier = ctx.Barrier(4)
+    procs = [ctx.Process(target=_open_store, args=(barrier, db_path, csv_path, ["mirror"])) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    assert [p.exitcode for p in procs] == [0] * 4
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM ledger").fetchone()[0] == 200
+    assert "mirror_status" in [r[1] for r in conn.execute("PRAGMA table_info(ledger)")]
+    conn.close()
+    assert capfd.readouterr().out.count("Imported 200 ledger rows") == 1
@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from lidarr_mbid_check import JsonArrayStreamParser
+
+DOC = [{"id": 1, "artistName": "Björk", "tags": ["a", "b,]"]}, {"id": 22, "artistName": "Sigur Rós"},
+       "str]ing", 12345, -1.5e3, True, None, [], {}]
+
+
+def _parse(data: bytes, size: int) -> list:
+    parser = JsonArrayStreamParser()
+    items = []
+    for i in range(0, len(data), size):
+        items += parser.feed(data[i:i + size])
+    parser.close()
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 100000])
+def test_any_chunking_gives_the_same_elements(size):
+    data = json.dumps(DOC, ensure_ascii=False, indent=1).encode("utf-8")
+    assert _parse(data, size) == DOC
+
+
+def test_empty_array():
+    assert _parse(b" [ ] ", 1) == []
+
+
+def test_elements_are_returned_as_soon_as_complete():
+    parser = JsonArrayStreamParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}]') == [{"b": 2}]
+    assert parser.finished
+
+
+def test_not_an_array():
+    with pytest.raises(ValueError):
+        JsonArrayStreamParser().feed(b'{"a": 1}')
+
+
+def test_truncated_array():
+    parser = JsonArrayStreamParser()
+    parser.feed(b'[{"a": 1}, {"b": 2')
+    with pytest.raises(ValueError):
+        parser.close()
@@ -0,0 +1,69 @@
+from lidarr_mbid_check import LedgerRow, Status, apply_removed_artists, diff_artists, merge_artist
+
+
+class FakeStore:
+    def __init__(self):
+        self.upserted, self.deleted = [], []
+
+    def upsert_many(self, rows):
+        self.upserted.extend(row.mbid for row in rows)
+
+    def delete(self, mbids):
+        self.deleted.extend(mbids)
+
+
+def _ledger():
+    return {mbid: LedgerRow(mbid, name, Status.SUCCESS) for mbid, name in (("a1", "A"), ("b2", "B"), ("c3", "C"))}
+
+
+def test_diff_classifies_added_renamed_and_removed():
+    previous = {"a1": [1, "A"], "b2": [2, "B"], "c3": [3, "C"]}
+    artists = [{"id": 1, "mbid": "a1", "name": "A"}, {"id": 2, "mbid": "b2", "name": "B (new)"},
+               {"id": 4, "mbid": "d4", "name": "D"}]
+    diff = diff_artists(previous, artists)
+    assert [a["mbid"] for a in diff["added"]] == ["d4"]
+    assert [a["mbid"] for a in diff["renamed"]] == ["b2"]
+    assert diff["removed"] == ["c3"]
+    assert diff["current"] == {"a1": [1, "A"], "b2": [2, "B (new)"], "d4": [4, "D"]}
+
+
+def test_missing_name_is_not_a_rename():
+    diff = diff_artists({"a1": [1, "A"]}, [{"id": 1, "mbid": "a1", "name": ""}])
+    assert diff["renamed"] == [] and diff["removed"] == []
+
+
+def test_mark_policy_marks_once():
+    ledger, store = _ledger(), FakeStore()
+    assert apply_removed_artists(ledger, store, ["c3", "zz"], "mark", listed=2) == 1
+    assert ledger["c3"].status is Status.REMOVED and store.upserted == ["c3"]
+    # Already marked: nothing more to write
+    assert apply_removed_artists(ledger, store, ["c3"], "mark", listed=2) == 0
+    assert store.upserted == ["c3"]
+
+
+def test_prune_policy_deletes_rows():
+    ledger, store = _ledger(), FakeStore()
+    assert apply_removed_artists(ledger, store, ["c3"], "prune", listed=2) == 1
+    assert "c3" not in ledger and store.deleted == ["c3"]
+
+
+def test_keep_policy_leaves_rows():
+    ledger, store = _ledger(), FakeStore()
+    assert apply_removed_artists(ledger, store, ["c3"], "keep", listed=2) == 0
+    assert ledger["c3"].status is Status.SUCCESS and not store.upserted and not store.deleted
+
+
+def test_empty_listing_removes_nothing():
+    for policy in ("mark", "prune"):
+        ledger, store = _ledger(), FakeStore()
+        assert apply_removed_artists(ledger, store, ["a1", "b2", "c3"], policy, listed=0) == 0
+        assert all(row.status is Status.SUCCESS for row in ledger.values()) and len(ledger) == 3
+        assert not store.upserted and not store.deleted
+
+
+def test_marked_artist_that_returns_is_checked_again():
+    ledger = _ledger()
+    apply_removed_artists(ledger, FakeStore(), ["c3"], "mark", listed=2)
+    is_new, changed = merge_artist(ledger, {"id": 3, "mbid": "c3", "name": "C"})
+    assert not is_new and changed is ledger["c3"]
+    assert ledger["c3"].status is Status.PENDING
@@ -0,0 +1,35 @@
+import pytest
+
+from lidarr_mbid_check import METRICS, LedgerRow, SafeRateLimiter, Status, TargetLedger, record_limiter_metrics
+
+
+def test_lookups_do_not_create_target_rows():
+    ledger = {"a1": LedgerRow("a1", "Artist")}
+    view = TargetLedger(ledger, "mirror")
+    assert "a1" not in view
+    assert view.get("a1") is None
+    with pytest.raises(KeyError):
+        view["a1"]
+    assert ledger["a1"].targets is None
+    assert len(view) == 0
+
+
+def test_row_for_adds_the_target_row():
+    ledger = {"a1": LedgerRow("a1", "Artist", Status.SUCCESS), "b2": LedgerRow("b2", "Other")}
+    view = TargetLedger(ledger, "mirror")
+    row = view.row_for("a1")
+    assert row.status is Status.PENDING and row.artist_name == "Artist"
+    assert view["a1"] is row and view.row_for("a1") is row
+    assert list(view) == ["a1"]
+
+
+def test_limiter_gauges_are_labelled_by_target():
+    mirror = SafeRateLimiter(requests_per_second=2, circuit_breaker_threshold=3)
+    mirror.consecutive_failures = 3
+    record_limiter_metrics(SafeRateLimiter(requests_per_second=5), "primary")
+    record_limiter_metrics(mirror, "mirror")
+    text = METRICS.render()
+    assert 'lidarr_mbid_rate_limit_requests_per_second{target="primary"} 5' in text
+    assert 'lidarr_mbid_rate_limit_requests_per_second{target="mirror"} 2' in text
+    assert 'lidarr_mbid_circuit_breaker_open{target="primary"} 0' in text
+    assert 'lidarr_mbid_circuit_breaker_open{target="mirror"} 1' in text
@@ -0,0 +1,41 @@
+from lidarr_mbid_check import LedgerRow, Status, select_expired_successes
+
+NOW = 1_700_000_000
+DAY = 86400
+
+
+def _cfg(**overrides):
+    return dict({"force": False, "success_ttl_hours": 24, "interval_seconds": 3600}, **overrides)
+
+
+def _successes(n, checked_at=NOW - 2 * DAY, entity="artist"):
+    return {f"m{i:03d}": LedgerRow(f"m{i:03d}", status=Status.SUCCESS, checked_at=checked_at - i, entity=entity)
+            for i in range(n)}
+
+
+def test_budget_spreads_rechecks_over_the_ttl():
+    # 48 successes, hourly runs, 24h TTL: two per run re-verifies each once a day
+    assert len(select_expired_successes(_successes(48), _cfg(), now=NOW)) == 2
+    # The budget rounds up
+    assert len(select_expired_successes(_successes(49), _cfg(), now=NOW)) == 3
+    assert len(select_expired_successes(_successes(48), _cfg(interval_seconds=6 * 3600), now=NOW)) == 12
+
+
+def test_oldest_first():
+    ledger = _successes(48)
+    assert select_expired_successes(ledger, _cfg(), now=NOW) == ["m047", "m046"]
+
+
+def test_only_expired_successes_of_the_entity():
+    ledger = _successes(48)
+    ledger["m047"].checked_at = NOW - 60
+    ledger["m046"].status = Status.TIMEOUT
+    ledger["album"] = LedgerRow("album", status=Status.SUCCESS, checked_at=0, entity="album")
+    assert select_expired_successes(ledger, _cfg(), now=NOW) == ["m045", "m044"]
+    assert select_expired_successes(ledger, _cfg(), now=NOW, entity="album") == ["album"]
+
+
+def test_zero_ttl_or_force_disables_rechecks():
+    assert select_expired_successes(_successes(48), _cfg(success_ttl_hours=0), now=NOW) == []
+    # --force already re-checks every success
+    assert select_expired_successes(_successes(48), _cfg(force=True), now=NOW) == []
@@ -0,0 +1,51 @@
+from lidarr_mbid_check import WarmupModel, diminishing_returns_attempts
+
+
+def test_too_few_samples_learns_nothing():
+    assert diminishing_returns_attempts({1: 10}, {}, 0.05, min_samples=50) is None
+
+
+def test_limit_is_one_past_last_useful_attempt():
+    # 100 cold MBIDs: most warm on attempts 2-3, nothing after 4, 10 give up at 10
+    warmed = {2: 50, 3: 30, 4: 10}
+    gave_up = {10: 10}
+    assert diminishing_returns_attempts(warmed, gave_up, 0.05, min_samples=50) == 5
+
+
+def test_floor_bounds_the_limit():
+    assert diminishing_returns_attempts({1: 100}, {}, 0.05, min_samples=50, floor=5) == 5
+
+
+def test_rare_late_warmups_do_not_keep_the_limit_high():
+    # Under 10 MBIDs reach attempt 8, so it cannot count as useful on its own
+    warmed = {1: 80, 2: 10, 8: 2}
+    gave_up = {8: 5}
+    assert diminishing_returns_attempts(warmed, gave_up, 0.05, min_samples=50) == 3
+
+
+def test_model_counts_only_attributed_attempts():
+    model = WarmupModel(min_samples=1)
+    model.observe(2.0, 3)
+    model.observe(1.0)  # a re-verification: timed, but not counted by attempt
+    model.observe_gave_up(10)
+    assert model.warmed == {3: 1}
+    assert model.gave_up == {10: 1}
+    assert model.seconds.count == 2
+
+
+def test_model_round_trips_attempt_counts():
+    model = WarmupModel()
+    model.observe(2.0, 3)
+    model.observe_gave_up(10)
+    loaded = WarmupModel()
+    loaded.load_dict(model.to_dict())
+    assert loaded.warmed == {3: 1} and loaded.gave_up == {10: 1}
+    assert loaded.learned.count == 1
+
+
+def test_old_model_files_load_without_attempt_counts():
+    model = WarmupModel()
+    data = model.to_dict()
+    del data["warmed"], data["gave_up"]
+    model.load_dict(data)
+    assert not model.warmed and not model.gave_up